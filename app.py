@@ -1,20 +1,43 @@
 import streamlit as st
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
-import json
+import re
 import folium
-from folium import plugins
 import time
+import threading
+from functools import partial
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from config import GEMINI_TIMEOUT, ITINERARY_DEADLINE, JOB_WORKERS, MAX_CONCURRENT_STAGES, METRICS_PORT, MODEL_BACKEND
+from deadline import make_deadline
+from gazetteer import get_gazetteer
+from hedging import hedge_delay, hedged_call
+from incremental_json import IncrementalJSONParser
+from job_queue import JobQueue
+from json_extract import JSONExtractionError, extract_json
+from map_cache import get_map_cache
+from metrics import get_metrics
+from budget_engine import apply_budget, budget_report, format_range
+from models import Trip
+from model_backend import get_backend, model_for
+from rate_limiter import get_rate_limiter
+from response_cache import budget_bucket, budget_bucket_label, get_response_cache
+from schemas import GENERATION_CONFIGS, RESPONSE_DEFAULTS
+from session_store import SessionResultStore
+from single_flight import get_single_flight
+from stage_scheduler import StageScheduler
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini
+# Gemini key (MODEL_BACKEND=fake runs against the local stand-in, no key needed); each template's model comes from model_for
 api_key = os.getenv('GEMINI_API_KEY')
-if api_key:
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash')
+
+# Bump a template's version whenever its prompt changes so stale cache entries are ignored
+PROMPT_VERSIONS = {
+    "summary": 4,
+    "daily": 4,
+    "dining": 3
+}
 
 # Page config
 st.set_page_config(
@@ -23,267 +46,196 @@ st.set_page_config(
     layout="wide"
 )
 
-def parse_json_response(response_text):
-    """Parse JSON response from Gemini with robust error handling"""
+def parse_json_response(response_text, schema=None):
+    """Parse JSON response from Gemini, repairing common defects locally instead of regenerating"""
     try:
-        # Clean the response text
-        cleaned_text = response_text.strip()
-        
-        # Remove markdown code blocks if present
-        if cleaned_text.startswith('```json'):
-            cleaned_text = cleaned_text[7:]
-        elif cleaned_text.startswith('```'):
-            cleaned_text = cleaned_text[3:]
-        
-        if cleaned_text.endswith('```'):
-            cleaned_text = cleaned_text[:-3]
-        
-        cleaned_text = cleaned_text.strip()
-        
-        # Try to find JSON content between braces
-        start_idx = cleaned_text.find('{')
-        end_idx = cleaned_text.rfind('}')
-        
-        if start_idx != -1 and end_idx != -1:
-            json_str = cleaned_text[start_idx:end_idx+1]
-            return json.loads(json_str)
-        else:
-            # If no JSON found, return the text as a simple structure
-            return {"content": cleaned_text, "error": "No valid JSON found"}
-            
-    except json.JSONDecodeError as e:
+        return extract_json(response_text, schema)
+    except JSONExtractionError as e:
         st.error(f"JSON parsing error: {e}")
         return {"error": "Failed to parse JSON", "raw_text": response_text[:500]}
     except Exception as e:
         st.error(f"Unexpected error in parsing: {e}")
         return {"error": "Unexpected parsing error", "raw_text": response_text[:500]}
 
-def generate_trip_summary(city, budget, days):
+# Lists whose items are rendered one by one while a response streams in
+STREAMED_LISTS = ("activities", "meals", "restaurants")
+
+def generate_json(template, args, prompt, on_item=None, on_cached=None, deadline=None):
+    """Call Gemini for a prompt, serving repeated requests from the shared response cache.
+    
+    When on_item is given the response is streamed and on_item(list_name, item) is
+    called for every activity, meal or restaurant as soon as its JSON object closes.
+    Identical requests already in flight in another session share that call.
+    on_cached() is called when the result is reused from the cache.
+    Unstreamed calls are hedged past the template's usual latency and raise
+    TimeoutError once deadline passes; a response that still arrives is cached.
+    """
+    cache = get_response_cache()
+    model_name = model_for(template)
+    model = get_backend(model_name)
+    key = cache.make_key(model_name, template, PROMPT_VERSIONS[template], args)
+    with get_metrics().track_call(template, model_name) as call:
+        cached = cache.get(key)
+        if cached is not None:
+            call.cache_hit = True
+            if on_cached:
+                on_cached()
+            if on_item:
+                replay_items(cached, on_item)
+            return cached
+        
+        def store_late(response):
+            # Runs on a hedge pool thread without the page context, so failures are dropped quietly
+            try:
+                cache.set(key, extract_json(response.text, RESPONSE_DEFAULTS[template]))
+            except JSONExtractionError:
+                pass
+        
+        def call_model():
+            if on_item:
+                parser = IncrementalJSONParser(STREAMED_LISTS)
+                # Only opening the stream is retried; a rate limit surfaces before any chunk arrives
+                stream = get_rate_limiter().call(
+                    model.generate_content, prompt, generation_config=GENERATION_CONFIGS[template],
+                    stream=True, on_retry=call.retried
+                )
+                for chunk in stream:
+                    call.first_token()
+                    for list_name, item in parser.feed(chunk.text):
+                        on_item(list_name, item)
+                # Usage metadata arrives with the final chunk
+                call.usage(stream)
+                response_text = parser.text
+            else:
+                # The request timeout also bounds an attempt that lost the hedge race
+                timeout = GEMINI_TIMEOUT if deadline is None else deadline.timeout(GEMINI_TIMEOUT)
+                response, call.hedge_won = hedged_call(
+                    partial(
+                        get_rate_limiter().call, model.generate_content, prompt,
+                        generation_config=GENERATION_CONFIGS[template],
+                        request_options={'timeout': timeout},
+                        on_retry=call.retried
+                    ),
+                    hedge_delay(template),
+                    None if deadline is None else deadline.remaining(),
+                    on_hedge=call.hedged,
+                    on_late=store_late
+                )
+                call.usage(response)
+                response_text = response.text
+            # JSON mode returns bare JSON, so this is the decoder's fast path; repairs only kick in on truncation
+            result = parse_json_response(response_text, RESPONSE_DEFAULTS[template])
+            
+            # Parse failures are worth retrying, so only cache good responses
+            if "error" not in result:
+                cache.set(key, result)
+            else:
+                call.parse_failed(result["error"], response_text)
+            return result
+        
+        result, shared = get_single_flight().do(key, call_model)
+        call.coalesced = shared
+    if shared and on_item:
+        # The items streamed to the session that made the call; show them here too
+        replay_items(result, on_item)
+    return result
+
+def replay_items(result, on_item):
+    for list_name in STREAMED_LISTS:
+        for item in result.get(list_name, []):
+            on_item(list_name, item)
+
+def variant_note(variant):
+    """Prompt line asking a re-rolled stage for different picks than earlier variants"""
+    return f"\n    Variation {variant}: choose different places than the most obvious picks." if variant else ""
+
+def trip_summary_prompt(city, budget_bucket, variant=0):
+    """Instructions for the trip summary; the response shape comes from schemas.TripSummary"""
+    return f"""
+    You are a travel expert. Summarize a trip to {city} on {budget_bucket_label(budget_bucket)} USD per day.
+    overview: 2-3 sentences on what makes {city} special and what to expect.
+    best_time: specific months with weather. currency: local currency name and symbol.
+    highlights: a must-see attraction, a cultural experience and a local specialty, each with a brief detail.{variant_note(variant)}
+    """
+
+def generate_trip_summary(city, budget, days, variant=0, on_cached=None, deadline=None):
     """Generate trip summary with error handling"""
     try:
-        prompt = f"""
-        You are a travel expert. Create a comprehensive travel summary for {city} with ${budget} USD budget for {days} days.
+        bucket = budget_bucket(budget / days)
+        prompt = trip_summary_prompt(city, bucket, variant)
         
-        IMPORTANT: Respond with ONLY a valid JSON object. No additional text or explanation.
-        
-        {{
-            "city": "{city}",
-            "total_budget": {budget},
-            "duration": {days},
-            "overview": "Detailed 2-3 sentence overview highlighting what makes {city} special and what travelers can expect during their {days}-day visit",
-            "budget_breakdown": {{
-                "accommodation": "${int(budget * 0.35)}",
-                "food": "${int(budget * 0.30)}",
-                "activities": "${int(budget * 0.25)}",
-                "transport": "${int(budget * 0.10)}"
-            }},
-            "best_time": "Specific months with weather details",
-            "currency": "Local currency name and symbol",
-            "highlights": ["Must-see attraction with brief detail", "Cultural experience with context", "Local specialty or unique feature"]
-        }}
-        """
-        
-        response = model.generate_content(prompt)
-        return parse_json_response(response.text)
+        args = {"city": city, "budget_bucket": bucket, "variant": variant}
+        return generate_json("summary", args, prompt, on_cached=on_cached, deadline=deadline)
         
     except Exception as e:
         st.error(f"Error generating trip summary: {e}")
         return {"error": f"API Error: {e}"}
 
-def generate_daily_itinerary(city, day, budget_per_day):
+def daily_itinerary_prompt(city, day, budget_bucket, variant=0):
+    """Instructions for one day's plan; the response shape comes from schemas.DayPlan"""
+    return f"""
+    You are a local travel guide for {city}. Plan day {day} of a trip with a {budget_bucket_label(budget_bucket)} USD daily budget.
+    Respect local culture, opening hours and travel times.
+    day: {day}. theme: a specific theme such as "Ancient Temples & Spiritual Sites".
+    activities: 4, morning to evening, each at an exact named location with a duration, a USD cost range and a description of what to see and why.
+    meals: breakfast, lunch and dinner at named local restaurants, with time, dish and USD cost range.
+    transportation: how to get around, with costs and tips.{variant_note(variant)}
+    """
+
+def generate_daily_itinerary(city, day, budget_per_day, on_item=None, variant=0, on_cached=None, deadline=None):
     """Generate daily itinerary with error handling"""
     try:
-        prompt = f"""
-        You are a local travel guide for {city}. Create a detailed day {day} itinerary with ${budget_per_day:.0f} USD daily budget.
+        bucket = budget_bucket(budget_per_day)
+        prompt = daily_itinerary_prompt(city, day, bucket, variant)
         
-        Consider local culture, opening hours, travel times, and realistic scheduling.
-        
-        IMPORTANT: Respond with ONLY a valid JSON object. No additional text.
-        
-        {{
-            "day": {day},
-            "theme": "Specific theme like 'Ancient Temples & Spiritual Sites' or 'Street Food & Local Markets'",
-            "activities": [
-                {{
-                    "time": "8:00 AM",
-                    "activity": "Specific activity name with location details",
-                    "location": "Exact location name, address or landmark",
-                    "duration": "2 hours",
-                    "cost": "${int(budget_per_day * 0.15)}-{int(budget_per_day * 0.25)}",
-                    "description": "Detailed description of what to expect, what to see, cultural significance"
-                }},
-                {{
-                    "time": "10:30 AM",
-                    "activity": "Next specific activity",
-                    "location": "Exact location",
-                    "duration": "1.5 hours",
-                    "cost": "${int(budget_per_day * 0.10)}-{int(budget_per_day * 0.20)}",
-                    "description": "What makes this special, tips for visitors"
-                }},
-                {{
-                    "time": "2:00 PM",
-                    "activity": "Afternoon activity",
-                    "location": "Specific location",
-                    "duration": "2 hours",
-                    "cost": "${int(budget_per_day * 0.15)}-{int(budget_per_day * 0.30)}",
-                    "description": "Why this is worth visiting"
-                }},
-                {{
-                    "time": "5:00 PM",
-                    "activity": "Evening activity or experience",
-                    "location": "Location name",
-                    "duration": "1.5 hours",
-                    "cost": "${int(budget_per_day * 0.10)}-{int(budget_per_day * 0.25)}",
-                    "description": "Evening experience details"
-                }}
-            ],
-            "meals": [
-                {{
-                    "time": "Breakfast (7:30 AM)",
-                    "restaurant": "Specific restaurant name with local reputation",
-                    "dish": "Traditional local breakfast dish",
-                    "cost": "${int(budget_per_day * 0.08)}-{int(budget_per_day * 0.12)}"
-                }},
-                {{
-                    "time": "Lunch (12:30 PM)",
-                    "restaurant": "Popular local restaurant name",
-                    "dish": "Regional specialty dish",
-                    "cost": "${int(budget_per_day * 0.15)}-{int(budget_per_day * 0.25)}"
-                }},
-                {{
-                    "time": "Dinner (7:00 PM)",
-                    "restaurant": "Recommended dinner spot",
-                    "dish": "Evening specialty or local favorite",
-                    "cost": "${int(budget_per_day * 0.20)}-{int(budget_per_day * 0.35)}"
-                }}
-            ],
-            "transportation": "Detailed transport options: how to get around, costs, local tips",
-            "total_cost": "${int(budget_per_day * 0.85)}-{int(budget_per_day)}"
-        }}
-        """
-        
-        response = model.generate_content(prompt)
-        return parse_json_response(response.text)
+        args = {"city": city, "day": day, "budget_bucket": bucket, "variant": variant}
+        return generate_json("daily", args, prompt, on_item, on_cached, deadline)
         
     except Exception as e:
         st.error(f"Error generating day {day} itinerary: {e}")
         return {"error": f"API Error: {e}"}
 
-def generate_dining_recommendations(city, budget_range):
+def dining_prompt(city, budget_range, variant=0):
+    """Instructions for dining recommendations; the response shape comes from schemas.Dining"""
+    return f"""
+    You are a food expert familiar with {city}. Recommend places to eat in the {budget_range} range: authentic local cuisine, popular spots and hidden gems, with vegetarian options where the culture has them.
+    restaurants: 8 real places, two each with meal_type breakfast, lunch, dinner and snack; price_range is $, $$ or $$$; cost_per_person is a realistic local price.
+    food_districts: 3 main food streets, districts or markets.
+    local_tips: 3 tips on dining customs, timing and paying or ordering.
+    must_try: 4 iconic dishes, including a street food and a dessert or drink.{variant_note(variant)}
+    """
+
+def generate_dining_recommendations(city, budget_range, on_item=None, variant=0, on_cached=None, deadline=None):
     """Generate dining recommendations"""
     try:
-        prompt = f"""
-        You are a food expert familiar with {city}. Generate comprehensive dining recommendations within {budget_range} budget range.
-        
-        Focus on authentic local cuisine, popular spots, and hidden gems. Include vegetarian options if relevant to the culture.
+        prompt = dining_prompt(city, budget_range, variant)
         
-        IMPORTANT: Respond with ONLY a valid JSON object. No additional text.
-        
-        {{
-            "restaurants": [
-                {{
-                    "name": "Actual restaurant name or typical establishment type",
-                    "cuisine": "Specific cuisine type (e.g., North Indian, Maharashtrian, French Bistro)",
-                    "price_range": "$" for budget, "$" for mid-range, "$$" for upscale,
-                    "location": "Specific area, district, or neighborhood",
-                    "specialty": "Signature dish with local importance or popularity",
-                    "meal_type": "breakfast",
-                    "cost_per_person": "Realistic price range in local context"
-                }},
-                {{
-                    "name": "Another restaurant name",
-                    "cuisine": "Different cuisine type",
-                    "price_range": "$",
-                    "location": "Different area",
-                    "specialty": "Must-try dish",
-                    "meal_type": "lunch",
-                    "cost_per_person": "Price range"
-                }},
-                {{
-                    "name": "Dinner restaurant",
-                    "cuisine": "Regional cuisine",
-                    "price_range": "$",
-                    "location": "Popular dining district",
-                    "specialty": "Evening specialty",
-                    "meal_type": "dinner",
-                    "cost_per_person": "Dinner prices"
-                }},
-                {{
-                    "name": "Street food or snack place",
-                    "cuisine": "Street food/Local snacks",
-                    "price_range": "$",
-                    "location": "Market or street food area",
-                    "specialty": "Popular street food item",
-                    "meal_type": "snack",
-                    "cost_per_person": "Snack prices"
-                }},
-                {{
-                    "name": "Another breakfast place",
-                    "cuisine": "Traditional breakfast",
-                    "price_range": "$",
-                    "location": "Local area",
-                    "specialty": "Traditional morning dish",
-                    "meal_type": "breakfast",
-                    "cost_per_person": "Morning meal cost"
-                }},
-                {{
-                    "name": "Lunch restaurant 2",
-                    "cuisine": "Different lunch option",
-                    "price_range": "$",
-                    "location": "Business district or tourist area",
-                    "specialty": "Popular lunch dish",
-                    "meal_type": "lunch",
-                    "cost_per_person": "Lunch pricing"
-                }},
-                {{
-                    "name": "Fine dining or special dinner",
-                    "cuisine": "Upscale local or fusion",
-                    "price_range": "$$",
-                    "location": "Upscale area",
-                    "specialty": "Signature fine dining dish",
-                    "meal_type": "dinner",
-                    "cost_per_person": "Fine dining prices"
-                }},
-                {{
-                    "name": "Tea/coffee/dessert place",
-                    "cuisine": "Cafe or sweets",
-                    "price_range": "$",
-                    "location": "Popular hangout area",
-                    "specialty": "Local dessert or beverage",
-                    "meal_type": "snack",
-                    "cost_per_person": "Cafe prices"
-                }}
-            ],
-            "food_districts": ["Main food street or district name", "Another popular eating area", "Local market or food hub"],
-            "local_tips": ["Important cultural dining tip relevant to {city}", "Local eating customs or timing", "Payment or ordering advice for tourists"],
-            "must_try": ["Iconic local dish unique to {city}", "Regional specialty dish", "Street food that's a local favorite", "Traditional dessert or drink"]
-        }}
-        """
-        
-        response = model.generate_content(prompt)
-        return parse_json_response(response.text)
+        args = {"city": city, "budget_range": budget_range, "variant": variant}
+        return generate_json("dining", args, prompt, on_item, on_cached, deadline)
         
     except Exception as e:
         st.error(f"Error generating dining recommendations: {e}")
         return {"error": f"API Error: {e}"}
 
-def create_simple_map(city):
+def locate_city(city):
+    """Find the city and the landmarks around it in the offline gazetteer"""
+    gazetteer = get_gazetteer()
+    place = gazetteer.lookup_city(city)
+    if place is None:
+        return None, []
+    landmarks = gazetteer.nearby(place["latitude"], place["longitude"], radius_km=25, feature_classes=("S", "L", "T"))
+    return place, landmarks
+
+def create_simple_map(city, place=None, landmarks=None):
     """Create a simple map for the city"""
     try:
-        # Basic coordinates for some major cities (you can expand this)
-        city_coords = {
-            "delhi": [28.6139, 77.2090],
-            "mumbai": [19.0760, 72.8777],
-            "mathura": [27.4924, 77.6737],
-            "lucknow": [26.8467, 80.9462],
-            "paris": [48.8566, 2.3522],
-            "tokyo": [35.6762, 139.6503],
-            "new york": [40.7128, -74.0060],
-            "london": [51.5074, -0.1278]
-        }
-        
-        # Get coordinates for the city (default to Delhi if not found)
-        coords = city_coords.get(city.lower(), [28.6139, 77.2090])
+        # Look the city up in the offline gazetteer instead of guessing
+        if place is None:
+            place, landmarks = locate_city(city)
+        if place is None:
+            st.info(f"📍 Couldn't find {city.title()} in the offline map data, so no map is shown.")
+            return None
+        coords = [place["latitude"], place["longitude"]]
         
         # Create map
         m = folium.Map(location=coords, zoom_start=12)
@@ -296,13 +248,229 @@ def create_simple_map(city):
             icon=folium.Icon(color='red', icon='info-sign')
         ).add_to(m)
         
+        # Well-known places around the city center
+        for landmark in landmarks or []:
+            folium.Marker(
+                [landmark["latitude"], landmark["longitude"]],
+                tooltip=landmark["name"],
+                icon=folium.Icon(color='blue', icon='star')
+            ).add_to(m)
+        
         return m
         
     except Exception as e:
         st.error(f"Error creating map: {e}")
         return None
 
+def render_city_map_html(city):
+    """Rendered HTML of the city map; unchanged maps come from the map cache without building folium objects"""
+    place, landmarks = locate_city(city)
+    if place is None:
+        st.info(f"📍 Couldn't find {city.title()} in the offline map data, so no map is shown.")
+        return None
+    
+    cache = get_map_cache()
+    key = cache.make_key(
+        [place["latitude"], place["longitude"]],
+        [[l["name"], l["latitude"], l["longitude"]] for l in landmarks],
+        style="simple",
+        title=city.title()
+    )
+    html = cache.get(key)
+    if html is None:
+        city_map = create_simple_map(city, place, landmarks)
+        if city_map is None:
+            return None
+        html = city_map._repr_html_()
+        cache.put(key, html)
+    return html
+
+def stage_label(stage):
+    """Human readable name for a pipeline stage"""
+    if stage == "summary":
+        return "Trip overview"
+    if stage == "dining":
+        return "Restaurant recommendations"
+    if stage.startswith("day_"):
+        return f"Day {stage[4:]} plan"
+    if stage == "map_data":
+        return "Map locations"
+    return stage
+
+def determine_budget_range(daily_budget):
+    """Map a daily budget onto the dining price tier"""
+    return "budget-friendly" if daily_budget < 50 else "mid-range" if daily_budget < 150 else "luxury"
+
+def run_pipeline(city, budget, days, on_stage_complete=None, variants=None, item_renderers=None):
+    """Run summary, daily plans and dining concurrently and return their results.
+    
+    variants maps a stage name to the re-roll number to generate for it; the
+    stages served from the response cache are listed under "reused". Every
+    stage shares the itinerary's ITINERARY_DEADLINE; one still waiting on the
+    model when it passes comes back as an error. item_renderers maps a day or
+    dining stage to an on_item callback that streams its response, called on
+    the stage's worker thread as each item arrives.
+    """
+    daily_budget = budget / days
+    budget_range = determine_budget_range(daily_budget)
+    variants = variants or {}
+    item_renderers = item_renderers or {}
+    reused = set()
+    deadline = make_deadline(ITINERARY_DEADLINE)
+    
+    # Worker threads need the script context so st.error calls and streamed items reach the page
+    ctx = get_script_run_ctx()
+    scheduler = StageScheduler(
+        MAX_CONCURRENT_STAGES,
+        thread_initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    )
+    
+    scheduler.add_stage("summary", partial(
+        generate_trip_summary, city, budget, days,
+        variant=variants.get("summary", 0), on_cached=partial(reused.add, "summary"), deadline=deadline
+    ))
+    day_stages = [
+        scheduler.add_stage(f"day_{day}", partial(
+            generate_daily_itinerary, city, day, daily_budget, on_item=item_renderers.get(f"day_{day}"),
+            variant=variants.get(f"day_{day}", 0), on_cached=partial(reused.add, f"day_{day}"), deadline=deadline
+        ))
+        for day in range(1, days + 1)
+    ]
+    scheduler.add_stage("dining", partial(
+        generate_dining_recommendations, city, budget_range, on_item=item_renderers.get("dining"),
+        variant=variants.get("dining", 0), on_cached=partial(reused.add, "dining"), deadline=deadline
+    ))
+    
+    results = scheduler.run(on_stage_complete)
+    
+    return {
+        "summary": results["summary"],
+        "daily_itineraries": [results[name] for name in day_stages],
+        "dining": results["dining"],
+        "reused": sorted(reused)
+    }
+
+def streamed_item_markdown(list_name, item):
+    """One line of markdown for an activity, meal or restaurant that just arrived"""
+    if list_name == "activities":
+        return f"**⏰ {item.get('time', 'Time')}** · **{item.get('activity', 'Activity')}** · 📍 {item.get('location', 'Location')}"
+    if list_name == "meals":
+        return f"🍽️ **{item.get('time', 'Meal')}** · {item.get('restaurant', 'Restaurant')} · {item.get('dish', 'Dish')}"
+    return f"🏪 **{item.get('name', 'Restaurant')}** ({item.get('meal_type', 'any time')}) · ⭐ {item.get('specialty', 'House special')}"
+
+def stream_into(placeholder):
+    """on_item callback that adds each streamed item to the block shown in an st.empty() placeholder"""
+    lines = []
+    def on_item(list_name, item):
+        lines.append(streamed_item_markdown(list_name, item))
+        placeholder.markdown("\n\n".join(lines))
+    return on_item
+
+def run_streaming_pipeline(city, budget, days, on_stage_complete=None, variants=None):
+    """run_pipeline with every item rendered on the page while it streams in.
+    
+    Each day and the dining stage stream into their own placeholder from the
+    scheduler's worker threads, so the stages still run concurrently.
+    """
+    overview = st.empty()
+    item_renderers = {}
+    for day in range(1, days + 1):
+        with st.expander(f"Day {day}", expanded=True):
+            item_renderers[f"day_{day}"] = stream_into(st.empty())
+    with st.expander("🍽️ Restaurants", expanded=True):
+        item_renderers["dining"] = stream_into(st.empty())
+    
+    def on_complete(stage, result, completed, total):
+        if stage == "summary" and result.get("overview"):
+            overview.markdown(f"**✨ Overview:** {result['overview']}")
+        if on_stage_complete:
+            on_stage_complete(stage, result, completed, total)
+    
+    return run_pipeline(city, budget, days, on_complete, variants, item_renderers)
+
+def get_result_store():
+    """This session's store of generated itineraries"""
+    if "result_store" not in st.session_state:
+        st.session_state.result_store = SessionResultStore()
+    return st.session_state.result_store
+
+@st.cache_resource
+def start_metrics_server():
+    """Prometheus endpoint for this server process, started once if METRICS_PORT is set"""
+    if METRICS_PORT:
+        return get_metrics().serve(METRICS_PORT)
+    return None
+
+@st.cache_resource
+def get_job_queue():
+    """Job queue shared by every session, with workers running for the life of the server"""
+    queue = JobQueue()
+    queue.start_workers(run_pipeline, JOB_WORKERS)
+    return queue
+
+def pending_job(request_key, params, store):
+    """ID of an unfinished job to keep following on this run, if any"""
+    queue = get_job_queue()
+    job_id = st.session_state.get("active_job")
+    if job_id:
+        job = queue.get(job_id)
+        if job and job["status"] in ("queued", "running"):
+            return job_id
+        key = job and SessionResultStore.make_key(job["params"]["city"], job["params"]["budget"], job["params"]["days"])
+        if job and key not in store:
+            # Finished while this session was away; pick up the result now
+            return job_id
+        st.session_state.pop("active_job", None)
+    if request_key and request_key not in store:
+        # Another session, or this one before a reconnect, is already generating these inputs
+        return queue.find_active(params)
+    return None
+
+def wait_for_job(job_id, on_stage_complete=None, poll_interval=0.5):
+    """Poll a background job until it finishes, reporting each stage as its result lands"""
+    queue = get_job_queue()
+    seen = set()
+    while True:
+        job = queue.get(job_id)
+        if job is None:
+            return None
+        for stage, result in job["stages"].items():
+            if stage not in seen:
+                seen.add(stage)
+                if on_stage_complete:
+                    on_stage_complete(stage, result, len(seen), job["total"])
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(poll_interval)
+
+def stage_variants(city):
+    """This session's re-roll numbers for each stage of a city's trips"""
+    return st.session_state.setdefault("variants", {}).setdefault(" ".join(city.split()).lower(), {})
+
+def reroll_stage(city, budget, days, stage):
+    """Button callback: regenerate one stage of a trip, reusing the others from the cache"""
+    variants = stage_variants(city)
+    variants[stage] = variants.get(stage, 0) + 1
+    st.session_state.reroll = {"city": city, "budget": budget, "days": days}
+
+def retry_failed(city, budget, days):
+    """Button callback: generate a trip again; failed stages aren't cached, so only they are called for"""
+    st.session_state.reroll = {"city": city, "budget": budget, "days": days}
+
+def reuse_caption(results, days, failed=()):
+    """Which stages came from the cache and which were generated for this trip; failed ones are neither"""
+    stages = ["summary", *(f"day_{day}" for day in range(1, days + 1)), "dining"]
+    reused = set(results.get("reused", []))
+    parts = []
+    if reused:
+        parts.append("♻️ Reused: " + ", ".join(stage_label(stage) for stage in stages if stage in reused))
+    generated = [stage_label(stage) for stage in stages if stage not in reused and stage not in failed]
+    if generated:
+        parts.append("✨ Generated: " + ", ".join(generated))
+    return " · ".join(parts)
+
 def main():
+    start_metrics_server()
     st.title("🌍 AI Travel Itinerary Generator")
     st.markdown("**Create personalized travel itineraries with dining recommendations for any city!**")
     
@@ -316,60 +484,91 @@ def main():
         
         st.info("💡 **Indian Cities**: Try Mathura, Delhi, Mumbai, Lucknow!")
         
+        stream_results = st.checkbox(
+            "⚡ Show results as they stream in",
+            value=False,
+            help="Streams each item onto the page, but generation stops if you leave or rerun. "
+                 "Otherwise it runs in the background and survives reruns."
+        )
+        
         generate_btn = st.button("🚀 Generate Itinerary", type="primary", use_container_width=True)
+        
+        cache_stats = get_response_cache().stats()
+        st.caption(f"⚡ Response cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · {cache_stats['entries']} entries")
+        flight_stats = get_single_flight().stats()
+        st.caption(f"🔗 Model calls: {flight_stats['calls']} made · {flight_stats['coalesced']} shared with identical requests in flight")
+        
+        store = get_result_store()
+        st.caption(f"🗂️ Saved this session: {len(store)} itineraries · {store.memory_bytes / 1024:.0f} KB")
+    
+    # A re-roll button regenerates the trip it belongs to, whatever the sidebar now says
+    reroll = st.session_state.pop("reroll", None)
+    if reroll:
+        city, budget, days = reroll["city"], reroll["budget"], reroll["days"]
+    generate = generate_btn or reroll is not None
+    
+    request_key = SessionResultStore.make_key(city, budget, days) if city else None
+    params = {"city": city, "budget": budget, "days": days}
+    variants = stage_variants(city) if city else {}
+    if variants:
+        params["variants"] = dict(variants)
     
     # Main content
-    if not api_key:
+    if not api_key and MODEL_BACKEND != 'fake':
         st.error("⚠️ **Gemini API Key not found!** Please add your API key to the .env file.")
         st.code("GEMINI_API_KEY=your_api_key_here")
         return
     
-    if generate_btn:
-        if not city:
-            st.warning("Please enter a city name!")
-            return
-        
+    if generate and not city:
+        st.warning("Please enter a city name!")
+        return
+    
+    if generate and not stream_results:
+        # Generation runs on background workers, so reruns and reconnects don't lose it
+        job_id = get_job_queue().submit(params)
+        st.session_state.active_job = job_id
+    elif generate:
+        job_id = None
+    else:
+        job_id = pending_job(request_key, params, store)
+    
+    if generate or job_id:
         try:
             # Progress tracking
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            # Step 1: Generate Summary
-            status_text.text("🔄 Step 1: Generating trip overview...")
-            progress_bar.progress(20)
-            
-            summary = generate_trip_summary(city, budget, days)
-            
-            if "error" in summary:
-                st.error(f"Error in summary generation: {summary.get('error', 'Unknown error')}")
-                if "raw_text" in summary:
-                    st.text(f"Raw response: {summary['raw_text']}")
-                return
-            
-            # Step 2: Generate Daily Itineraries
-            status_text.text("🔄 Step 2: Creating daily plans...")
-            progress_bar.progress(40)
+            # Generate summary, daily plans and dining
+            status_text.text("🔄 Generating trip overview, daily plans and restaurants...")
             
-            daily_budget = budget / days
-            daily_itineraries = []
+            def on_stage_complete(stage, result, completed, total):
+                progress_bar.progress(int(completed / (total + 1) * 100))
+                status_text.text(f"✅ {stage_label(stage)} ready ({completed}/{total})")
             
-            for day in range(1, days + 1):
-                daily_plan = generate_daily_itinerary(city, day, daily_budget)
-                daily_itineraries.append(daily_plan)
-                time.sleep(0.5)  # Small delay to avoid rate limiting
+            if job_id:
+                job = wait_for_job(job_id, on_stage_complete)
+                st.session_state.pop("active_job", None)
+                if job is None or job["status"] != "done":
+                    st.error(f"❌ **Generation failed**: {job['error'] if job else 'job expired'}")
+                    return
+                results = job["result"]
+                city, budget, days = job["params"]["city"], job["params"]["budget"], job["params"]["days"]
+                request_key = SessionResultStore.make_key(city, budget, days)
+            else:
+                # Live preview of each item as it arrives, replaced by the full results below
+                live_preview = st.empty()
+                with live_preview.container():
+                    results = run_streaming_pipeline(city, budget, days, on_stage_complete, variants)
+                live_preview.empty()
+            # A failed summary is kept like any other failed stage: the trip lists it and offers a retry
+            summary = results["summary"]
+            daily_itineraries = results["daily_itineraries"]
+            dining = results["dining"]
             
-            # Step 3: Generate Dining Recommendations
-            status_text.text("🔄 Step 3: Finding best restaurants...")
-            progress_bar.progress(70)
+            # Create Map
+            status_text.text("🔄 Creating your map...")
             
-            budget_range = "budget-friendly" if daily_budget < 50 else "mid-range" if daily_budget < 150 else "luxury"
-            dining = generate_dining_recommendations(city, budget_range)
-            
-            # Step 4: Create Map
-            status_text.text("🔄 Step 4: Creating your map...")
-            progress_bar.progress(90)
-            
-            city_map = create_simple_map(city)
+            map_html = render_city_map_html(city)
             
             # Complete
             progress_bar.progress(100)
@@ -378,13 +577,28 @@ def main():
             status_text.empty()
             progress_bar.empty()
             
+            # Keep the trip so reruns re-render it instead of regenerating; the map HTML comes from the map cache
+            trip = Trip.from_stages(city, budget, days, summary, daily_itineraries, dining)
+            apply_budget(trip)
+            store.put(request_key, trip)
+            st.session_state.active_result = request_key
+            
             # Display Results
-            display_results(summary, daily_itineraries, dining, city_map, city, budget, days)
+            st.caption(reuse_caption(results, days, trip.failed_stages))
+            display_results(trip, map_html)
             
         except Exception as e:
             st.error(f"❌ **Unexpected Error**: {e}")
             st.info("💡 **Troubleshooting**: Try with a different city name or refresh the page.")
     
+    elif request_key in store or st.session_state.get("active_result") in store:
+        # Rerun: re-render the stored itinerary for these inputs, or the last one generated
+        stored_key = request_key if request_key in store else st.session_state.active_result
+        trip = store.get(stored_key)
+        if stored_key != request_key:
+            st.caption(f"Showing your saved {trip.city.title()} itinerary. Press **Generate Itinerary** to plan the new trip.")
+        display_results(trip, render_city_map_html(trip.city))
+    
     else:
         # Show example when no generation is running
         st.markdown("---")
@@ -399,157 +613,162 @@ def main():
         with col3:
             st.info("💰 **Budget Tips**\n\n- $200-400: Budget travel\n- $500-800: Mid-range\n- $1000+: Luxury")
 
-def display_results(summary, daily_itineraries, dining, city_map, city, budget, days):
-    """Display all generated results"""
+# Dining sections shown in display_results: (meal_type, heading, cuisine icon)
+DINING_SECTIONS = (
+    ("breakfast", "🌅 Breakfast Spots", "🍳"),
+    ("lunch", "🌞 Lunch Places", "🍽️"),
+    ("dinner", "🌙 Dinner Restaurants", "🍽️")
+)
+
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_\[\]<>|$~#])")
+
+def md(text):
+    """Escape model text for a markdown block; "$" pairs would otherwise render as LaTeX"""
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", str(text))
+
+def group_by_meal_type(restaurants):
+    """Restaurants keyed by meal_type, in one pass"""
+    groups = {}
+    for restaurant in restaurants:
+        groups.setdefault(restaurant.meal_type, []).append(restaurant)
+    return groups
+
+def bullet_list(items):
+    return "\n".join(f"- {md(item)}" for item in items)
+
+def day_markdown(daily, totals=None):
+    """One markdown block for a day: activities, meals, transport and total.
+    
+    totals is the day's entry of budget_engine.budget_report, to flag a day over its allowance.
+    """
+    parts = []
+    if daily.activities:
+        lines = ["### 🎯 Activities"]
+        for activity in daily.activities:
+            lines.append(f"**⏰ {md(activity.time)}** · **{md(activity.activity)}**  ")
+            lines.append(f"📍 {md(activity.location)}  ")
+            lines.append(f"💵 {md(activity.cost)} | ⏱️ {md(activity.duration)}" + ("  " if activity.description else ""))
+            if activity.description:
+                lines.append(f"ℹ️ {md(activity.description)}")
+            lines.append("\n---\n")
+        parts.append("\n".join(lines))
+    if daily.meals:
+        # A table keeps the meals side by side like the old per-meal columns
+        parts.append("\n".join([
+            "### 🍽️ Recommended Meals",
+            "| " + " | ".join(f"**{md(meal.time)}**" for meal in daily.meals) + " |",
+            "|" + " --- |" * len(daily.meals),
+            "| " + " | ".join(f"🏪 {md(meal.restaurant)}" for meal in daily.meals) + " |",
+            "| " + " | ".join(f"🍽️ {md(meal.dish)}" for meal in daily.meals) + " |",
+            "| " + " | ".join(f"💰 {md(meal.cost)}" for meal in daily.meals) + " |",
+        ]))
+    footer = []
+    if daily.transportation:
+        footer.append(f"🚗 **Transport:** {md(daily.transportation)}")
+    if daily.total_cost:
+        footer.append(f"💰 **Daily Total:** {md(daily.total_cost)}")
+    if totals and totals["over"]:
+        footer.append(f"⚠️ Above the {md(format_range(totals['allowance'], totals['allowance']))} daily allowance for activities and meals")
+    if footer:
+        parts.append(" · ".join(footer))
+    return "\n\n".join(parts)
+
+def dining_markdown(restaurants):
+    """One markdown block with the top three restaurants for each meal"""
+    groups = group_by_meal_type(restaurants)
+    sections = []
+    for meal_type, heading, icon in DINING_SECTIONS:
+        places = groups.get(meal_type)
+        if not places:
+            continue
+        lines = [f"### {heading}"]
+        for place in places[:3]:
+            lines.append(f"**{md(place.name)}** · {md(place.price_range)} · 💰 {md(place.cost_per_person)}  ")
+            lines.append(f"{icon} {md(place.cuisine)} | 📍 {md(place.location)}  ")
+            lines.append(f"⭐ Try: {md(place.specialty)}\n")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+def display_results(trip, map_html):
+    """Display all generated results, one markdown block per section to keep the number of deltas small"""
     
     # Trip Summary
-    st.header(f"🎯 {city.title()} Trip Summary")
+    st.header(f"🎯 {trip.city.title()} Trip Summary")
     
     # Metrics row
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("💰 Total Budget", f"${budget}")
+        st.metric("💰 Total Budget", f"${trip.budget:g}")
     with col2:
-        st.metric("📅 Duration", f"{days} days")
+        st.metric("📅 Duration", f"{trip.duration} days")
     with col3:
-        if summary.get("currency"):
-            st.metric("💱 Currency", summary["currency"])
+        if trip.currency:
+            st.metric("💱 Currency", trip.currency)
     with col4:
-        if summary.get("best_time"):
-            st.metric("🌤️ Best Time", summary["best_time"])
-    
-    # Overview
-    if summary.get("overview"):
-        st.write("**✨ Overview:**", summary["overview"])
+        if trip.best_time:
+            st.metric("🌤️ Best Time", trip.best_time)
     
-    # Highlights
-    if summary.get("highlights"):
-        st.write("**🌟 Top Highlights:**")
-        for highlight in summary["highlights"]:
-            st.write(f"• {highlight}")
+    # Overview, highlights and the locally computed budget check
+    report = budget_report(trip)
+    overview = []
+    if trip.overview:
+        overview.append(f"**✨ Overview:** {md(trip.overview)}")
+    if trip.highlights:
+        overview.append("**🌟 Top Highlights:**\n\n" + bullet_list(trip.highlights))
+    if report["days"]:
+        estimate = f"**💵 Estimated Spend:** {md(format_range(report['low'], report['high']))} of your {md(format_range(trip.budget, trip.budget))} budget"
+        if report["over"]:
+            estimate += " · ⚠️ may run over"
+        overview.append(estimate + "  \n" + " · ".join(
+            f"{md(category.title())} {md(amount)}" for category, amount in trip.budget_breakdown.items()
+        ))
+    overview.append("---")
+    st.markdown("\n\n".join(overview))
     
-    st.markdown("---")
+    if trip.failed_stages:
+        missing = ", ".join(stage_label(stage) for stage in trip.failed_stages)
+        st.warning(f"⚠️ Not generated in time or failed: {missing}. The rest of the trip is shown without them.")
+        st.button("🔁 Retry missing parts", key="retry_failed", on_click=retry_failed,
+                  args=(trip.city, trip.budget, trip.duration))
     
     # Daily Itineraries
     st.header("📅 Day-by-Day Itinerary")
     
-    for daily in daily_itineraries:
-        if "error" not in daily:
-            with st.expander(f"Day {daily.get('day', 'N/A')} - {daily.get('theme', 'Explore')}", expanded=True):
-                
-                # Activities
-                if daily.get("activities"):
-                    st.subheader("🎯 Activities")
-                    for activity in daily["activities"]:
-                        col1, col2 = st.columns([1, 3])
-                        with col1:
-                            st.write(f"**⏰ {activity.get('time', 'Time')}**")
-                        with col2:
-                            st.write(f"**{activity.get('activity', 'Activity')}**")
-                            st.write(f"📍 {activity.get('location', 'Location')}")
-                            st.write(f"💵 {activity.get('cost', 'Cost')} | ⏱️ {activity.get('duration', 'Duration')}")
-                            if activity.get('description'):
-                                st.write(f"ℹ️ {activity['description']}")
-                        st.write("---")
-                
-                # Meals
-                if daily.get("meals"):
-                    st.subheader("🍽️ Recommended Meals")
-                    meal_cols = st.columns(len(daily["meals"]))
-                    for idx, meal in enumerate(daily["meals"]):
-                        with meal_cols[idx]:
-                            st.write(f"**{meal.get('time', 'Meal')}**")
-                            st.write(f"🏪 {meal.get('restaurant', 'Restaurant')}")
-                            st.write(f"🍽️ {meal.get('dish', 'Dish')}")
-                            st.write(f"💰 {meal.get('cost', 'Cost')}")
-                
-                # Transportation & Total
-                col1, col2 = st.columns(2)
-                with col1:
-                    if daily.get("transportation"):
-                        st.write(f"🚗 **Transport:** {daily['transportation']}")
-                with col2:
-                    if daily.get("total_cost"):
-                        st.write(f"💰 **Daily Total:** {daily['total_cost']}")
+    for daily in trip.days:
+        with st.expander(f"Day {daily.day} - {daily.theme}", expanded=True):
+            st.markdown(day_markdown(daily, report["days"].get(daily.day)))
+            st.button("🎲 Re-roll this day", key=f"reroll_day_{daily.day}", on_click=reroll_stage,
+                      args=(trip.city, trip.budget, trip.duration, f"day_{daily.day}"))
     
     st.markdown("---")
     
     # Dining Recommendations
     st.header("🍽️ Best Restaurants & Food")
     
-    if "error" not in dining and dining.get("restaurants"):
-        
-        # Organize restaurants by meal type
-        breakfast_places = [r for r in dining["restaurants"] if r.get("meal_type") == "breakfast"]
-        lunch_places = [r for r in dining["restaurants"] if r.get("meal_type") == "lunch"]
-        dinner_places = [r for r in dining["restaurants"] if r.get("meal_type") == "dinner"]
-        snack_places = [r for r in dining["restaurants"] if r.get("meal_type") == "snack"]
-        
-        # Breakfast
-        if breakfast_places:
-            st.subheader("🌅 Breakfast Spots")
-            for place in breakfast_places[:3]:
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    st.write(f"**{place.get('name', 'Restaurant')}**")
-                    st.write(f"🍳 {place.get('cuisine', 'Cuisine')} | 📍 {place.get('location', 'Location')}")
-                    st.write(f"⭐ Try: {place.get('specialty', 'House special')}")
-                with col2:
-                    st.metric("Price", place.get('price_range', 'N/A'))
-                    st.write(f"💰 {place.get('cost_per_person', 'Cost')}")
-        
-        # Lunch  
-        if lunch_places:
-            st.subheader("🌞 Lunch Places")
-            for place in lunch_places[:3]:
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    st.write(f"**{place.get('name', 'Restaurant')}**")
-                    st.write(f"🍽️ {place.get('cuisine', 'Cuisine')} | 📍 {place.get('location', 'Location')}")
-                    st.write(f"⭐ Try: {place.get('specialty', 'House special')}")
-                with col2:
-                    st.metric("Price", place.get('price_range', 'N/A'))
-                    st.write(f"💰 {place.get('cost_per_person', 'Cost')}")
-        
-        # Dinner
-        if dinner_places:
-            st.subheader("🌙 Dinner Restaurants")
-            for place in dinner_places[:3]:
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    st.write(f"**{place.get('name', 'Restaurant')}**")
-                    st.write(f"🍽️ {place.get('cuisine', 'Cuisine')} | 📍 {place.get('location', 'Location')}")
-                    st.write(f"⭐ Try: {place.get('specialty', 'House special')}")
-                with col2:
-                    st.metric("Price", place.get('price_range', 'N/A'))
-                    st.write(f"💰 {place.get('cost_per_person', 'Cost')}")
+    if trip.restaurants:
+        st.markdown(dining_markdown(trip.restaurants))
         
         # Additional Info
         col1, col2 = st.columns(2)
-        
         with col1:
-            if dining.get("food_districts"):
-                st.subheader("🏙️ Popular Food Areas")
-                for district in dining["food_districts"]:
-                    st.write(f"• {district}")
-        
+            if trip.food_districts:
+                st.markdown("### 🏙️ Popular Food Areas\n\n" + bullet_list(trip.food_districts))
         with col2:
-            if dining.get("must_try"):
-                st.subheader("🥘 Must-Try Local Dishes")
-                for dish in dining["must_try"]:
-                    st.write(f"• {dish}")
+            if trip.must_try:
+                st.markdown("### 🥘 Must-Try Local Dishes\n\n" + bullet_list(trip.must_try))
+        
+        if trip.local_tips:
+            st.markdown("### 💡 Local Food Tips\n\n" + bullet_list(trip.local_tips))
         
-        if dining.get("local_tips"):
-            st.subheader("💡 Local Food Tips")
-            for tip in dining["local_tips"]:
-                st.write(f"• {tip}")
+        st.button("🎲 Re-roll restaurants", key="reroll_dining", on_click=reroll_stage,
+                  args=(trip.city, trip.budget, trip.duration, "dining"))
     
     st.markdown("---")
     
     # Map
-    if city_map:
+    if map_html:
         st.header("🗺️ Your Destination")
-        st.components.v1.html(city_map._repr_html_(), height=400)
+        st.components.v1.html(map_html, height=400)
 
 if __name__ == "__main__":
     main()
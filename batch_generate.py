@@ -0,0 +1,195 @@
+"""Generate itineraries headlessly from a JSONL file of trip requests.
+
+Each input line is an object with ``city``, ``budget`` and ``days`` and an
+optional ``id`` (the line number is used otherwise):
+
+    {"id": "agra-3", "city": "Agra", "budget": 600, "days": 3}
+
+A line that isn't a JSON object is written as an error result under its line
+number and the rest of the batch carries on.
+
+Requests run on a bounded worker pool and every result is appended to the
+output JSONL as soon as it finishes. Successful IDs are recorded in a
+checkpoint file, so re-running the same command after a crash skips them and
+retries only what is left (including requests that failed).
+
+Unlike the app, a batch has no per-itinerary deadline by default: time spent
+queueing in the rate limiter would otherwise count against it and turn slow
+but healthy trips into partial ones. Pass ``--deadline`` to set one.
+
+    python batch_generate.py trips.jsonl itineraries.jsonl --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from itinerary_generator import ItineraryGenerator
+from metrics import get_metrics
+
+
+def read_requests(path):
+    """Yield (request_id, request) for every trip request in a JSONL file.
+
+    A malformed line yields its line number and a ValueError instead of a request.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield str(line_number), ValueError(f"Line {line_number} is not valid JSON: {e}")
+                continue
+            if not isinstance(request, dict):
+                yield str(line_number), ValueError(f"Line {line_number} is not a JSON object")
+                continue
+            yield str(request.get("id", line_number)), request
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def failed_stages(itinerary):
+    """Names of stages whose result is a parse-failure placeholder"""
+    stages = {"summary": itinerary["summary"], "dining": itinerary["dining"], "map_data": itinerary["map_data"]}
+    for day, daily in enumerate(itinerary["daily_itineraries"], 1):
+        stages[f"day_{day}"] = daily
+    return [name for name, result in stages.items() if not isinstance(result, dict) or "error" in result]
+
+
+class BatchRunner:
+    def __init__(self, output_path, checkpoint_path, workers=4, generator=None, deadline=0):
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.generator = generator or ItineraryGenerator(deadline=deadline)
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.latencies = []
+        self._write_lock = threading.Lock()
+
+    def run(self, requests):
+        done = read_checkpoint(self.checkpoint_path)
+        start = time.perf_counter()
+        with open(self.output_path, "a", encoding="utf-8") as output, \
+                open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = set()
+            for request_id, request in requests:
+                if request_id in done:
+                    self.skipped += 1
+                    continue
+                if isinstance(request, Exception):
+                    self._write({"id": request_id, "status": "error", "error": str(request)}, output, checkpoint)
+                    continue
+                # Keep only a small window queued so huge inputs aren't read into memory
+                if len(in_flight) >= self.workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._collect(finished, output, checkpoint)
+                in_flight.add(pool.submit(self._generate, request_id, request))
+                # Write whatever has finished meanwhile, so a result never waits behind a slower one
+                finished, in_flight = wait(in_flight, timeout=0)
+                self._collect(finished, output, checkpoint)
+            self._collect(as_completed(in_flight), output, checkpoint)
+        return time.perf_counter() - start
+
+    def _generate(self, request_id, request):
+        start = time.perf_counter()
+        record = {"id": request_id, "request": request}
+        try:
+            itinerary = self.generator.generate_complete_itinerary(
+                request["city"], float(request["budget"]), int(request["days"])
+            )
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        else:
+            # The folium map and the typed trip are rebuilt from the stage results, so only those are written
+            itinerary.pop("map", None)
+            itinerary.pop("trip", None)
+            failed = failed_stages(itinerary)
+            if failed:
+                record.update(status="error", error=f"Failed stages: {', '.join(failed)}")
+            else:
+                record["status"] = "ok"
+            record["result"] = itinerary
+        record["elapsed"] = round(time.perf_counter() - start, 3)
+        return record
+
+    def _collect(self, futures, output, checkpoint):
+        for future in futures:
+            self._write(future.result(), output, checkpoint)
+
+    def _write(self, record, output, checkpoint):
+        """Append a result and, when it succeeded, checkpoint its ID"""
+        with self._write_lock:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            if "request" in record:
+                # Malformed lines never ran, so they don't count towards latency
+                self.latencies.append(record["elapsed"])
+            if record["status"] == "ok":
+                self.succeeded += 1
+                # The result line is flushed first, so a crash can only duplicate work, not lose it
+                checkpoint.write(record["id"] + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+            else:
+                self.failed += 1
+                print(f"[{record['id']}] {record['error']}", file=sys.stderr)
+
+    def report(self, elapsed):
+        processed = self.succeeded + self.failed
+        lines = [
+            f"Processed {processed} requests in {elapsed:.1f}s "
+            f"({self.succeeded} ok, {self.failed} failed, {self.skipped} skipped from checkpoint)"
+        ]
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            lines.append(
+                f"Throughput: {processed / elapsed * 60:.1f} itineraries/min; "
+                f"latency p50 {percentile(latencies, 50):.1f}s, p95 {percentile(latencies, 95):.1f}s, "
+                f"max {latencies[-1]:.1f}s"
+            )
+        if processed:
+            lines.append(f"Error rate: {self.failed / processed:.1%}")
+        return "\n".join(lines)
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file of trip requests")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="itineraries generated concurrently")
+    parser.add_argument("--checkpoint", help="completed-ID file (default: OUTPUT.done)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    parser.add_argument("--deadline", type=float, default=0, help="seconds each itinerary may take (default: no deadline)")
+    args = parser.parse_args(argv)
+
+    if args.metrics_port:
+        get_metrics().serve(args.metrics_port)
+
+    runner = BatchRunner(
+        args.output, args.checkpoint or f"{args.output}.done", workers=max(1, args.workers), deadline=args.deadline
+    )
+    elapsed = runner.run(read_requests(args.input))
+    print(runner.report(elapsed))
+    return 1 if runner.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
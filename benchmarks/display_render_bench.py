@@ -0,0 +1,102 @@
+"""Streamlit deltas and render time of display_results: per-field calls vs batched markdown.
+
+Renders a fake-backend trip of each length with the legacy display_results
+(one st.write/st.columns/st.metric per field) and with app.display_results
+(one markdown block per day and section) under Streamlit's AppTest. Reports
+the number of elements and blocks created, each of which is one delta sent
+to the browser, and the server-side time spent in display_results.
+
+    python -m benchmarks.display_render_bench --days 1 7 14 --repeat 5
+"""
+import argparse
+import json
+import os
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from budget_engine import apply_budget
+from model_backend import FakeBackend
+from models import Trip
+from response_cache import budget_bucket
+from schemas import GENERATION_CONFIGS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CITY = "Mathura"
+
+SCRIPT = f"""
+import sys
+import time
+sys.path.insert(0, {ROOT!r})
+import streamlit as st
+if st.session_state.renderer == "legacy":
+    from benchmarks.legacy_display import display_results
+else:
+    from app import display_results
+start = time.perf_counter()
+display_results(st.session_state.trip, None)
+st.session_state.render_seconds = time.perf_counter() - start
+"""
+
+
+def fake_trip(days, budget_per_day=150):
+    """A trip built from the fake backend's responses to the app's own prompts"""
+    import app  # Deferred: importing app.py configures the Streamlit page
+
+    backend = FakeBackend(latency=0, jitter=0)
+
+    def respond(template, prompt):
+        return json.loads(backend.response_text(prompt, GENERATION_CONFIGS[template]))
+
+    budget_range = app.determine_budget_range(budget_per_day)
+    bucket = budget_bucket(budget_per_day)
+    trip = Trip.from_stages(
+        CITY, budget_per_day * days, days,
+        respond("summary", app.trip_summary_prompt(CITY, bucket)),
+        [respond("daily", app.daily_itinerary_prompt(CITY, day, bucket)) for day in range(1, days + 1)],
+        respond("dining", app.dining_prompt(CITY, budget_range))
+    )
+    apply_budget(trip)
+    return trip
+
+
+def count_nodes(node):
+    """Elements and blocks under a node of the AppTest element tree"""
+    children = getattr(node, "children", None) or {}
+    return 1 + sum(count_nodes(child) for child in children.values())
+
+
+def measure(renderer, trip, repeat):
+    """(deltas, mean seconds in display_results, mean seconds for the whole script run)"""
+    at = AppTest.from_string(SCRIPT, default_timeout=120)
+    at.session_state["renderer"] = renderer
+    at.session_state["trip"] = trip
+    at.run()  # Warm-up: imports and first-render caches
+    render = wall = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        at.run()
+        wall += time.perf_counter() - start
+        render += at.session_state["render_seconds"]
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    # The root node is the container, not a delta
+    return count_nodes(at._tree) - 1, render / repeat, wall / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 14])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'days':>4} {'renderer':<8} {'deltas':>7} {'render ms':>10} {'run ms':>8}")
+    for days in args.days:
+        trip = fake_trip(days)
+        for renderer in ("legacy", "batched"):
+            deltas, render, wall = measure(renderer, trip, args.repeat)
+            print(f"{days:>4} {renderer:<8} {deltas:>7} {render * 1000:>10.1f} {wall * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Microbenchmark for json_extract on large model responses.
+
+Compares the legacy fence-strip + find/rfind + json.loads parser with
+extract_json on clean, defective and truncated responses of increasing size.
+
+    python -m benchmarks.json_extract_bench --days 14 --repeat 200
+"""
+import argparse
+import json
+import timeit
+
+from json_extract import JSONExtractionError, extract_json
+
+
+def make_day(day):
+    return {
+        "day": day,
+        "theme": f"Theme for day {day}",
+        "activities": [
+            {
+                "time": f"{8 + slot * 2}:00 AM",
+                "activity": f"Activity {slot} on day {day}",
+                "location": f"Landmark {day}-{slot}, Old Town",
+                "duration": "2 hours",
+                "cost": "$12-20",
+                "description": "A detailed description of what to expect, " * 4
+            }
+            for slot in range(6)
+        ],
+        "meals": [
+            {"time": meal, "restaurant": f"{meal} place {day}", "dish": "Local speciality", "cost": "$5-10"}
+            for meal in ("Breakfast", "Lunch", "Dinner")
+        ],
+        "transportation": "Auto-rickshaw and walking",
+        "total_cost": "$85-100"
+    }
+
+
+def make_responses(days):
+    document = json.dumps({"days": [make_day(day) for day in range(1, days + 1)]}, indent=2)
+    fenced = f"```json\n{document}\n```"
+    return {
+        "clean": fenced,
+        "trailing_commas": fenced.replace('"\n    }', '",\n    }'),
+        "prose_wrapped": f"Sure! Here is your itinerary:\n{fenced}\nEnjoy your trip!",
+        "truncated": fenced[:int(len(fenced) * 0.8)]
+    }
+
+
+def legacy_parse(text):
+    cleaned = text.strip()
+    if cleaned.startswith('```json'):
+        cleaned = cleaned[7:]
+    elif cleaned.startswith('```'):
+        cleaned = cleaned[3:]
+    if cleaned.endswith('```'):
+        cleaned = cleaned[:-3]
+    cleaned = cleaned.strip()
+    start, end = cleaned.find('{'), cleaned.rfind('}')
+    return json.loads(cleaned[start:end + 1])
+
+
+def succeeds(parser, text):
+    try:
+        parser(text)
+        return True
+    except (ValueError, JSONExtractionError):
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 4, 14])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'days':>4} {'case':<16} {'bytes':>8} {'legacy us':>10} {'ok':>3} {'extract us':>11} {'ok':>3}")
+    for days in args.days:
+        for case, text in make_responses(days).items():
+            legacy_ok = succeeds(legacy_parse, text)
+            extract_ok = succeeds(extract_json, text)
+            legacy_us = timeit.timeit(lambda: succeeds(legacy_parse, text), number=args.repeat) / args.repeat * 1e6
+            extract_us = timeit.timeit(lambda: succeeds(extract_json, text), number=args.repeat) / args.repeat * 1e6
+            print(f"{days:>4} {case:<16} {len(text):>8} {legacy_us:>10.1f} {'y' if legacy_ok else 'n':>3} "
+                  f"{extract_us:>11.1f} {'y' if extract_ok else 'n':>3}")
+
+
+if __name__ == "__main__":
+    main()
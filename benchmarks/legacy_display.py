@@ -0,0 +1,157 @@
+"""display_results as it was before rendering was batched: one Streamlit call per field.
+
+Kept so benchmarks.display_render_bench can compare delta counts and render
+time against the current app.display_results.
+"""
+import streamlit as st
+
+
+def display_results(trip, map_html):
+    """Display all generated results"""
+    
+    # Trip Summary
+    st.header(f"🎯 {trip.city.title()} Trip Summary")
+    
+    # Metrics row
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("💰 Total Budget", f"${trip.budget:g}")
+    with col2:
+        st.metric("📅 Duration", f"{trip.duration} days")
+    with col3:
+        if trip.currency:
+            st.metric("💱 Currency", trip.currency)
+    with col4:
+        if trip.best_time:
+            st.metric("🌤️ Best Time", trip.best_time)
+    
+    # Overview
+    if trip.overview:
+        st.write("**✨ Overview:**", trip.overview)
+    
+    # Highlights
+    if trip.highlights:
+        st.write("**🌟 Top Highlights:**")
+        for highlight in trip.highlights:
+            st.write(f"• {highlight}")
+    
+    st.markdown("---")
+    
+    # Daily Itineraries
+    st.header("📅 Day-by-Day Itinerary")
+    
+    for daily in trip.days:
+        with st.expander(f"Day {daily.day} - {daily.theme}", expanded=True):
+            
+            # Activities
+            if daily.activities:
+                st.subheader("🎯 Activities")
+                for activity in daily.activities:
+                    col1, col2 = st.columns([1, 3])
+                    with col1:
+                        st.write(f"**⏰ {activity.time}**")
+                    with col2:
+                        st.write(f"**{activity.activity}**")
+                        st.write(f"📍 {activity.location}")
+                        st.write(f"💵 {activity.cost} | ⏱️ {activity.duration}")
+                        if activity.description:
+                            st.write(f"ℹ️ {activity.description}")
+                    st.write("---")
+            
+            # Meals
+            if daily.meals:
+                st.subheader("🍽️ Recommended Meals")
+                meal_cols = st.columns(len(daily.meals))
+                for idx, meal in enumerate(daily.meals):
+                    with meal_cols[idx]:
+                        st.write(f"**{meal.time}**")
+                        st.write(f"🏪 {meal.restaurant}")
+                        st.write(f"🍽️ {meal.dish}")
+                        st.write(f"💰 {meal.cost}")
+            
+            # Transportation & Total
+            col1, col2 = st.columns(2)
+            with col1:
+                if daily.transportation:
+                    st.write(f"🚗 **Transport:** {daily.transportation}")
+            with col2:
+                if daily.total_cost:
+                    st.write(f"💰 **Daily Total:** {daily.total_cost}")
+    
+    st.markdown("---")
+    
+    # Dining Recommendations
+    st.header("🍽️ Best Restaurants & Food")
+    
+    if trip.restaurants:
+        
+        # Organize restaurants by meal type
+        breakfast_places = [r for r in trip.restaurants if r.meal_type == "breakfast"]
+        lunch_places = [r for r in trip.restaurants if r.meal_type == "lunch"]
+        dinner_places = [r for r in trip.restaurants if r.meal_type == "dinner"]
+        
+        # Breakfast
+        if breakfast_places:
+            st.subheader("🌅 Breakfast Spots")
+            for place in breakfast_places[:3]:
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    st.write(f"**{place.name}**")
+                    st.write(f"🍳 {place.cuisine} | 📍 {place.location}")
+                    st.write(f"⭐ Try: {place.specialty}")
+                with col2:
+                    st.metric("Price", place.price_range)
+                    st.write(f"💰 {place.cost_per_person}")
+        
+        # Lunch  
+        if lunch_places:
+            st.subheader("🌞 Lunch Places")
+            for place in lunch_places[:3]:
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    st.write(f"**{place.name}**")
+                    st.write(f"🍽️ {place.cuisine} | 📍 {place.location}")
+                    st.write(f"⭐ Try: {place.specialty}")
+                with col2:
+                    st.metric("Price", place.price_range)
+                    st.write(f"💰 {place.cost_per_person}")
+        
+        # Dinner
+        if dinner_places:
+            st.subheader("🌙 Dinner Restaurants")
+            for place in dinner_places[:3]:
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    st.write(f"**{place.name}**")
+                    st.write(f"🍽️ {place.cuisine} | 📍 {place.location}")
+                    st.write(f"⭐ Try: {place.specialty}")
+                with col2:
+                    st.metric("Price", place.price_range)
+                    st.write(f"💰 {place.cost_per_person}")
+        
+        # Additional Info
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if trip.food_districts:
+                st.subheader("🏙️ Popular Food Areas")
+                for district in trip.food_districts:
+                    st.write(f"• {district}")
+        
+        with col2:
+            if trip.must_try:
+                st.subheader("🥘 Must-Try Local Dishes")
+                for dish in trip.must_try:
+                    st.write(f"• {dish}")
+        
+        if trip.local_tips:
+            st.subheader("💡 Local Food Tips")
+            for tip in trip.local_tips:
+                st.write(f"• {tip}")
+    
+    st.markdown("---")
+    
+    # Map
+    if map_html:
+        st.header("🗺️ Your Destination")
+        st.components.v1.html(map_html, height=400)
@@ -0,0 +1,318 @@
+"""Prompt templates as they were before JSON mode, kept for token comparisons.
+
+Copies of the inline-example prompts from app.py and GeminiService (prompt
+version 1), dedented one level. Nothing outside the benchmarks uses them.
+"""
+
+
+def app_summary_prompt(city, budget, days):
+    return f"""
+    You are a travel expert. Create a comprehensive travel summary for {city} with ${budget} USD budget for {days} days.
+    
+    IMPORTANT: Respond with ONLY a valid JSON object. No additional text or explanation.
+    
+    {{
+        "city": "{city}",
+        "total_budget": {budget},
+        "duration": {days},
+        "overview": "Detailed 2-3 sentence overview highlighting what makes {city} special and what travelers can expect during their {days}-day visit",
+        "budget_breakdown": {{
+            "accommodation": "${int(budget * 0.35)}",
+            "food": "${int(budget * 0.30)}",
+            "activities": "${int(budget * 0.25)}",
+            "transport": "${int(budget * 0.10)}"
+        }},
+        "best_time": "Specific months with weather details",
+        "currency": "Local currency name and symbol",
+        "highlights": ["Must-see attraction with brief detail", "Cultural experience with context", "Local specialty or unique feature"]
+    }}
+    """
+
+
+def app_daily_prompt(city, day, budget_per_day):
+    return f"""
+    You are a local travel guide for {city}. Create a detailed day {day} itinerary with ${budget_per_day:.0f} USD daily budget.
+    
+    Consider local culture, opening hours, travel times, and realistic scheduling.
+    
+    IMPORTANT: Respond with ONLY a valid JSON object. No additional text.
+    
+    {{
+        "day": {day},
+        "theme": "Specific theme like 'Ancient Temples & Spiritual Sites' or 'Street Food & Local Markets'",
+        "activities": [
+            {{
+                "time": "8:00 AM",
+                "activity": "Specific activity name with location details",
+                "location": "Exact location name, address or landmark",
+                "duration": "2 hours",
+                "cost": "${int(budget_per_day * 0.15)}-{int(budget_per_day * 0.25)}",
+                "description": "Detailed description of what to expect, what to see, cultural significance"
+            }},
+            {{
+                "time": "10:30 AM",
+                "activity": "Next specific activity",
+                "location": "Exact location",
+                "duration": "1.5 hours",
+                "cost": "${int(budget_per_day * 0.10)}-{int(budget_per_day * 0.20)}",
+                "description": "What makes this special, tips for visitors"
+            }},
+            {{
+                "time": "2:00 PM",
+                "activity": "Afternoon activity",
+                "location": "Specific location",
+                "duration": "2 hours",
+                "cost": "${int(budget_per_day * 0.15)}-{int(budget_per_day * 0.30)}",
+                "description": "Why this is worth visiting"
+            }},
+            {{
+                "time": "5:00 PM",
+                "activity": "Evening activity or experience",
+                "location": "Location name",
+                "duration": "1.5 hours",
+                "cost": "${int(budget_per_day * 0.10)}-{int(budget_per_day * 0.25)}",
+                "description": "Evening experience details"
+            }}
+        ],
+        "meals": [
+            {{
+                "time": "Breakfast (7:30 AM)",
+                "restaurant": "Specific restaurant name with local reputation",
+                "dish": "Traditional local breakfast dish",
+                "cost": "${int(budget_per_day * 0.08)}-{int(budget_per_day * 0.12)}"
+            }},
+            {{
+                "time": "Lunch (12:30 PM)",
+                "restaurant": "Popular local restaurant name",
+                "dish": "Regional specialty dish",
+                "cost": "${int(budget_per_day * 0.15)}-{int(budget_per_day * 0.25)}"
+            }},
+            {{
+                "time": "Dinner (7:00 PM)",
+                "restaurant": "Recommended dinner spot",
+                "dish": "Evening specialty or local favorite",
+                "cost": "${int(budget_per_day * 0.20)}-{int(budget_per_day * 0.35)}"
+            }}
+        ],
+        "transportation": "Detailed transport options: how to get around, costs, local tips",
+        "total_cost": "${int(budget_per_day * 0.85)}-{int(budget_per_day)}"
+    }}
+    """
+
+
+def app_dining_prompt(city, budget_range):
+    return f"""
+    You are a food expert familiar with {city}. Generate comprehensive dining recommendations within {budget_range} budget range.
+    
+    Focus on authentic local cuisine, popular spots, and hidden gems. Include vegetarian options if relevant to the culture.
+    
+    IMPORTANT: Respond with ONLY a valid JSON object. No additional text.
+    
+    {{
+        "restaurants": [
+            {{
+                "name": "Actual restaurant name or typical establishment type",
+                "cuisine": "Specific cuisine type (e.g., North Indian, Maharashtrian, French Bistro)",
+                "price_range": "$" for budget, "$" for mid-range, "$$" for upscale,
+                "location": "Specific area, district, or neighborhood",
+                "specialty": "Signature dish with local importance or popularity",
+                "meal_type": "breakfast",
+                "cost_per_person": "Realistic price range in local context"
+            }},
+            {{
+                "name": "Another restaurant name",
+                "cuisine": "Different cuisine type",
+                "price_range": "$",
+                "location": "Different area",
+                "specialty": "Must-try dish",
+                "meal_type": "lunch",
+                "cost_per_person": "Price range"
+            }},
+            {{
+                "name": "Dinner restaurant",
+                "cuisine": "Regional cuisine",
+                "price_range": "$",
+                "location": "Popular dining district",
+                "specialty": "Evening specialty",
+                "meal_type": "dinner",
+                "cost_per_person": "Dinner prices"
+            }},
+            {{
+                "name": "Street food or snack place",
+                "cuisine": "Street food/Local snacks",
+                "price_range": "$",
+                "location": "Market or street food area",
+                "specialty": "Popular street food item",
+                "meal_type": "snack",
+                "cost_per_person": "Snack prices"
+            }},
+            {{
+                "name": "Another breakfast place",
+                "cuisine": "Traditional breakfast",
+                "price_range": "$",
+                "location": "Local area",
+                "specialty": "Traditional morning dish",
+                "meal_type": "breakfast",
+                "cost_per_person": "Morning meal cost"
+            }},
+            {{
+                "name": "Lunch restaurant 2",
+                "cuisine": "Different lunch option",
+                "price_range": "$",
+                "location": "Business district or tourist area",
+                "specialty": "Popular lunch dish",
+                "meal_type": "lunch",
+                "cost_per_person": "Lunch pricing"
+            }},
+            {{
+                "name": "Fine dining or special dinner",
+                "cuisine": "Upscale local or fusion",
+                "price_range": "$$",
+                "location": "Upscale area",
+                "specialty": "Signature fine dining dish",
+                "meal_type": "dinner",
+                "cost_per_person": "Fine dining prices"
+            }},
+            {{
+                "name": "Tea/coffee/dessert place",
+                "cuisine": "Cafe or sweets",
+                "price_range": "$",
+                "location": "Popular hangout area",
+                "specialty": "Local dessert or beverage",
+                "meal_type": "snack",
+                "cost_per_person": "Cafe prices"
+            }}
+        ],
+        "food_districts": ["Main food street or district name", "Another popular eating area", "Local market or food hub"],
+        "local_tips": ["Important cultural dining tip relevant to {city}", "Local eating customs or timing", "Payment or ordering advice for tourists"],
+        "must_try": ["Iconic local dish unique to {city}", "Regional specialty dish", "Street food that's a local favorite", "Traditional dessert or drink"]
+    }}
+    """
+
+
+def service_summary_prompt(city, budget, days):
+    return f"""
+    Create a travel itinerary summary for {city} with a budget of ${budget} for {days} days.
+    Return only a JSON object with this structure:
+    {{
+        "city": "{city}",
+        "total_budget": {budget},
+        "duration": {days},
+        "overview": "brief overview of the trip",
+        "budget_breakdown": {{
+            "accommodation": "amount",
+            "food": "amount", 
+            "activities": "amount",
+            "transport": "amount"
+        }},
+        "best_time_to_visit": "season/months",
+        "currency": "local currency"
+    }}
+    """
+
+
+def service_daily_prompt(city, day_number, budget_per_day):
+    return f"""
+    Create a detailed day {day_number} itinerary for {city} with a daily budget of ${budget_per_day}.
+    Return only a JSON object with this structure:
+    {{
+        "day": {day_number},
+        "theme": "day theme (e.g., Historical Sites, Cultural Experience)",
+        "activities": [
+            {{
+                "time": "9:00 AM",
+                "activity": "activity name",
+                "location": "specific location",
+                "duration": "2 hours",
+                "cost": "estimated cost",
+                "description": "brief description"
+            }}
+        ],
+        "transportation": "how to get around",
+        "daily_budget_used": "total estimated cost"
+    }}
+    Include 4-6 activities per day covering morning, afternoon, and evening.
+    """
+
+
+def service_daily_batch_prompt(city, first_day, last_day, budget_per_day):
+    return f"""
+    Create detailed itineraries for days {first_day} to {last_day} of a trip to {city} with a daily budget of ${budget_per_day}.
+    Plan each day around a different theme and do not repeat activities across days.
+    Return only a JSON object with this structure:
+    {{
+        "days": [
+            {{
+                "day": {first_day},
+                "theme": "day theme (e.g., Historical Sites, Cultural Experience)",
+                "activities": [
+                    {{
+                        "time": "9:00 AM",
+                        "activity": "activity name",
+                        "location": "specific location",
+                        "duration": "2 hours",
+                        "cost": "estimated cost",
+                        "description": "brief description"
+                    }}
+                ],
+                "transportation": "how to get around",
+                "daily_budget_used": "total estimated cost"
+            }}
+        ]
+    }}
+    Include one entry per day from {first_day} to {last_day}, each with 4-6 activities covering morning, afternoon, and evening.
+    """
+
+
+def service_dining_prompt(city, budget_range):
+    return f"""
+    Generate dining recommendations for {city} within {budget_range} budget range.
+    Return only a JSON object with this structure:
+    {{
+        "dining_recommendations": [
+            {{
+                "name": "restaurant name",
+                "cuisine": "cuisine type",
+                "price_range": "$-$$$",
+                "location": "area/district",
+                "speciality": "must-try dish",
+                "atmosphere": "casual/fine dining/street food",
+                "estimated_cost_per_person": "cost range"
+            }}
+        ],
+        "local_food_tips": [
+            "tip 1 about local food culture",
+            "tip 2 about local food culture"
+        ],
+        "food_districts": [
+            "popular food area 1",
+            "popular food area 2"
+        ]
+    }}
+    Include at least 8-10 restaurants covering breakfast, lunch, dinner, and snacks.
+    Include mix of budget-friendly and mid-range options.
+    """
+
+
+def service_map_prompt(city, activities):
+    locations_text = ", ".join([activity.get('location', '') for activity in activities])
+
+    return f"""
+    For the city {city}, provide coordinates for these locations: {locations_text}
+    Return only a JSON object with this structure:
+    {{
+        "locations": [
+            {{
+                "name": "location name",
+                "latitude": 0.0,
+                "longitude": 0.0,
+                "type": "restaurant/attraction/hotel"
+            }}
+        ],
+        "city_center": {{
+            "latitude": 0.0,
+            "longitude": 0.0
+        }}
+    }}
+    Provide approximate coordinates if exact ones aren't known.
+    """
@@ -0,0 +1,156 @@
+"""Concurrent-session load test of the Streamlit app against the fake model backend.
+
+For each session count N, starts N simulated browser sessions at once with
+Streamlit's AppTest, each driving the real main() flow: enter a trip, click
+Generate and wait for display_results to render it. Stage results are cached
+per city and budget tier, so every session asks for a city name of its own
+and nothing is served from the response cache or coalesced.
+Reports end-to-end latency percentiles and failures, plus the process's RSS
+growth and CPU time per session, since all sessions share this process like
+they share one server.
+
+    python -m benchmarks.load_bench --sessions 1 4 16 32 --latency 0.2 --job-workers 4
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit import config as streamlit_config
+from streamlit.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+CITIES = ["Mathura", "Delhi", "Agra", "Jaipur", "Varanasi", "Lucknow", "Mumbai", "Pune"]
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # No procfs: fall back to the peak, which only ever grows
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def share_test_runtime():
+    """Keep AppTest's mock Runtime available to every concurrent session.
+
+    AppTest installs a fresh mock Runtime when a run starts and clears it when
+    the run ends, which pulls it out from under sessions still running in other
+    threads; fall back to the most recently installed one instead.
+    """
+    latest = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            latest[:] = [cls._instance]
+        elif latest:
+            return latest[0]
+        return original(cls)
+
+    original = Runtime.instance.__func__
+    Runtime.instance = classmethod(instance)
+
+
+def run_session(session, level, args, start_barrier):
+    """Drive one session from first page load to rendered itinerary; returns (seconds, error)"""
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+        at.run()
+        # Prompts only see the budget tier, so the city name is what keeps every trip distinct
+        at.sidebar.text_input[0].input(f"{CITIES[session % len(CITIES)]} {level}-{session}")
+        at.sidebar.number_input[0].set_value(100 + 50 * (level * 1000 + session) % 9900)
+        at.sidebar.number_input[1].set_value(args.days)
+        at.sidebar.checkbox[0].set_value(args.stream)
+        at.sidebar.button[0].click()
+    except Exception as e:
+        return 0.0, f"page load failed: {type(e).__name__}: {e}"
+    finally:
+        # Sessions that failed to load still arrive, so the rest aren't left waiting
+        start_barrier.wait()
+    start = time.perf_counter()
+    try:
+        at.run()
+    except Exception as e:
+        return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        return elapsed, at.exception[0].value
+    if not any("Trip Summary" in header.value for header in at.header):
+        return elapsed, "itinerary not rendered"
+    return elapsed, None
+
+
+def run_level(sessions, level, args):
+    barrier = threading.Barrier(sessions)
+    rss_before, cpu_before = rss_bytes(), cpu_seconds()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(lambda session: run_session(session, level, args, barrier), range(sessions)))
+    wall = time.perf_counter() - start
+    return results, wall, rss_bytes() - rss_before, cpu_seconds() - cpu_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--stream", action="store_true", help="generate in the session instead of on job workers")
+    parser.add_argument("--job-workers", type=int, default=4, help="background job workers in the server process")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=float, default=1e6, help="model requests per minute allowed by the rate limiter")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds a session may take")
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix="load_bench_")
+    # Read by config.py when AppTest first imports the app, so set before any session starts
+    os.environ.update({
+        "MODEL_BACKEND": "fake",
+        "FAKE_LATENCY": str(args.latency),
+        "FAKE_JITTER": str(args.jitter),
+        "FAKE_FAILURE_RATE": str(args.failure_rate),
+        "GEMINI_RPM": str(args.rpm),
+        "GEMINI_RATE_BURST": str(max(5, args.rpm / 60)),
+        "JOB_WORKERS": str(args.job_workers),
+        "RESPONSE_CACHE_PATH": os.path.join(state_dir, "responses.sqlite3"),
+        "JOB_QUEUE_PATH": os.path.join(state_dir, "jobs.sqlite3"),
+        "RATE_LIMIT_STATE_PATH": os.path.join(state_dir, "ratelimit.state"),
+        "MAP_CACHE_DIR": os.path.join(state_dir, "maps"),
+        "METRICS_PORT": "0",
+    })
+    # Magic rewrites the script with ast.parse, which isn't thread-safe on some Python 3.11 releases
+    streamlit_config.set_option("runner.magicEnabled", False)
+    share_test_runtime()
+    from batch_generate import percentile  # Deferred: importing it reads config
+
+    print(f"Process RSS at start: {rss_bytes() / 2**20:.0f} MB; state in {state_dir}")
+    print(f"{'sessions':>8} {'ok':>4} {'fail':>4} {'sess/s':>7} {'p50 s':>6} {'p95 s':>6} {'p99 s':>6} {'max s':>6} "
+          f"{'RSS MB':>7} {'MB/sess':>7} {'CPU s/sess':>10}")
+    for level, sessions in enumerate(args.sessions):
+        results, wall, rss_delta, cpu = run_level(sessions, level, args)
+        latencies = sorted(elapsed for elapsed, _ in results)
+        errors = [error for _, error in results if error]
+        print(f"{sessions:>8} {sessions - len(errors):>4} {len(errors):>4} {sessions / wall:>7.2f} "
+              f"{percentile(latencies, 50):>6.2f} {percentile(latencies, 95):>6.2f} {percentile(latencies, 99):>6.2f} "
+              f"{latencies[-1]:>6.2f} {rss_bytes() / 2**20:>7.0f} {rss_delta / 2**20 / sessions:>7.2f} "
+              f"{cpu / sessions:>10.3f}")
+        for error in sorted(set(errors)):
+            print(f"    {errors.count(error)} x {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare per-marker and GeoJSON bulk map rendering.
+
+Reports build time, HTML render time and HTML size for MapService's
+per-marker path and its bulk path at increasing marker counts.
+
+    python -m benchmarks.map_render_bench --points 100 1000 10000
+"""
+import argparse
+import random
+import time
+
+from map_service import MapService
+from models import Location
+
+CENTER = Location('Mathura', 27.4924, 77.6737)
+TYPES = ['attraction', 'restaurant', 'hotel', 'shopping', 'transport']
+
+
+def make_locations(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        Location(
+            name=f"Place {i}",
+            latitude=CENTER.latitude + rng.uniform(-0.2, 0.2),
+            longitude=CENTER.longitude + rng.uniform(-0.2, 0.2),
+            type=rng.choice(TYPES),
+            day=i % 14 + 1
+        )
+        for i in range(count)
+    ]
+
+
+def measure(build):
+    start = time.perf_counter()
+    m = build()
+    built = time.perf_counter()
+    html = m.get_root().render()
+    rendered = time.perf_counter()
+    return built - start, rendered - built, len(html.encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, nargs='+', default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    service = MapService()
+    modes = {
+        'per-marker': lambda locs: service.create_itinerary_map(CENTER, locs, bulk=False),
+        'bulk': lambda locs: service.create_bulk_map(CENTER, locs),
+        'bulk by day': lambda locs: service.create_bulk_map(CENTER, locs, by_day=True)
+    }
+
+    print(f"{'points':>7} {'mode':<12} {'build ms':>9} {'render ms':>10} {'html KB':>9}")
+    for count in args.points:
+        locations = make_locations(count)
+        for mode, build in modes.items():
+            build_s, render_s, size = measure(lambda: build(locations))
+            print(f"{count:>7} {mode:<12} {build_s * 1000:>9.1f} {render_s * 1000:>10.1f} {size / 1024:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""End-to-end itinerary pipeline benchmark against the fake model backend.
+
+For each trip length, runs ItineraryGenerator with a FakeBackend (fixed
+latency, jitter and failure rate, no API key needed) and reports itinerary
+throughput and latency percentiles, plus the local costs the model latency
+hides: parsing the day responses with extract_json and building/rendering
+the folium map. Every run gets an empty response cache and location store
+and an unthrottled rate limiter, so only the fake's latency and the pipeline
+itself are timed.
+
+    python -m benchmarks.pipeline_bench --days 1 3 7 14 --runs 8 --concurrency 4 --latency 0.2
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_generate import percentile
+from gemini_service import GeminiService
+from geocoder import Geocoder
+from itinerary_generator import ItineraryGenerator
+from json_extract import extract_json
+from location_store import LocationStore
+from model_backend import FakeBackend
+from rate_limiter import AdaptiveRateLimiter
+from response_cache import ResponseCache, budget_bucket
+from schemas import GENERATION_CONFIGS, RESPONSE_DEFAULTS
+
+CITY = "Mathura"
+BUDGET_PER_DAY = 150
+
+
+def make_generator(backend, cache_dir, day_chunk_size):
+    service = GeminiService(
+        cache=ResponseCache(os.path.join(cache_dir, "responses.sqlite3")),
+        rate_limiter=AdaptiveRateLimiter(requests_per_minute=1e6, burst=1e6, state_path=None),
+        backend=backend
+    )
+    generator = ItineraryGenerator(day_chunk_size=day_chunk_size, gemini=service)
+    generator.geocoder = Geocoder(service, store=LocationStore(os.path.join(cache_dir, "locations.sqlite3")))
+    return generator
+
+
+def run_pipeline(days, args):
+    """Latencies of args.runs itineraries generated args.concurrency at a time, and the wall time"""
+    backend = FakeBackend(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=args.seed)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        generator = make_generator(backend, cache_dir, args.day_chunk_size)
+
+        def one(run):
+            # Prompts only see the budget tier, so a distinct city name per run keeps
+            # identical prompts from being coalesced or served from the cache
+            start = time.perf_counter()
+            generator.generate_complete_itinerary(f"{CITY} {run}", BUDGET_PER_DAY * days, days)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            latencies = sorted(pool.map(one, range(args.runs)))
+        return latencies, time.perf_counter() - start, backend.calls
+
+
+def parse_cost(service, days, repeat):
+    """Mean seconds to parse every day response of a trip (one batched response and per-day ones)"""
+    backend = service.backend
+    bucket = budget_bucket(BUDGET_PER_DAY)
+    batch = backend.response_text(service._daily_batch_prompt(CITY, 1, days, bucket),
+                                  GENERATION_CONFIGS['daily_batch'])
+    singles = [backend.response_text(service._daily_prompt(CITY, day, bucket), GENERATION_CONFIGS['daily'])
+               for day in range(1, days + 1)]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract_json(batch, RESPONSE_DEFAULTS['daily_batch'])
+    batched = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in singles:
+            extract_json(text, RESPONSE_DEFAULTS['daily'])
+    per_day = (time.perf_counter() - start) / repeat
+    return batched, per_day, len(batch)
+
+
+def map_cost(generator, days, repeat):
+    """Mean seconds to build and to render the map of a generated trip, and its marker count"""
+    trip = generator.generate_complete_itinerary(CITY, BUDGET_PER_DAY * days, days)['trip']
+    build = render = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        m = generator.map_service.create_itinerary_map(trip.city_center, trip.locations)
+        built = time.perf_counter()
+        m.get_root().render()
+        build += built - start
+        render += time.perf_counter() - built
+    return build / repeat, render / repeat, len(trip.locations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 3, 7, 14])
+    parser.add_argument("--runs", type=int, default=8, help="itineraries generated per trip length")
+    parser.add_argument("--concurrency", type=int, default=4, help="itineraries generated at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--day-chunk-size", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20, help="iterations of the parse and map measurements")
+    args = parser.parse_args()
+
+    print(f"{'days':>4} {'calls':>6} {'itin/s':>7} {'p50 s':>6} {'p95 s':>6} {'max s':>6} "
+          f"{'parse batch ms':>14} {'parse days ms':>13} {'KB':>6} {'markers':>7} {'map build ms':>12} {'render ms':>9}")
+    for days in args.days:
+        latencies, wall, calls = run_pipeline(days, args)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            generator = make_generator(FakeBackend(latency=0, jitter=0, seed=args.seed), cache_dir, args.day_chunk_size)
+            batched, per_day, size = parse_cost(generator.gemini, days, args.repeat)
+            build, render, markers = map_cost(generator, days, args.repeat)
+        print(f"{days:>4} {calls:>6} {len(latencies) / wall:>7.2f} {percentile(latencies, 50):>6.2f} "
+              f"{percentile(latencies, 95):>6.2f} {latencies[-1]:>6.2f} {batched * 1000:>14.2f} {per_day * 1000:>13.2f} "
+              f"{size / 1024:>6.1f} {markers:>7} {build * 1000:>12.1f} {render * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Per-stage input tokens: inline-example prompts vs JSON mode with a response schema.
+
+For every stage of app.py and GeminiService, compares the version 1 prompt
+(which inlined an example JSON document) against the current instruction-only
+prompt plus its response schema, which the API also counts as input.
+Estimates use the 4-characters-per-token heuristic; pass --api to count
+with the model's tokenizer instead (needs GEMINI_API_KEY).
+
+    python -m benchmarks.prompt_tokens_bench --days 3 --budget 600
+"""
+import argparse
+import json
+
+import google.generativeai as genai
+from google.generativeai import protos
+from google.generativeai.types import generation_types
+
+from benchmarks import legacy_prompts
+from config import GEMINI_API_KEY
+from gemini_service import GeminiService
+from response_cache import budget_bucket
+from schemas import GENERATION_CONFIGS
+
+CITY = "Mathura"
+ACTIVITIES = [{'location': name} for name in (
+    "Shri Krishna Janmabhoomi", "Dwarkadhish Temple", "Vishram Ghat", "Govardhan Hill", "Prem Mandir"
+)]
+
+
+def schema_text(template):
+    """Compact JSON of the response schema as sent in the request, without unset fields"""
+    config = generation_types.to_generation_config_dict(GENERATION_CONFIGS[template])
+    schema = protos.Schema.to_dict(config['response_schema'], use_integers_for_enums=False)
+    return json.dumps(_prune(schema), separators=(',', ':'))
+
+
+def _prune(value):
+    if isinstance(value, dict):
+        pruned = {key: _prune(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in ('', '0', False, [], {})}
+    if isinstance(value, list):
+        return [_prune(item) for item in value]
+    return value
+
+
+def stages(budget, days):
+    """(stage, template, legacy prompt, current prompt) for every prompt the app sends"""
+    import app  # Deferred: importing app.py configures the Streamlit page
+
+    service = GeminiService()
+    daily_budget = budget / days
+    bucket = budget_bucket(daily_budget)
+    budget_range = app.determine_budget_range(daily_budget)
+    last_day = min(days, 4)
+    return [
+        ('app summary', 'summary',
+         legacy_prompts.app_summary_prompt(CITY, budget, days), app.trip_summary_prompt(CITY, bucket)),
+        ('app day', 'daily',
+         legacy_prompts.app_daily_prompt(CITY, 1, daily_budget), app.daily_itinerary_prompt(CITY, 1, bucket)),
+        ('app dining', 'dining',
+         legacy_prompts.app_dining_prompt(CITY, budget_range), app.dining_prompt(CITY, budget_range)),
+        ('service summary', 'summary',
+         legacy_prompts.service_summary_prompt(CITY, budget, days), service._summary_prompt(CITY, bucket)),
+        ('service day', 'daily',
+         legacy_prompts.service_daily_prompt(CITY, 1, daily_budget), service._daily_prompt(CITY, 1, bucket)),
+        (f'service days 1-{last_day}', 'daily_batch',
+         legacy_prompts.service_daily_batch_prompt(CITY, 1, last_day, daily_budget),
+         service._daily_batch_prompt(CITY, 1, last_day, bucket)),
+        ('service dining', 'dining',
+         legacy_prompts.service_dining_prompt(CITY, budget_range), service._dining_prompt(CITY, budget_range)),
+        ('service map', 'map',
+         legacy_prompts.service_map_prompt(CITY, ACTIVITIES), service._map_prompt(CITY, [activity['location'] for activity in ACTIVITIES])),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=600)
+    parser.add_argument("--api", action="store_true", help="count tokens with the Gemini API")
+    args = parser.parse_args()
+
+    if args.api:
+        genai.configure(api_key=GEMINI_API_KEY)
+        model = genai.GenerativeModel('gemini-1.5-flash')
+
+    print(f"{'stage':<20} {'legacy':>7} {'prompt':>7} {'schema':>7} {'total':>7} {'saved':>7}")
+    legacy_sum = current_sum = 0
+    for stage, template, legacy, current in stages(args.budget, args.days):
+        if args.api:
+            legacy_tokens = model.count_tokens(legacy).total_tokens
+            total = model.count_tokens(current, generation_config=GENERATION_CONFIGS[template]).total_tokens
+            prompt_tokens = model.count_tokens(current).total_tokens
+            schema_tokens = total - prompt_tokens
+        else:
+            legacy_tokens = GeminiService._estimate_tokens(legacy)
+            prompt_tokens = GeminiService._estimate_tokens(current)
+            schema_tokens = GeminiService._estimate_tokens(schema_text(template))
+            total = prompt_tokens + schema_tokens
+        legacy_sum += legacy_tokens
+        current_sum += total
+        print(f"{stage:<20} {legacy_tokens:>7} {prompt_tokens:>7} {schema_tokens:>7} {total:>7} "
+              f"{1 - total / legacy_tokens:>7.0%}")
+    print(f"{'all stages':<20} {legacy_sum:>7} {'':>7} {'':>7} {current_sum:>7} {1 - current_sum / legacy_sum:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Routing engine speed and route quality at increasing stop counts.
+
+For random stops around a city center, reports the time to build the
+haversine distance matrix, to order the stops without time windows and with
+a window on the first and last stop, and the route length in the given
+(random) order versus the ordered one.
+
+    python -m benchmarks.route_bench --points 10 100 300 1000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from routing import distance_matrix, order_stops, route_length
+
+CENTER = (27.4924, 77.6737)
+
+
+def make_stops(count, seed=7):
+    rng = np.random.default_rng(seed)
+    return CENTER[0] + rng.uniform(-0.2, 0.2, count), CENTER[1] + rng.uniform(-0.2, 0.2, count)
+
+
+def timed(function, repeat):
+    """(mean seconds per call, last result)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, nargs='+', default=[10, 100, 300, 1000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'points':>7} {'matrix ms':>10} {'order ms':>9} {'windows ms':>11} {'given km':>9} {'routed km':>10}")
+    for count in args.points:
+        latitudes, longitudes = make_stops(count)
+        matrix_s, distances = timed(lambda: distance_matrix(latitudes, longitudes), args.repeat)
+        order_s, order = timed(lambda: order_stops(distances), args.repeat)
+
+        # First stop opens the day at 8 AM, the last one must start in the evening
+        opens, closes = np.full(count, -np.inf), np.full(count, np.inf)
+        opens[0], closes[0] = 8 * 60, 9 * 60
+        opens[-1], closes[-1] = 17 * 60, 22 * 60
+        windows_s, _ = timed(
+            lambda: order_stops(distances, opens, closes, np.full(count, 1.0), start=8 * 60), args.repeat
+        )
+        print(f"{count:>7} {matrix_s * 1000:>10.2f} {order_s * 1000:>9.1f} {windows_s * 1000:>11.1f} "
+              f"{route_length(distances, range(count)):>9.1f} {route_length(distances, order):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
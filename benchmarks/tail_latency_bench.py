@@ -0,0 +1,106 @@
+"""Itinerary tail latency with model tiering, hedged calls and a deadline, against the fake backend.
+
+Runs the same itineraries under four setups and reports itinerary latency
+percentiles, the model calls made (hedges included) and the stages dropped
+at the deadline:
+
+  baseline   every template on the quality model, no hedging, no deadline
+  tiered     summary and geocoding on the fast model (FAST_TEMPLATES)
+  hedged     tiered, plus a duplicate request for calls past their p95
+  deadline   hedged, plus an end-to-end deadline of --deadline seconds
+
+A --tail-rate fraction of fake calls take --tail-factor times as long. The
+hedged setup runs after the tiered one, whose calls give it the recent
+per-template latencies its hedge delays come from.
+
+    python -m benchmarks.tail_latency_bench --runs 200 --days 3 --tail-rate 0.02
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_generate import percentile
+from config import FAST_MODEL, QUALITY_MODEL
+from gemini_service import GeminiService
+from geocoder import Geocoder
+from itinerary_generator import ItineraryGenerator
+from location_store import LocationStore
+from model_backend import FakeBackend
+from rate_limiter import AdaptiveRateLimiter
+from response_cache import ResponseCache
+
+CITY = "Mathura"
+BUDGET_PER_DAY = 150
+
+
+def make_generator(args, cache_dir, tiered, hedged, deadline):
+    def fake(scale):
+        return FakeBackend(latency=args.latency * scale, jitter=args.jitter * scale, seed=args.seed,
+                           tail_rate=args.tail_rate, tail_factor=args.tail_factor)
+
+    backends = {QUALITY_MODEL: fake(1.0), FAST_MODEL: fake(args.fast_scale if tiered else 1.0)}
+    service = GeminiService(
+        cache=ResponseCache(os.path.join(cache_dir, "responses.sqlite3")),
+        rate_limiter=AdaptiveRateLimiter(requests_per_minute=1e6, burst=1e6, state_path=None),
+        backends=backends,
+        hedge_quantile=args.hedge_quantile if hedged else None
+    )
+    generator = ItineraryGenerator(gemini=service, deadline=deadline)
+    generator.geocoder = Geocoder(service, store=LocationStore(os.path.join(cache_dir, "locations.sqlite3")))
+    return generator, backends
+
+
+def failed_stages(result):
+    stages = [result["summary"], result["dining"], result["map_data"], *result["daily_itineraries"]]
+    return sum(1 for stage in stages if "error" in stage)
+
+
+def run_setup(label, args, tiered, hedged, deadline):
+    """Sorted itinerary latencies, model calls made and stages that failed"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        generator, backends = make_generator(args, cache_dir, tiered, hedged, deadline)
+
+        def one(run):
+            # A distinct city per setup and run keeps prompts from being cached or coalesced
+            start = time.perf_counter()
+            result = generator.generate_complete_itinerary(f"{CITY} {label} {run}", BUDGET_PER_DAY * args.days, args.days)
+            return time.perf_counter() - start, failed_stages(result)
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(one, range(args.runs)))
+    calls = sum(backend.calls for backend in backends.values())
+    return sorted(latency for latency, _ in outcomes), calls, sum(failed for _, failed in outcomes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200, help="itineraries per setup")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8, help="itineraries generated at once")
+    parser.add_argument("--latency", type=float, default=0.3, help="quality model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--fast-scale", type=float, default=0.5, help="fast model latency relative to the quality model")
+    parser.add_argument("--tail-rate", type=float, default=0.02, help="fraction of calls that are slow")
+    parser.add_argument("--tail-factor", type=float, default=10.0, help="how many times slower a slow call is")
+    parser.add_argument("--hedge-quantile", type=float, default=0.95)
+    parser.add_argument("--deadline", type=float, default=2.0, help="itinerary deadline of the last setup, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    setups = [
+        ("baseline", False, False, 0),
+        ("tiered", True, False, 0),
+        ("hedged", True, True, 0),
+        ("deadline", True, True, args.deadline),
+    ]
+    print(f"{'setup':>9} {'calls':>6} {'p50 s':>6} {'p95 s':>6} {'p99 s':>6} {'max s':>6} {'failed':>6}")
+    for label, tiered, hedged, deadline in setups:
+        latencies, calls, failed = run_setup(label, args, tiered, hedged, deadline)
+        print(f"{label:>9} {calls:>6} {percentile(latencies, 50):>6.2f} {percentile(latencies, 95):>6.2f} "
+              f"{percentile(latencies, 99):>6.2f} {latencies[-1]:>6.2f} {failed:>6}")
+
+
+if __name__ == "__main__":
+    main()
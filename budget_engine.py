@@ -0,0 +1,90 @@
+"""Local budget engine: itinerary costs totalled and checked against the trip budget.
+
+The model only prices individual activities and meals. Day totals, the trip
+estimate and the summary's budget breakdown are computed here from those
+cost ranges, which models.Trip parses once when it is built, instead of
+being asked of the model and echoed back.
+
+Accommodation and transport aren't itemized, so they are budgeted at their
+BUDGET_SHARES of the trip budget; what is left per day is the allowance the
+day's activities and meals are checked against.
+"""
+import numpy as np
+
+from config import BUDGET_SHARES
+
+ACTIVITIES, MEALS = 0, 1
+# Categories estimated from the priced items; every other BUDGET_SHARES category is budgeted at its share
+ESTIMATED_CATEGORIES = {"food": MEALS, "activities": ACTIVITIES}
+
+
+def format_range(low, high):
+    """ "$12" or "$12-20" for a USD range"""
+    low, high = round(low), round(high)
+    return f"${low}" if low == high else f"${low}-{high}"
+
+
+def cost_table(trip):
+    """(day position, kind, low, high) arrays over every priced activity and meal of the trip"""
+    rows = [
+        (position, kind, item.cost_low, item.cost_high)
+        for position, plan in enumerate(trip.days)
+        for kind, items in ((ACTIVITIES, plan.activities), (MEALS, plan.meals))
+        for item in items
+        if item.cost_low is not None
+    ]
+    if not rows:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0), np.zeros(0)
+    positions, kinds, lows, highs = zip(*rows)
+    return np.array(positions), np.array(kinds), np.array(lows, dtype=float), np.array(highs, dtype=float)
+
+
+def budget_report(trip, shares=BUDGET_SHARES):
+    """Per-day and trip totals of a models.Trip checked against its budget.
+
+    Returns {"days": {day: {"low", "high", "allowance", "over"}}, "low",
+    "high", "over", "breakdown"}: day ranges cover the priced activities and
+    meals, the trip range adds the budgeted fixed categories, and
+    "breakdown" maps each BUDGET_SHARES category to a "$low-high" string.
+    """
+    positions, kinds, lows, highs = cost_table(trip)
+    slots = len(trip.days) * 2
+    # One bincount per bound totals every (day, kind) cell at once
+    low_totals = np.bincount(positions * 2 + kinds, weights=lows, minlength=slots).reshape(-1, 2)
+    high_totals = np.bincount(positions * 2 + kinds, weights=highs, minlength=slots).reshape(-1, 2)
+    priced = np.bincount(positions, minlength=len(trip.days))
+
+    budget = float(trip.budget)
+    duration = max(int(trip.duration), 1)
+    fixed = sum(budget * share for category, share in shares.items() if category not in ESTIMATED_CATEGORIES)
+    allowance = (budget - fixed) / duration
+
+    days = {}
+    for position, plan in enumerate(trip.days):
+        if not priced[position]:
+            continue
+        low, high = float(low_totals[position].sum()), float(high_totals[position].sum())
+        days[plan.day] = {"low": low, "high": high, "allowance": allowance, "over": high > allowance}
+
+    breakdown = {}
+    for category, share in shares.items():
+        kind = ESTIMATED_CATEGORIES.get(category)
+        if kind is None:
+            breakdown[category] = format_range(budget * share, budget * share)
+        elif len(positions):
+            breakdown[category] = format_range(low_totals[:, kind].sum(), high_totals[:, kind].sum())
+
+    low, high = fixed + float(low_totals.sum()), fixed + float(high_totals.sum())
+    return {"days": days, "low": low, "high": high, "over": high > budget, "breakdown": breakdown}
+
+
+def apply_budget(trip, shares=BUDGET_SHARES):
+    """Fill each day's total_cost and the trip's budget_breakdown in place; returns the budget_report"""
+    report = budget_report(trip, shares)
+    for plan in trip.days:
+        totals = report["days"].get(plan.day)
+        if totals:
+            plan.total_cost = format_range(totals["low"], totals["high"])
+            plan.cost_low, plan.cost_high = totals["low"], totals["high"]
+    trip.budget_breakdown = report["breakdown"]
+    return report
@@ -3,4 +3,114 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
\ No newline at end of file
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+# Maximum number of Gemini calls a single itinerary runs in parallel
+MAX_CONCURRENT_STAGES = int(os.getenv('MAX_CONCURRENT_STAGES', '4'))
+
+# Per-call timeout for Gemini requests, in seconds
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '60'))
+
+# Maximum in-flight async Gemini calls per event loop
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '32'))
+
+# Disk-backed cache of parsed Gemini responses, shared across sessions and restarts
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join('.cache', 'responses.sqlite3'))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+
+# Days generated per model call by ItineraryGenerator (1 = one call per day)
+DAY_CHUNK_SIZE = int(os.getenv('DAY_CHUNK_SIZE', '1'))
+
+# Offline gazetteer: bundled GeoNames-style source and its compiled memory-mapped form
+GAZETTEER_SOURCE = os.getenv('GAZETTEER_SOURCE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.tsv'))
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', os.path.join('.cache', 'gazetteer.bin'))
+
+# Itinerary maps with more locations than this use the GeoJSON bulk renderer
+BULK_MARKER_THRESHOLD = int(os.getenv('BULK_MARKER_THRESHOLD', '200'))
+
+# Rendered map HTML cache: in-memory LRU size and optional disk tier (empty to disable),
+# whose files are dropped after going unused for MAP_CACHE_DISK_TTL seconds and,
+# least recently used first, once they add up to more than MAP_CACHE_DISK_MAX_BYTES
+MAP_CACHE_MAX_ENTRIES = int(os.getenv('MAP_CACHE_MAX_ENTRIES', '128'))
+MAP_CACHE_DIR = os.getenv('MAP_CACHE_DIR', os.path.join('.cache', 'maps'))
+MAP_CACHE_DISK_TTL = float(os.getenv('MAP_CACHE_DISK_TTL', str(7 * 24 * 3600)))
+MAP_CACHE_DISK_MAX_BYTES = int(os.getenv('MAP_CACHE_DISK_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# Itineraries kept per Streamlit session so reruns don't regenerate them
+SESSION_MAX_RESULTS = int(os.getenv('SESSION_MAX_RESULTS', '5'))
+SESSION_MAX_BYTES = int(os.getenv('SESSION_MAX_BYTES', str(5 * 1024 * 1024)))
+
+
+# Gemini request quota shared by every thread and process on this machine
+GEMINI_RPM = float(os.getenv('GEMINI_RPM', '60'))
+GEMINI_RATE_BURST = float(os.getenv('GEMINI_RATE_BURST', '5'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '5'))
+RATE_LIMIT_STATE_PATH = os.getenv('RATE_LIMIT_STATE_PATH', os.path.join('.cache', 'ratelimit.state'))
+
+# Background itinerary jobs: SQLite queue, worker threads per process, and when abandoned or finished jobs are reclaimed
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join('.cache', 'jobs.sqlite3'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', '300'))
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', str(24 * 60 * 60)))
+
+
+# Instrumentation: JSONL trace of every model call and stage, and a Prometheus text endpoint (empty / 0 to disable)
+METRICS_TRACE_PATH = os.getenv('METRICS_TRACE_PATH', '')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+
+# Model backend: "gemini" for the real API, "fake" for the deterministic local stand-in (latency/jitter in seconds)
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'gemini')
+FAKE_LATENCY = float(os.getenv('FAKE_LATENCY', '0.5'))
+FAKE_JITTER = float(os.getenv('FAKE_JITTER', '0.2'))
+FAKE_FAILURE_RATE = float(os.getenv('FAKE_FAILURE_RATE', '0'))
+FAKE_SEED = int(os.getenv('FAKE_SEED', '0'))
+# Fraction of fake calls slowed down by FAKE_TAIL_FACTOR, and the fast tier's latency relative to the quality tier
+FAKE_TAIL_RATE = float(os.getenv('FAKE_TAIL_RATE', '0'))
+FAKE_TAIL_FACTOR = float(os.getenv('FAKE_TAIL_FACTOR', '10'))
+FAKE_FAST_LATENCY_SCALE = float(os.getenv('FAKE_FAST_LATENCY_SCALE', '0.5'))
+
+
+# Per-day budget tiers (USD lower bounds); stage results are cached per tier so small budget or length changes reuse them
+BUDGET_BUCKETS = [int(b) for b in os.getenv('BUDGET_BUCKETS', '25,50,100,200,400,800').split(',')]
+
+
+# Geocoded places per city, so repeat cities need no geocoding calls; unresolved names go to the model in parallel chunks
+LOCATION_STORE_PATH = os.getenv('LOCATION_STORE_PATH', os.path.join('.cache', 'locations.sqlite3'))
+GEOCODE_CHUNK_SIZE = int(os.getenv('GEOCODE_CHUNK_SIZE', '15'))
+GEOCODE_MAX_WORKERS = int(os.getenv('GEOCODE_MAX_WORKERS', '4'))
+# Gazetteer matches scoring below this are used for the trip but not stored, so a near-miss name can't pin a place for good
+GEOCODE_STORE_MIN_SCORE = float(os.getenv('GEOCODE_STORE_MIN_SCORE', '0.9'))
+
+
+# Local route ordering of each day's activities: door-to-door travel speed, how far a stop may move from its planned time, and minutes assumed at a stop without a duration
+ROUTE_SPEED_KMH = float(os.getenv('ROUTE_SPEED_KMH', '20'))
+ROUTE_TIME_SLACK = float(os.getenv('ROUTE_TIME_SLACK', '180'))
+ROUTE_DEFAULT_DURATION = float(os.getenv('ROUTE_DEFAULT_DURATION', '60'))
+
+
+# Planned share of the budget per category; accommodation and transport are budgeted, food and activities estimated from the itinerary
+BUDGET_SHARES = {
+    name: float(share)
+    for name, share in (item.split(':') for item in os.getenv(
+        'BUDGET_SHARES', 'accommodation:0.35,food:0.30,activities:0.25,transport:0.10'
+    ).split(','))
+}
+
+# Model tiers: FAST_TEMPLATES (summaries and geocoding) go to FAST_MODEL, every other template to QUALITY_MODEL
+FAST_MODEL = os.getenv('FAST_MODEL', 'gemini-1.5-flash-8b')
+QUALITY_MODEL = os.getenv('QUALITY_MODEL', 'gemini-1.5-flash')
+FAST_TEMPLATES = set(filter(None, os.getenv('FAST_TEMPLATES', 'summary,map').split(',')))
+
+
+# Tail latency: seconds an itinerary may take end to end (0 = no deadline), and the share of it left for geocoding, which waits on the days
+ITINERARY_DEADLINE = float(os.getenv('ITINERARY_DEADLINE', '90'))
+DEADLINE_GEOCODE_SHARE = float(os.getenv('DEADLINE_GEOCODE_SHARE', '0.25'))
+# A model call still running at its template's recent HEDGE_QUANTILE latency gets a duplicate request (0 = never), up to HEDGE_MAX_EXTRA,
+# once HEDGE_MIN_SAMPLES calls of that template have been timed; hedged sync calls run on a pool of HEDGE_MAX_WORKERS threads
+HEDGE_QUANTILE = float(os.getenv('HEDGE_QUANTILE', '0.95'))
+HEDGE_MAX_EXTRA = int(os.getenv('HEDGE_MAX_EXTRA', '1'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', '64'))
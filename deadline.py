@@ -0,0 +1,35 @@
+"""End-to-end time budgets for itineraries.
+
+An itinerary gets ITINERARY_DEADLINE seconds. ItineraryGenerator lets the
+parallel generation stages use all but DEADLINE_GEOCODE_SHARE of it and
+geocoding, which waits on the days, whatever is left. A model call still
+running when its stage's deadline passes is given up on and the stage
+returns an error dict, so the trip is shown without it instead of the
+slowest call holding up the whole itinerary.
+"""
+import time
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def split(self, share):
+        """Deadline for a stage that may use ``share`` of the time left, leaving the rest to the stages after it"""
+        return Deadline(self.remaining() * share)
+
+    def timeout(self, cap):
+        """Request timeout for a call made now: the time left, at most ``cap`` seconds"""
+        return min(cap, self.remaining())
+
+
+def make_deadline(seconds):
+    """A Deadline ``seconds`` from now, or None when ``seconds`` is 0 or unset"""
+    return Deadline(seconds) if seconds and seconds > 0 else None
@@ -1,131 +1,404 @@
-import google.generativeai as genai
-from config import GEMINI_API_KEY
-import json
+import asyncio
+import time
+import weakref
+from collections import deque
+from functools import partial
+from config import GEMINI_MAX_CONCURRENCY, GEMINI_TIMEOUT, HEDGE_QUANTILE
+from hedging import ahedged_call, hedge_delay, hedged_call
+from json_extract import JSONExtractionError, apply_defaults, extract_json
+from metrics import get_metrics
+from model_backend import get_backend, model_for
+from rate_limiter import get_rate_limiter
+from response_cache import budget_bucket, budget_bucket_label, get_response_cache
+from schemas import GENERATION_CONFIGS, RESPONSE_DEFAULTS
+from single_flight import get_single_flight
 
 class GeminiService:
-    def __init__(self):
-        genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
-    
-    def generate_itinerary_summary(self, city, budget, days):
-        prompt = f"""
-        Create a travel itinerary summary for {city} with a budget of ${budget} for {days} days.
-        Return only a JSON object with this structure:
-        {{
-            "city": "{city}",
-            "total_budget": {budget},
-            "duration": {days},
-            "overview": "brief overview of the trip",
-            "budget_breakdown": {{
-                "accommodation": "amount",
-                "food": "amount", 
-                "activities": "amount",
-                "transport": "amount"
-            }},
-            "best_time_to_visit": "season/months",
-            "currency": "local currency"
-        }}
+    # One semaphore per event loop, shared by every service instance on that loop
+    _semaphores = weakref.WeakKeyDictionary()
+    
+    # Bump a template's version whenever its prompt changes so stale cache entries are ignored
+    PROMPT_VERSIONS = {
+        'summary': 4,
+        'daily': 4,
+        'daily_batch': 4,
+        'dining': 2,
+        'map': 3
+    }
+    
+    # Fallback values for fields the model leaves out of each template's response
+    RESPONSE_DEFAULTS = RESPONSE_DEFAULTS
+    
+    def __init__(self, timeout=GEMINI_TIMEOUT, cache=None, rate_limiter=None, backend=None, backends=None,
+                 hedge_quantile=HEDGE_QUANTILE):
+        # Each template goes to its tier's model (model_for); ``backend`` serves every tier, ``backends`` maps model names
+        self.backend = backend
+        self.backends = dict(backends or {})
+        self.timeout = timeout
+        # Calls still running at this quantile of their template's recent latency are hedged (None to never hedge)
+        self.hedge_quantile = hedge_quantile
+        self.cache = cache if cache is not None else get_response_cache()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        # Recent uncached single-day call latencies, used to price the per-day path
+        self._day_latencies = deque(maxlen=50)
+    
+    def generate_itinerary_summary(self, city, budget, days, deadline=None):
+        bucket = budget_bucket(budget / days)
+        args = {'city': city, 'budget_bucket': bucket}
+        return self._generate('summary', args, self._summary_prompt(city, bucket), deadline)
+    
+    def generate_daily_itinerary(self, city, day_number, budget_per_day, deadline=None):
+        bucket = budget_bucket(budget_per_day)
+        return self._generate('daily', self._daily_args(city, day_number, bucket),
+                              self._daily_prompt(city, day_number, bucket), deadline)
+    
+    def generate_daily_itinerary_chunk(self, city, first_day, last_day, budget_per_day, deadline=None):
+        """Generate days ``first_day``..``last_day`` in a single model call.
+
+        Returns ``(daily_itineraries, stats)`` where the itineraries have the same
+        shape as generate_daily_itinerary. Days are cached one by one, so days
+        already generated (by a shorter trip, or either path) are reused and only
+        the rest are asked for; a single missing day uses the single-day prompt.
+        If the batched JSON is unusable the chunk falls back to per-day calls;
+        days missing from an otherwise valid response are regenerated
+        individually. ``stats`` compares the tokens and latency spent against the
+        per-day path. Days still missing when ``deadline`` passes are error dicts.
         """
+        bucket = budget_bucket(budget_per_day)
+        day_numbers = list(range(first_day, last_day + 1))
+        stats = {
+            'days': len(day_numbers),
+            'reused_days': 0,
+            'calls': 0,
+            'per_day_calls': 0,
+            'fallback_days': 0,
+            'prompt_tokens': 0,
+            'output_tokens': 0,
+            'per_day_prompt_tokens': 0,
+            'elapsed': 0.0,
+            'per_day_elapsed': None
+        }
         
-        response = self.model.generate_content(prompt)
-        return self._parse_json_response(response.text)
-    
-    def generate_daily_itinerary(self, city, day_number, budget_per_day):
-        prompt = f"""
-        Create a detailed day {day_number} itinerary for {city} with a daily budget of ${budget_per_day}.
-        Return only a JSON object with this structure:
-        {{
-            "day": {day_number},
-            "theme": "day theme (e.g., Historical Sites, Cultural Experience)",
-            "activities": [
-                {{
-                    "time": "9:00 AM",
-                    "activity": "activity name",
-                    "location": "specific location",
-                    "duration": "2 hours",
-                    "cost": "estimated cost",
-                    "description": "brief description"
-                }}
-            ],
-            "transportation": "how to get around",
-            "daily_budget_used": "total estimated cost"
-        }}
-        Include 4-6 activities per day covering morning, afternoon, and evening.
-        """
+        by_day = {day: self.cache.get(self._cache_key('daily', self._daily_args(city, day, bucket)))
+                  for day in day_numbers}
+        missing = [day for day in day_numbers if by_day[day] is None]
+        stats['reused_days'] = len(day_numbers) - len(missing)
+        stats['per_day_calls'] = len(missing)
+        
+        # One prompt covers a contiguous day range; a lone day or scattered gaps use the single-day prompt
+        if len(missing) < 2 or missing[-1] - missing[0] + 1 != len(missing):
+            for day in missing:
+                stats['calls'] += 1
+                by_day[day] = self.generate_daily_itinerary(city, day, budget_per_day, deadline)
+            return [by_day[day] for day in day_numbers], stats
+        
+        def store_late(response):
+            # Past the deadline, but still good for the next trip that needs these days
+            parsed = self._parse_json_response(response.text, 'daily_batch')
+            for day, daily in zip(missing, self._split_days(parsed, missing) or []):
+                if daily is not None:
+                    key = self._cache_key('daily', self._daily_args(city, day, bucket))
+                    self._store(key, apply_defaults(daily, self.RESPONSE_DEFAULTS['daily']))
+        
+        with get_metrics().track_call('daily_batch', model_for('daily_batch')) as call:
+            prompt = self._daily_batch_prompt(city, missing[0], missing[-1], bucket)
+            start = time.perf_counter()
+            try:
+                response = self._request('daily_batch', prompt, call, deadline, on_late=store_late)
+            except TimeoutError as e:
+                call.error = f"TimeoutError: {e}"
+                stats['calls'] = 1
+                for day in missing:
+                    by_day[day] = {'error': 'Deadline exceeded'}
+                return [by_day[day] for day in day_numbers], stats
+            stats['elapsed'] = time.perf_counter() - start
+            stats['calls'] = 1
+            call.usage(response)
+            parsed = self._parse_json_response(response.text, call=call)
         
-        response = self.model.generate_content(prompt)
-        return self._parse_json_response(response.text)
-    
-    def generate_dining_recommendations(self, city, budget_range):
-        prompt = f"""
-        Generate dining recommendations for {city} within {budget_range} budget range.
-        Return only a JSON object with this structure:
-        {{
-            "dining_recommendations": [
-                {{
-                    "name": "restaurant name",
-                    "cuisine": "cuisine type",
-                    "price_range": "$-$$$",
-                    "location": "area/district",
-                    "speciality": "must-try dish",
-                    "atmosphere": "casual/fine dining/street food",
-                    "estimated_cost_per_person": "cost range"
-                }}
-            ],
-            "local_food_tips": [
-                "tip 1 about local food culture",
-                "tip 2 about local food culture"
-            ],
-            "food_districts": [
-                "popular food area 1",
-                "popular food area 2"
-            ]
-        }}
-        Include at least 8-10 restaurants covering breakfast, lunch, dinner, and snacks.
-        Include mix of budget-friendly and mid-range options.
+        usage = getattr(response, 'usage_metadata', None)
+        stats['prompt_tokens'] = getattr(usage, 'prompt_token_count', 0) or self._estimate_tokens(prompt)
+        stats['output_tokens'] = getattr(usage, 'candidates_token_count', 0) or self._estimate_tokens(response.text)
+        
+        # Price the per-day prompts at the same tokens-per-character rate as the batch prompt
+        per_day_chars = sum(len(self._daily_prompt(city, day, bucket)) for day in missing)
+        stats['per_day_prompt_tokens'] = int(per_day_chars * stats['prompt_tokens'] / len(prompt))
+        if self._day_latencies:
+            stats['per_day_elapsed'] = sum(self._day_latencies) / len(self._day_latencies) * len(missing)
+        
+        generated = self._split_days(parsed, missing) or [None] * len(missing)
+        for day, daily in zip(missing, generated):
+            if daily is None:
+                # Unusable or missing from the batch: regenerate with the single-day prompt
+                stats['fallback_days'] += 1
+                stats['calls'] += 1
+                by_day[day] = self.generate_daily_itinerary(city, day, budget_per_day, deadline)
+            else:
+                # Cached per day so a longer or re-chunked trip reuses it
+                daily = apply_defaults(daily, self.RESPONSE_DEFAULTS['daily'])
+                by_day[day] = self._store(self._cache_key('daily', self._daily_args(city, day, bucket)), daily)
+        return [by_day[day] for day in day_numbers], stats
+    
+    def generate_daily_itineraries(self, city, days, budget_per_day, chunk_size=4):
+        """Generate every day of a trip ``chunk_size`` days per model call.
+
+        Returns ``(daily_itineraries, stats)`` with stats summed over all chunks.
         """
+        daily_itineraries = []
+        chunk_stats = []
+        for first_day in range(1, days + 1, chunk_size):
+            last_day = min(first_day + chunk_size - 1, days)
+            chunk, stats = self.generate_daily_itinerary_chunk(city, first_day, last_day, budget_per_day)
+            daily_itineraries.extend(chunk)
+            chunk_stats.append(stats)
+        return daily_itineraries, self.merge_batch_stats(chunk_stats)
+    
+    @staticmethod
+    def merge_batch_stats(chunk_stats):
+        merged = {
+            'days': 0,
+            'reused_days': 0,
+            'calls': 0,
+            'per_day_calls': 0,
+            'fallback_days': 0,
+            'prompt_tokens': 0,
+            'output_tokens': 0,
+            'per_day_prompt_tokens': 0,
+            'elapsed': 0.0,
+            'per_day_elapsed': None
+        }
+        for stats in chunk_stats:
+            for field in ('days', 'reused_days', 'calls', 'per_day_calls', 'fallback_days',
+                          'prompt_tokens', 'output_tokens', 'per_day_prompt_tokens', 'elapsed'):
+                merged[field] += stats[field]
+            if stats['per_day_elapsed'] is not None:
+                merged['per_day_elapsed'] = (merged['per_day_elapsed'] or 0.0) + stats['per_day_elapsed']
         
-        response = self.model.generate_content(prompt)
-        return self._parse_json_response(response.text)
+        merged['prompt_tokens_saved'] = merged['per_day_prompt_tokens'] - merged['prompt_tokens']
+        if merged['per_day_elapsed'] is not None:
+            merged['elapsed_saved'] = merged['per_day_elapsed'] - merged['elapsed']
+        else:
+            merged['elapsed_saved'] = None
+        return merged
+    
+    def generate_dining_recommendations(self, city, budget_range, deadline=None):
+        args = {'city': city, 'budget_range': budget_range}
+        return self._generate('dining', args, self._dining_prompt(city, budget_range), deadline)
+    
+    def generate_map_locations(self, city, names, deadline=None):
+        """Coordinates for a list of place names; geocoder.Geocoder dedupes and chunks them"""
+        args = {'city': city, 'locations': list(names)}
+        return self._generate('map', args, self._map_prompt(city, names), deadline)
+    
+    async def agenerate_itinerary_summary(self, city, budget, days, timeout=None):
+        bucket = budget_bucket(budget / days)
+        args = {'city': city, 'budget_bucket': bucket}
+        return await self._agenerate('summary', args, self._summary_prompt(city, bucket), timeout)
+    
+    async def agenerate_daily_itinerary(self, city, day_number, budget_per_day, timeout=None):
+        bucket = budget_bucket(budget_per_day)
+        return await self._agenerate('daily', self._daily_args(city, day_number, bucket),
+                                     self._daily_prompt(city, day_number, bucket), timeout)
+    
+    async def agenerate_dining_recommendations(self, city, budget_range, timeout=None):
+        args = {'city': city, 'budget_range': budget_range}
+        return await self._agenerate('dining', args, self._dining_prompt(city, budget_range), timeout)
     
-    def generate_map_locations(self, city, activities):
-        locations_text = ", ".join([activity.get('location', '') for activity in activities])
+    async def agenerate_map_locations(self, city, names, timeout=None):
+        args = {'city': city, 'locations': list(names)}
+        return await self._agenerate('map', args, self._map_prompt(city, names), timeout)
+    
+    def _summary_prompt(self, city, budget_bucket):
+        return f"""
+        Summarize a trip to {city} on {budget_bucket_label(budget_bucket)} USD per day.
+        overview: a brief overview of the trip.
+        best_time: season or months to visit. currency: the local currency. highlights: 3 things not to miss.
+        """
+    
+    def _daily_prompt(self, city, day_number, budget_bucket):
+        return f"""
+        Plan day {day_number} of a trip to {city} with a daily budget of {budget_bucket_label(budget_bucket)} USD.
+        day: {day_number}. theme: e.g. Historical Sites, Cultural Experience.
+        activities: 4-6 covering morning, afternoon and evening, each at a specific location with a duration, estimated cost and brief description.
+        meals: breakfast, lunch and dinner, each with an estimated cost. transportation: how to get around.
+        """
+    
+    def _daily_batch_prompt(self, city, first_day, last_day, budget_bucket):
+        return f"""
+        Plan days {first_day} to {last_day} of a trip to {city} with a daily budget of {budget_bucket_label(budget_bucket)} USD.
+        days: one entry per day from {first_day} to {last_day}, each around a different theme, without repeating activities across days.
+        Each day has activities (4-6 covering morning, afternoon and evening, each at a specific location with a duration, estimated cost and brief description),
+        meals (breakfast, lunch and dinner, each with an estimated cost) and transportation.
+        """
+    
+    def _dining_prompt(self, city, budget_range):
+        return f"""
+        Recommend places to eat in {city} within the {budget_range} budget range.
+        restaurants: 8-10 covering meal_type breakfast, lunch, dinner and snack, a mix of budget-friendly and mid-range; price_range is $, $$ or $$$.
+        food_districts: popular food areas. local_tips: tips about local food culture. must_try: local dishes.
+        """
+    
+    def _map_prompt(self, city, names):
+        # Semicolons, since names like "Taj Mahal, Agra" contain commas
+        locations_text = "; ".join(names)
         
-        prompt = f"""
+        return f"""
         For the city {city}, provide coordinates for these locations: {locations_text}
-        Return only a JSON object with this structure:
-        {{
-            "locations": [
-                {{
-                    "name": "location name",
-                    "latitude": 0.0,
-                    "longitude": 0.0,
-                    "type": "restaurant/attraction/hotel"
-                }}
-            ],
-            "city_center": {{
-                "latitude": 0.0,
-                "longitude": 0.0
-            }}
-        }}
+        name: each location exactly as written, in the same order. type: restaurant, attraction, hotel, shopping or transport.
+        city_center: the city's coordinates.
         Provide approximate coordinates if exact ones aren't known.
         """
+    
+    def _generate(self, template, args, prompt, deadline=None):
+        """Cached, coalesced and hedged model call; an error dict once ``deadline`` has passed"""
+        key = self._cache_key(template, args)
+        with get_metrics().track_call(template, model_for(template)) as call:
+            cached = self.cache.get(key)
+            if cached is not None:
+                call.cache_hit = True
+                return cached
+            
+            def call_model():
+                start = time.perf_counter()
+                try:
+                    response = self._request(
+                        template, prompt, call, deadline,
+                        on_late=lambda late: self._store(key, self._parse_json_response(late.text, template))
+                    )
+                except TimeoutError as e:
+                    # The response is cached if it still arrives, so a retry doesn't pay for it again
+                    call.error = f"TimeoutError: {e}"
+                    return {'error': 'Deadline exceeded'}
+                if template == 'daily':
+                    self._day_latencies.append(time.perf_counter() - start)
+                call.usage(response)
+                return self._store(key, self._parse_json_response(response.text, template, call))
+            
+            # Identical requests already in flight share that call instead of making another
+            result, call.coalesced = get_single_flight().do(key, call_model)
+            return result
+    
+    async def _agenerate(self, template, args, prompt, timeout=None):
+        """Async model call bounded by the shared semaphore and a per-call timeout.
+
+        Cancelling the awaiting task cancels the in-flight requests, hedges
+        included; a timeout raises ``asyncio.TimeoutError``. Cache reads and
+        writes run in a worker thread, off the event loop.
+        """
+        key = self._cache_key(template, args)
+        with get_metrics().track_call(template, model_for(template)) as call:
+            # Cache reads write access times and counters, so a busy database must not block the loop
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                call.cache_hit = True
+                return cached
+            
+            timeout = self.timeout if timeout is None else timeout
+            model = self._backend(model_for(template))
+            
+            async def request():
+                async with self._get_semaphore():
+                    return await self.rate_limiter.call_async(
+                        model.generate_content_async, prompt,
+                        generation_config=GENERATION_CONFIGS[template], on_retry=call.retried
+                    )
+            
+            async def call_model():
+                response, call.hedge_won = await ahedged_call(
+                    request, self._hedge_after(template), timeout, on_hedge=call.hedged
+                )
+                call.usage(response)
+                result = self._parse_json_response(response.text, template, call)
+                return await asyncio.to_thread(self._store, key, result)
+            
+            result, call.coalesced = await get_single_flight().ado(key, call_model)
+            return result
+    
+    def _request(self, template, prompt, call, deadline=None, on_late=None):
+        """Rate-limited call to the template's model, hedged once it runs past the template's usual latency.
+
+        Raises TimeoutError when ``deadline`` passes first; ``on_late(response)``
+        then gets the response if it still arrives.
+        """
+        model = self._backend(model_for(template))
+        timeout = self.timeout if deadline is None else deadline.timeout(self.timeout)
+        response, call.hedge_won = hedged_call(
+            partial(
+                self.rate_limiter.call, model.generate_content, prompt,
+                generation_config=GENERATION_CONFIGS[template],
+                request_options={'timeout': timeout},
+                on_retry=call.retried
+            ),
+            self._hedge_after(template),
+            None if deadline is None else deadline.remaining(),
+            on_hedge=call.hedged,
+            on_late=on_late
+        )
+        return response
+    
+    def _hedge_after(self, template):
+        return hedge_delay(template, self.hedge_quantile)
+    
+    def _backend(self, model_name):
+        if self.backend is not None:
+            return self.backend
+        if model_name not in self.backends:
+            self.backends[model_name] = get_backend(model_name)
+        return self.backends[model_name]
+    
+    def _split_days(self, parsed, day_numbers):
+        """Map a batched response back onto per-day dicts, or None if it is unusable"""
+        days = parsed.get('days') if isinstance(parsed, dict) else None
+        if not isinstance(days, list):
+            return None
+        
+        by_number = {}
+        for position, daily in enumerate(days):
+            if not isinstance(daily, dict) or not daily.get('activities'):
+                continue
+            # Trust the model's day number when it is in range, otherwise its position
+            day = daily.get('day')
+            if day not in day_numbers and position < len(day_numbers):
+                day = day_numbers[position]
+            by_number.setdefault(day, dict(daily, day=day))
         
-        response = self.model.generate_content(prompt)
-        return self._parse_json_response(response.text)
+        if not by_number:
+            return None
+        return [by_number.get(day) for day in day_numbers]
     
-    def _parse_json_response(self, response_text):
+    @staticmethod
+    def _estimate_tokens(text):
+        # Rough 4-characters-per-token heuristic for when usage metadata is missing
+        return max(1, len(text) // 4)
+    
+    @staticmethod
+    def _daily_args(city, day_number, budget_bucket):
+        # Shared by the single-day and batched paths so each day is cached once under one key
+        return {'city': city, 'day': day_number, 'budget_bucket': budget_bucket}
+    
+    def _cache_key(self, template, args):
+        return self.cache.make_key(model_for(template), template, self.PROMPT_VERSIONS[template], args)
+    
+    def _store(self, key, result):
+        # Parse failures are worth retrying, so only cache good responses
+        if 'error' not in result:
+            self.cache.set(key, result)
+        return result
+    
+    @classmethod
+    def _get_semaphore(cls):
+        loop = asyncio.get_running_loop()
+        semaphore = cls._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+            cls._semaphores[loop] = semaphore
+        return semaphore
+    
+    def _parse_json_response(self, response_text, template=None, call=None):
         try:
-            # Clean the response text
-            cleaned_text = response_text.strip()
-            if cleaned_text.startswith('```json'):
-                cleaned_text = cleaned_text[7:]
-            if cleaned_text.endswith('```'):
-                cleaned_text = cleaned_text[:-3]
-            cleaned_text = cleaned_text.strip()
-            
-            return json.loads(cleaned_text)
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Response text: {response_text}")
+            return extract_json(response_text, self.RESPONSE_DEFAULTS.get(template))
+        except JSONExtractionError as e:
+            # Recorded in the metrics trace along with the start of the response
+            if call is not None:
+                call.parse_failed(e, response_text)
             return {"error": "Failed to parse response"}
\ No newline at end of file
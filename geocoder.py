@@ -0,0 +1,165 @@
+"""Geocoding stage: activity locations to map coordinates with as few model calls as possible.
+
+Location names are normalized and deduplicated, then resolved from the
+per-city LocationStore, the offline gazetteer and, for whatever is left, the
+model, which gets the remaining names in chunks of ``chunk_size`` run in
+parallel. Model results and confident gazetteer matches (at least
+GEOCODE_STORE_MIN_SCORE) are written back to the store, so a city seen
+before is resolved without any model calls.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from config import GEOCODE_CHUNK_SIZE, GEOCODE_MAX_WORKERS, GEOCODE_STORE_MIN_SCORE
+from gazetteer import get_gazetteer, normalize_name
+from location_store import get_location_store
+
+
+class Geocoder:
+    def __init__(self, gemini, store=None, chunk_size=GEOCODE_CHUNK_SIZE, max_workers=GEOCODE_MAX_WORKERS):
+        self.gemini = gemini
+        self.store = store if store is not None else get_location_store()
+        self.chunk_size = max(1, chunk_size)
+        self.max_workers = max(1, max_workers)
+
+    def geocode(self, city, activities, deadline=None):
+        """map_data for activities (dicts with ``location`` and ``day``) in the model's MapData shape.
+
+        Besides ``city_center`` and ``locations`` (one per distinct place and
+        day), the result has ``geocode_stats`` counting where each name was
+        resolved. Returns a dict with ``error`` if a model chunk failed (or
+        ran past ``deadline``) and nothing could be placed.
+        """
+        plan = self._plan(city, activities)
+        chunks = self._chunks(plan['missing'])
+        responses = []
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+                responses = list(pool.map(lambda chunk: self.gemini.generate_map_locations(city, chunk, deadline), chunks))
+        return self._finish(city, plan, chunks, responses)
+
+    async def ageocode(self, city, activities, timeout=None):
+        """Async counterpart of geocode; chunks run concurrently, at most ``max_workers`` at a time.
+
+        Store reads and writes run in a worker thread, off the event loop.
+        """
+        plan = await asyncio.to_thread(self._plan, city, activities)
+        chunks = self._chunks(plan['missing'])
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def locate(chunk):
+            async with semaphore:
+                return await self.gemini.agenerate_map_locations(city, chunk, timeout=timeout)
+
+        responses = await asyncio.gather(*[locate(chunk) for chunk in chunks])
+        return await asyncio.to_thread(self._finish, city, plan, chunks, responses)
+
+    def _plan(self, city, activities):
+        """Resolve what the store and gazetteer know; the rest is left in ``missing``"""
+        names = {}  # Normalized name -> first spelling seen, which is what the map shows
+        visits = {}  # (normalized name, day) in itinerary order
+        for activity in activities:
+            name = (activity.get('location') or '').strip()
+            key = normalize_name(name)
+            if key:
+                names.setdefault(key, name)
+                visits[(key, activity.get('day'))] = None
+
+        gazetteer = get_gazetteer()
+        center = self.store.get_center(city)
+        if center is None:
+            place = gazetteer.lookup_city(city)
+            if place:
+                center = {'latitude': place['latitude'], 'longitude': place['longitude']}
+                self.store.set_center(city, center, 'gazetteer')
+
+        resolved = self.store.get_many(city, names)
+        stats = {'names': len(names), 'store': len(resolved), 'gazetteer': 0, 'model': 0, 'calls': 0, 'unresolved': 0}
+
+        near = (center['latitude'], center['longitude']) if center else None
+        found = {}
+        confident = {}
+        for key, name in names.items():
+            if key not in resolved:
+                match = gazetteer.geocode(name, near=near)
+                if match:
+                    found[key] = {'latitude': match['latitude'], 'longitude': match['longitude'], 'type': match['type']}
+                    if match['score'] >= GEOCODE_STORE_MIN_SCORE:
+                        confident[key] = found[key]
+        if confident:
+            self.store.put_many(city, confident, 'gazetteer')
+        resolved.update(found)
+        stats['gazetteer'] = len(found)
+
+        return {
+            'names': names,
+            'visits': list(visits),
+            'center': center,
+            'resolved': resolved,
+            'missing': [name for key, name in names.items() if key not in resolved],
+            'stats': stats
+        }
+
+    def _chunks(self, names):
+        return [names[start:start + self.chunk_size] for start in range(0, len(names), self.chunk_size)]
+
+    def _finish(self, city, plan, chunks, responses):
+        center, resolved, stats = plan['center'], plan['resolved'], plan['stats']
+        stats['calls'] = len(chunks)
+
+        errors = []
+        model_center = None
+        for chunk, response in zip(chunks, responses):
+            if 'error' in response:
+                errors.append(response['error'])
+                continue
+            model_center = model_center or response.get('city_center')
+            found = self._match(chunk, response.get('locations') or [])
+            if found:
+                self.store.put_many(city, found, 'model')
+                resolved.update(found)
+            stats['model'] += len(found)
+        stats['unresolved'] = stats['names'] - len(resolved)
+
+        if center is None and model_center:
+            center = {'latitude': model_center['latitude'], 'longitude': model_center['longitude']}
+            self.store.set_center(city, center, 'model')
+
+        locations = [
+            dict(resolved[key], name=plan['names'][key], day=day)
+            for key, day in plan['visits'] if key in resolved
+        ]
+        if errors and not (center and locations):
+            return {'error': errors[0]}
+
+        map_data = {'locations': locations, 'geocode_stats': stats}
+        if center:
+            map_data['city_center'] = center
+        return map_data
+
+    @staticmethod
+    def _match(chunk, locations):
+        """Model locations keyed by the normalized name they answer: by name, else by position"""
+        wanted = {normalize_name(name) for name in chunk}
+        found = {}
+        for position, location in enumerate(locations):
+            if not isinstance(location, dict):
+                continue
+            key = normalize_name(str(location.get('name') or ''))
+            if key not in wanted:
+                # A renamed place can only be matched when the list lines up with the request
+                if len(locations) != len(chunk):
+                    continue
+                key = normalize_name(chunk[position])
+            latitude, longitude = location.get('latitude'), location.get('longitude')
+            if not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+                continue
+            if latitude == 0 and longitude == 0:
+                # The schema default, not a place
+                continue
+            found.setdefault(key, {
+                'latitude': float(latitude),
+                'longitude': float(longitude),
+                'type': location.get('type') or 'attraction'
+            })
+        return found
@@ -0,0 +1,150 @@
+"""Hedged model calls: a duplicate request for calls running past their usual latency.
+
+A call that hasn't answered after ``hedge_after`` seconds, the template's
+recent HEDGE_QUANTILE latency (see hedge_delay), gets a duplicate request,
+up to HEDGE_MAX_EXTRA of them. Whichever answers first wins and the others
+are cancelled. Hedging at p95 duplicates about one call in twenty and cuts
+the slowest calls to roughly p95 plus a typical call.
+
+Async losers are cancelled outright. A blocking request can't be
+interrupted, so a sync loser that has already started is left to finish on
+the hedge pool; its request timeout bounds it. When the call as a whole
+timed out, the first such late answer goes to ``on_late`` so the quota it
+used isn't wasted (callers cache it for the next request).
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import HEDGE_MAX_EXTRA, HEDGE_MAX_WORKERS, HEDGE_MIN_SAMPLES, HEDGE_QUANTILE
+from metrics import get_metrics
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+        return _executor
+
+
+def hedge_delay(template, quantile=HEDGE_QUANTILE, min_samples=HEDGE_MIN_SAMPLES):
+    """Seconds after which a call for ``template`` is hedged, or None while disabled or too few calls are timed"""
+    if not quantile:
+        return None
+    return get_metrics().quantile("call", template, quantile, min_samples=min_samples)
+
+
+def _next_wait(elapsed, attempts, hedge_after, timeout, max_extra):
+    """Seconds until the next hedge is due or the call times out, or None to wait for an answer"""
+    waits = []
+    if hedge_after is not None and attempts <= max_extra:
+        waits.append(hedge_after * attempts - elapsed)
+    if timeout is not None:
+        waits.append(timeout - elapsed)
+    return max(0.0, min(waits)) if waits else None
+
+
+def hedged_call(func, hedge_after=None, timeout=None, on_hedge=None, max_extra=HEDGE_MAX_EXTRA, on_late=None):
+    """Return ``(func(), hedge_won)``, starting another ``func()`` every ``hedge_after`` seconds without an answer.
+
+    ``on_hedge()`` is called for each duplicate started. Raises TimeoutError
+    when nothing has answered within ``timeout`` seconds, after which
+    ``on_late(result)`` gets the first attempt to still succeed, from a pool
+    thread. Raises the error of the last attempt when every attempt failed.
+    Without a hedge delay or timeout ``func`` is simply called.
+    """
+    if timeout is not None and timeout <= 0:
+        raise TimeoutError("Deadline passed before the call started")
+    if hedge_after is None and timeout is None:
+        return func(), False
+
+    executor = _get_executor()
+    start = time.monotonic()
+    attempts = [executor.submit(func)]
+    pending = set(attempts)
+    try:
+        while True:
+            elapsed = time.monotonic() - start
+            done, pending = wait(
+                pending, timeout=_next_wait(elapsed, len(attempts), hedge_after, timeout, max_extra),
+                return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    return future.result(), future is not attempts[0]
+                error = future.exception()
+            if not pending:
+                raise error
+            elapsed = time.monotonic() - start
+            if timeout is not None and elapsed >= timeout:
+                if on_late:
+                    _deliver_late(pending, on_late)
+                raise TimeoutError(f"No response within {timeout:.1f}s")
+            if hedge_after is not None and len(attempts) <= max_extra and elapsed >= hedge_after * len(attempts):
+                attempts.append(executor.submit(func))
+                pending.add(attempts[-1])
+                if on_hedge:
+                    on_hedge()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _deliver_late(futures, on_late):
+    """Hand the first of ``futures`` to succeed to ``on_late`` once it finishes"""
+    delivered = []
+    lock = threading.Lock()
+
+    def done(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        with lock:
+            if delivered:
+                return
+            delivered.append(future)
+        on_late(future.result())
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+async def ahedged_call(func, hedge_after=None, timeout=None, on_hedge=None, max_extra=HEDGE_MAX_EXTRA):
+    """Async hedged_call: ``func`` is a coroutine function and the attempts that lose are cancelled"""
+    if timeout is not None and timeout <= 0:
+        raise TimeoutError("Deadline passed before the call started")
+    if hedge_after is None and timeout is None:
+        return await func(), False
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    attempts = [asyncio.ensure_future(func())]
+    pending = set(attempts)
+    try:
+        while True:
+            elapsed = loop.time() - start
+            done, pending = await asyncio.wait(
+                pending, timeout=_next_wait(elapsed, len(attempts), hedge_after, timeout, max_extra),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is not attempts[0]
+                error = task.exception()
+            if not pending:
+                raise error
+            elapsed = loop.time() - start
+            if timeout is not None and elapsed >= timeout:
+                raise TimeoutError(f"No response within {timeout:.1f}s")
+            if hedge_after is not None and len(attempts) <= max_extra and elapsed >= hedge_after * len(attempts):
+                attempts.append(asyncio.ensure_future(func()))
+                pending.add(attempts[-1])
+                if on_hedge:
+                    on_hedge()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,92 @@
+import json
+
+
+class IncrementalJSONParser:
+    """Pull completed list items out of a JSON document while it is still streaming.
+
+    Feed text chunks as they arrive; ``feed`` returns ``(list_name, item)`` for
+    every object that has just closed inside one of the ``collect`` arrays,
+    e.g. ``("activities", {...})``. Text before the first ``{`` (such as a
+    markdown code fence) and anything after the root object closes is ignored.
+    """
+
+    def __init__(self, collect=("activities", "meals", "restaurants")):
+        self.collect = set(collect)
+        self.done = False
+        self._buffer = ""
+        self._started = False
+        # Open containers as [bracket, owning key, start offset]
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._last_key = None
+
+    @property
+    def text(self):
+        return self._buffer
+
+    def feed(self, chunk):
+        events = []
+        offset = len(self._buffer)
+        self._buffer += chunk
+
+        for index, char in enumerate(chunk, offset):
+            if self.done:
+                break
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._expect_key and self._stack and self._stack[-1][0] == "{":
+                        self._last_key = self._decode(self._string_start, index + 1)
+                continue
+
+            if not self._started:
+                if char != "{":
+                    continue
+                self._started = True
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in "{[":
+                self._stack.append([char, self._owner_key(), index])
+                self._expect_key = char == "{"
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                bracket, key, start = self._stack.pop()
+                if bracket == "{" and key in self.collect and self._stack and self._stack[-1][0] == "[":
+                    item = self._decode(start, index + 1)
+                    if isinstance(item, dict):
+                        events.append((key, item))
+                self._expect_key = False
+                if not self._stack:
+                    self.done = True
+            elif char == ":":
+                self._expect_key = False
+            elif char == ",":
+                self._expect_key = bool(self._stack) and self._stack[-1][0] == "{"
+
+        return events
+
+    def _owner_key(self):
+        # Objects inside an array belong to the array's key; values in an object to the last key
+        if not self._stack:
+            return None
+        bracket, key, _ = self._stack[-1]
+        if bracket == "[":
+            return key
+        return self._last_key
+
+    def _decode(self, start, end):
+        try:
+            return json.loads(self._buffer[start:end])
+        except ValueError:
+            return None
@@ -1,50 +1,158 @@
+import asyncio
+from functools import partial
+
+from config import DAY_CHUNK_SIZE, DEADLINE_GEOCODE_SHARE, ITINERARY_DEADLINE, MAX_CONCURRENT_STAGES
+from deadline import make_deadline
 from gemini_service import GeminiService
+from geocoder import Geocoder
 from map_service import MapService
+from budget_engine import apply_budget
+from models import Trip
+from routing import route_lines, route_trip
+from stage_scheduler import StageScheduler
 
 class ItineraryGenerator:
-    def __init__(self):
-        self.gemini = GeminiService()
+    def __init__(self, max_concurrency=MAX_CONCURRENT_STAGES, day_chunk_size=DAY_CHUNK_SIZE, gemini=None,
+                 deadline=ITINERARY_DEADLINE):
+        self.gemini = gemini or GeminiService()
+        self.geocoder = Geocoder(self.gemini)
         self.map_service = MapService()
+        self.max_concurrency = max_concurrency
+        # Days generated per model call; 1 keeps the one-call-per-day path
+        self.day_chunk_size = max(1, day_chunk_size)
+        # Seconds each itinerary may take end to end (0 for no deadline)
+        self.deadline = deadline
     
-    def generate_complete_itinerary(self, city, budget, days):
-        # Step 1: Generate overview and summary
-        summary = self.gemini.generate_itinerary_summary(city, budget, days)
-        
-        # Step 2: Generate daily itineraries
+    def generate_complete_itinerary(self, city, budget, days, progress_callback=None):
+        """Generate every stage of the itinerary, running independent stages in parallel.
+
+        ``progress_callback(stage, result, completed, total)`` is invoked as each
+        stage finishes. Generation stages must finish within their share of the
+        itinerary's deadline and geocoding within what is left; a stage that
+        runs out of time comes back as an error dict and the trip goes without it.
+        """
         daily_budget = budget / days
-        daily_itineraries = []
-        all_activities = []
+        budget_range = self._determine_budget_range(budget, days)
+        deadline = make_deadline(self.deadline)
+        generation = deadline.split(1 - DEADLINE_GEOCODE_SHARE) if deadline else None
         
-        for day in range(1, days + 1):
-            daily_itinerary = self.gemini.generate_daily_itinerary(city, day, daily_budget)
-            daily_itineraries.append(daily_itinerary)
-            if 'activities' in daily_itinerary:
-                all_activities.extend(daily_itinerary['activities'])
+        scheduler = StageScheduler(self.max_concurrency)
         
-        # Step 3: Generate dining recommendations
-        budget_range = self._determine_budget_range(budget, days)
-        dining = self.gemini.generate_dining_recommendations(city, budget_range)
+        # Summary, dining and every day are independent of each other
+        scheduler.add_stage('summary', partial(self.gemini.generate_itinerary_summary, city, budget, days, generation))
+        if self.day_chunk_size > 1:
+            day_stages = []
+            for first_day in range(1, days + 1, self.day_chunk_size):
+                last_day = min(first_day + self.day_chunk_size - 1, days)
+                day_stages.append(scheduler.add_stage(
+                    f'days_{first_day}_{last_day}',
+                    partial(self.gemini.generate_daily_itinerary_chunk, city, first_day, last_day, daily_budget, generation)
+                ))
+        else:
+            day_stages = [
+                scheduler.add_stage(f'day_{day}', partial(self.gemini.generate_daily_itinerary, city, day, daily_budget, generation))
+                for day in range(1, days + 1)
+            ]
+        scheduler.add_stage('dining', partial(self.gemini.generate_dining_recommendations, city, budget_range, generation))
+        
+        # Map locations need the activities from every day
+        scheduler.add_stage('map_data', partial(self._generate_map_data, city, deadline), depends_on=day_stages)
         
-        # Step 4: Generate map with locations
-        map_data = self.gemini.generate_map_locations(city, all_activities)
+        results = scheduler.run(progress_callback)
         
-        # Step 5: Create interactive map
-        if 'city_center' in map_data and 'locations' in map_data:
-            itinerary_map = self.map_service.create_itinerary_map(
-                map_data['city_center'], 
-                map_data['locations']
-            )
+        if self.day_chunk_size > 1:
+            daily_itineraries = []
+            for name in day_stages:
+                daily_itineraries.extend(results[name][0])
+            batch_stats = self.gemini.merge_batch_stats([results[name][1] for name in day_stages])
         else:
-            itinerary_map = None
+            daily_itineraries = [results[name] for name in day_stages]
+            batch_stats = None
+        map_data = results['map_data']
+        trip = Trip.from_stages(city, budget, days, results['summary'], daily_itineraries, results['dining'], map_data)
+        budget_report = apply_budget(trip)
+        # Reorder each day's stops into a short route now that they have coordinates
+        route_stats = route_trip(trip)
+        
+        return {
+            'summary': results['summary'],
+            'daily_itineraries': daily_itineraries,
+            'dining': results['dining'],
+            'map_data': map_data,
+            'trip': trip,
+            'map': self._create_map(trip),
+            'batch_stats': batch_stats,
+            'route_stats': route_stats,
+            'budget_report': budget_report
+        }
+    
+    async def agenerate_complete_itinerary(self, city, budget, days, timeout=None):
+        """Async counterpart of generate_complete_itinerary for use inside an event loop.
+
+        Concurrency is bounded by GeminiService's shared semaphore rather than a
+        thread pool, so many itineraries can be in flight on one loop.
+        """
+        daily_budget = budget / days
+        budget_range = self._determine_budget_range(budget, days)
+        
+        summary_task = asyncio.ensure_future(
+            self.gemini.agenerate_itinerary_summary(city, budget, days, timeout=timeout)
+        )
+        dining_task = asyncio.ensure_future(
+            self.gemini.agenerate_dining_recommendations(city, budget_range, timeout=timeout)
+        )
+        try:
+            daily_itineraries = await asyncio.gather(*[
+                self.gemini.agenerate_daily_itinerary(city, day, daily_budget, timeout=timeout)
+                for day in range(1, days + 1)
+            ])
+            
+            map_data = await self.geocoder.ageocode(city, self._day_activities(daily_itineraries), timeout=timeout)
+            
+            summary, dining = await asyncio.gather(summary_task, dining_task)
+        except BaseException:
+            # Don't leave sibling requests running after a failure or cancellation
+            summary_task.cancel()
+            dining_task.cancel()
+            raise
+        
+        trip = Trip.from_stages(city, budget, days, summary, daily_itineraries, dining, map_data)
+        budget_report = apply_budget(trip)
+        route_stats = route_trip(trip)
         
         return {
             'summary': summary,
             'daily_itineraries': daily_itineraries,
             'dining': dining,
             'map_data': map_data,
-            'map': itinerary_map
+            'trip': trip,
+            'map': self._create_map(trip),
+            'route_stats': route_stats,
+            'budget_report': budget_report
         }
     
+    def _create_map(self, trip):
+        """Interactive map of the trip's locations, or None without a city center to put it on"""
+        if trip.city_center is None:
+            return None
+        return self.map_service.create_itinerary_map(trip.city_center, trip.locations, routes=route_lines(trip))
+    
+    def _generate_map_data(self, city, deadline, *day_results):
+        daily_itineraries = []
+        for day_result in day_results:
+            # Chunked stages return (itineraries, stats) covering several days
+            daily_itineraries.extend(day_result[0] if isinstance(day_result, tuple) else [day_result])
+        return self.geocoder.geocode(city, self._day_activities(daily_itineraries), deadline)
+    
+    @staticmethod
+    def _day_activities(daily_itineraries):
+        """Every activity tagged with its day, so maps can be split into per-day layers"""
+        return [
+            dict(activity, day=daily_itinerary.get('day'))
+            for daily_itinerary in daily_itineraries
+            for activity in daily_itinerary.get('activities', [])
+        ]
+    
     def _determine_budget_range(self, total_budget, days):
         daily_budget = total_budget / days
         if daily_budget < 50:
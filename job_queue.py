@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from config import JOB_QUEUE_PATH, JOB_RETENTION, JOB_STALE_AFTER
+from response_cache import normalize_args
+from sqlite_util import SQLiteStore
+
+ACTIVE = ("queued", "running")
+
+
+class JobLostError(RuntimeError):
+    """The job was reclaimed by another worker after this one's heartbeat went stale"""
+
+
+class JobQueue(SQLiteStore):
+    """SQLite-backed queue of itinerary jobs with per-stage results.
+
+    Submitting returns a job ID right away; worker threads started with
+    start_workers claim queued jobs and record each stage's result as it
+    finishes, so any session (or a later rerun of the same one) can poll the
+    job. Submitting parameters that match a queued or running job returns
+    that job instead of starting another. A worker refreshes its job's
+    heartbeat every ``stale_after / 3`` seconds while running it; jobs left
+    running by a process that died are picked up again once their heartbeat
+    is older than ``stale_after``. Each claim has its own owner token, and
+    stage results and the final result are only written by the current owner.
+    """
+
+    # Autocommit mode so BEGIN IMMEDIATE controls the transactions that need it
+    isolation_level = None
+
+    def __init__(self, path=JOB_QUEUE_PATH, stale_after=JOB_STALE_AFTER, retention=JOB_RETENTION):
+        super().__init__(path)
+        self.stale_after = stale_after
+        self.retention = retention
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self._workers = []
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, key TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, "
+                "result TEXT, error TEXT, worker TEXT, created_at REAL NOT NULL, started_at REAL, "
+                "heartbeat REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_stages ("
+                "job_id TEXT NOT NULL, stage TEXT NOT NULL, result TEXT NOT NULL, "
+                "completed INTEGER NOT NULL, total INTEGER NOT NULL, finished_at REAL NOT NULL, "
+                "PRIMARY KEY (job_id, stage))"
+            )
+
+    @staticmethod
+    def make_key(params):
+        payload = json.dumps(normalize_args(params), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def submit(self, params):
+        """Queue a job for ``params`` and return its ID, or the ID of a matching active job"""
+        key = self.make_key(params)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            # BEGIN IMMEDIATE so two sessions submitting at once can't both insert
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+                (key, *ACTIVE)
+            ).fetchone()
+            if row:
+                return row[0]
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, key, params, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, key, json.dumps(params), now)
+            )
+            self._purge(conn, now)
+        self._wakeup.set()
+        return job_id
+
+    def find_active(self, params):
+        """ID of the queued or running job for ``params``, if any"""
+        row = self._connection().execute(
+            "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+            (self.make_key(params), *ACTIVE)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, job_id):
+        """Job status, stage results in completion order, progress and final result"""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT params, status, result, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        params, status, result, error, created_at, started_at, finished_at = row
+        stages = {}
+        completed = total = 0
+        for stage, stage_result, stage_completed, stage_total in conn.execute(
+            "SELECT stage, result, completed, total FROM job_stages WHERE job_id = ? ORDER BY finished_at",
+            (job_id,)
+        ):
+            stages[stage] = json.loads(stage_result)
+            completed, total = max(completed, stage_completed), stage_total
+        return {
+            "id": job_id,
+            "params": json.loads(params),
+            "status": status,
+            "stages": stages,
+            "completed": completed,
+            "total": total,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at
+        }
+
+    def claim(self):
+        """Atomically take the oldest queued (or abandoned) job; returns (job_id, params, owner) or None"""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, params FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND heartbeat < ?) ORDER BY created_at LIMIT 1",
+                (now - self.stale_after,)
+            ).fetchone()
+            if row is None:
+                return None
+            # Unique per claim, so a reclaimed job is told apart even from a worker thread in this process
+            owner = f"{self.worker_id}-{uuid.uuid4().hex[:8]}"
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat = ? WHERE id = ?",
+                (owner, now, now, row[0])
+            )
+        return row[0], json.loads(row[1]), owner
+
+    def heartbeat(self, job_id, owner):
+        """Mark a running job as alive; False once another worker has reclaimed it"""
+        with self._connection() as conn:
+            return conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), job_id, owner)
+            ).rowcount > 0
+
+    def record_stage(self, job_id, stage, result, completed, total, owner):
+        """Store a stage result; raises JobLostError if the job is no longer ``owner``'s"""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            owned = conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (now, job_id, owner)
+            ).rowcount
+            if not owned:
+                raise JobLostError(job_id)
+            conn.execute(
+                "INSERT OR REPLACE INTO job_stages (job_id, stage, result, completed, total, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, stage, json.dumps(result), completed, total, now)
+            )
+
+    def complete(self, job_id, result, owner):
+        return self._finish(job_id, owner, "done", result=json.dumps(result))
+
+    def fail(self, job_id, error, owner):
+        return self._finish(job_id, owner, "failed", error=error)
+
+    def start_workers(self, runner, count):
+        """Start ``count`` daemon threads that run claimed jobs as ``runner(**params, on_stage_complete=...)``"""
+        for _ in range(count - len(self._workers)):
+            worker = threading.Thread(target=self._work, args=(runner,), daemon=True, name="job-worker")
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self, runner):
+        while True:
+            claimed = self.claim()
+            if claimed is None:
+                # Woken immediately by submit(); the timeout also catches other processes' jobs
+                self._wakeup.wait(timeout=2)
+                self._wakeup.clear()
+                continue
+            job_id, params, owner = claimed
+
+            def on_stage_complete(stage, result, completed, total):
+                self.record_stage(job_id, stage, result, completed, total, owner)
+
+            # A single slow stage mustn't let the heartbeat go stale and the job be run twice
+            stop = threading.Event()
+            threading.Thread(
+                target=self._keep_alive, args=(job_id, owner, stop), daemon=True, name="job-heartbeat"
+            ).start()
+            try:
+                result = runner(**params, on_stage_complete=on_stage_complete)
+            except JobLostError:
+                print(f"Job {job_id} was reclaimed by another worker; dropping this run", file=sys.stderr)
+            except Exception as e:
+                traceback.print_exc()
+                self.fail(job_id, f"{type(e).__name__}: {e}", owner)
+            else:
+                self.complete(job_id, result, owner)
+            finally:
+                stop.set()
+
+    def _keep_alive(self, job_id, owner, stop):
+        while not stop.wait(self.stale_after / 3):
+            if not self.heartbeat(job_id, owner):
+                return
+
+    def _finish(self, job_id, owner, status, result=None, error=None):
+        """Set the final status if the job is still ``owner``'s; returns whether it was"""
+        with self._connection() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, result, error, time.time(), job_id, owner)
+            ).rowcount > 0
+
+    def _purge(self, conn, now):
+        old = [
+            (job_id,) for job_id, in conn.execute(
+                "SELECT id FROM jobs WHERE status NOT IN (?, ?) AND finished_at < ?",
+                (*ACTIVE, now - self.retention)
+            )
+        ]
+        conn.executemany("DELETE FROM job_stages WHERE job_id = ?", old)
+        conn.executemany("DELETE FROM jobs WHERE id = ?", old)
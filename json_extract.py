@@ -0,0 +1,227 @@
+import copy
+import json
+import re
+
+
+class JSONExtractionError(ValueError):
+    pass
+
+
+# One alternation covers every token we care about, so the scan is a single
+# re.finditer pass that runs in C instead of a Python loop per character.
+_TOKEN = re.compile(r'''
+    (?P<string>"[^"\\]*(?:\\.[^"\\]*)*")
+  | (?P<open_string>"[^"\\]*(?:\\.[^"\\]*)*\\?\Z)
+  | (?P<squote>'[^'\\]*(?:\\.[^'\\]*)*')
+  | (?P<punct>[{}\[\],:])
+  | (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_$][\w$]*)
+  | (?P<ws>\s+)
+  | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+
+_LITERALS = {
+    'true': 'true', 'false': 'false', 'null': 'null',
+    'True': 'true', 'False': 'false', 'None': 'null'
+}
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+_DECODER = json.JSONDecoder(strict=False)
+
+
+def extract_json(text, schema=None):
+    """Return the outermost JSON object in a model response.
+
+    Prose and code fences around the object are skipped. A well-formed object
+    is decoded directly; otherwise a single tokenizing pass repairs common
+    defects on the way (trailing or doubled commas, missing commas, unquoted
+    keys, single-quoted strings, Python literals, and a truncated tail). If ``schema`` is given, missing or
+    mistyped fields are filled from it via apply_defaults.
+
+    Raises JSONExtractionError if no object can be recovered.
+    """
+    obj, _ = _extract(text)
+    if schema is not None:
+        obj = apply_defaults(obj, schema)
+    return obj
+
+
+def extract_json_with_repairs(text):
+    """Like extract_json, but also returns the list of repairs that were applied"""
+    return _extract(text)
+
+
+def _extract(text):
+    start = text.find('{')
+    if start == -1:
+        raise JSONExtractionError("No JSON object found")
+
+    # Fast path: well-formed responses decode in C and stop at the object's end,
+    # so surrounding fences and prose cost nothing
+    try:
+        obj, _ = _DECODER.raw_decode(text, start)
+        return obj, []
+    except ValueError:
+        pass
+
+    # Emitted tokens as (kind, text); kind drives the repairs below
+    out = []
+    stack = []
+    repairs = []
+    last = None  # kind of the last significant token
+
+    def emit(kind, value):
+        nonlocal last
+        out.append((kind, value))
+        last = kind
+
+    def in_key_position():
+        return stack and stack[-1] == '{' and last in ('open', 'comma')
+
+    def needs_comma():
+        # Two values back to back inside a container means the model dropped a comma
+        return stack and last in ('value', 'close')
+
+    for match in _TOKEN.finditer(text, start):
+        kind = match.lastgroup
+        token = match.group()
+
+        if kind == 'ws':
+            continue
+
+        if kind == 'punct':
+            if token in '{[':
+                if needs_comma():
+                    emit('comma', ',')
+                    repairs.append('missing comma')
+                stack.append(token)
+                emit('open', token)
+            elif token in '}]':
+                if not stack:
+                    continue
+                if last == 'comma':
+                    out.pop()
+                    repairs.append('trailing comma')
+                elif last == 'colon':
+                    _trim_tail(out)
+                    repairs.append('missing value')
+                # Close anything the model left open inside this container
+                while stack and stack[-1] != _opener(token):
+                    emit('close', _CLOSERS[stack.pop()])
+                    repairs.append('unbalanced bracket')
+                if stack:
+                    stack.pop()
+                    emit('close', token)
+                if not stack:
+                    break
+            elif token == ',':
+                if last in ('comma', 'open', 'colon'):
+                    repairs.append('extra comma')
+                    continue
+                emit('comma', ',')
+            else:
+                emit('colon', ':')
+            continue
+
+        if not stack:
+            continue
+
+        if kind in ('string', 'squote', 'word', 'number') and needs_comma():
+            emit('comma', ',')
+            repairs.append('missing comma')
+
+        if kind == 'string' or kind == 'squote':
+            if kind == 'squote':
+                token = json.dumps(token[1:-1].replace("\\'", "'"))
+                repairs.append('single quotes')
+            emit('key' if in_key_position() else 'value', token)
+        elif kind == 'word':
+            if in_key_position():
+                emit('key', json.dumps(token))
+                repairs.append('unquoted key')
+            elif token in _LITERALS:
+                if token != _LITERALS[token]:
+                    repairs.append('python literal')
+                emit('value', _LITERALS[token])
+            else:
+                emit('value', json.dumps(token))
+                repairs.append('bare word')
+        elif kind == 'number':
+            emit('value', token)
+        elif kind == 'open_string':
+            repairs.append('truncated')
+            if not in_key_position():
+                emit('value', token.rstrip('\\') + '"')
+        # 'other' tokens (stray prose or ellipses) are dropped
+
+    if stack:
+        if 'truncated' not in repairs:
+            repairs.append('truncated')
+        _trim_tail(out)
+        while stack:
+            out.append(('close', _CLOSERS[stack.pop()]))
+
+    try:
+        obj = json.loads(''.join(value for _, value in out), strict=False)
+    except ValueError as e:
+        raise JSONExtractionError(f"Could not repair JSON: {e}") from e
+    if not isinstance(obj, dict):
+        raise JSONExtractionError("Top-level JSON value is not an object")
+    return obj, repairs
+
+
+def _opener(closer):
+    return '{' if closer == '}' else '['
+
+
+def _trim_tail(out):
+    """Drop a dangling comma, colon or key left at the end of a truncated object"""
+    while out:
+        kind = out[-1][0]
+        if kind in ('comma', 'key'):
+            out.pop()
+        elif kind == 'colon':
+            out.pop()
+            if out and out[-1][0] == 'key':
+                out.pop()
+        else:
+            break
+
+
+def apply_defaults(obj, schema):
+    """Fill missing or mistyped fields of ``obj`` from a defaults schema.
+
+    A schema is a dict of field -> default value. A default that is a list
+    holding a single dict describes a list of objects: each item is filled from
+    that dict and non-object items are dropped. Nested dicts recurse. A number
+    where the default is a string is kept as its string form. Fields not in the
+    schema are left untouched.
+    """
+    if not isinstance(obj, dict):
+        return copy.deepcopy(schema)
+
+    result = dict(obj)
+    for field, default in schema.items():
+        value = result.get(field)
+        if isinstance(default, list) and len(default) == 1 and isinstance(default[0], dict):
+            items = value if isinstance(value, list) else []
+            result[field] = [apply_defaults(item, default[0]) for item in items if isinstance(item, dict)]
+        elif isinstance(default, dict):
+            result[field] = apply_defaults(value, default) if isinstance(value, dict) else copy.deepcopy(default)
+        elif value is None or not _same_kind(value, default):
+            result[field] = copy.deepcopy(default)
+        elif isinstance(default, str) and not isinstance(value, str):
+            result[field] = str(value)
+    return result
+
+
+def _same_kind(value, default):
+    if isinstance(default, bool):
+        return isinstance(value, bool)
+    if isinstance(default, (int, float)):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if isinstance(default, str):
+        # Models often return numbers where a display string is expected; keep them
+        return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+    return isinstance(value, type(default))
@@ -0,0 +1,92 @@
+import time
+
+from config import LOCATION_STORE_PATH
+from gazetteer import normalize_name
+from singleton import process_singleton
+from sqlite_util import SQLiteStore
+
+
+class LocationStore(SQLiteStore):
+    """SQLite-backed store of geocoded places, keyed by city and normalized place name.
+
+    Filled by the geocoding stage from the gazetteer and from model responses,
+    so a city's places are resolved once and every later trip to that city
+    finds them here. City centers are kept alongside the places.
+    """
+
+    def __init__(self, path=LOCATION_STORE_PATH):
+        super().__init__(path)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS places ("
+                "city TEXT NOT NULL, name TEXT NOT NULL, latitude REAL NOT NULL, longitude REAL NOT NULL, "
+                "type TEXT NOT NULL, source TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (city, name))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cities ("
+                "city TEXT PRIMARY KEY, latitude REAL NOT NULL, longitude REAL NOT NULL, "
+                "source TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                # Gazetteer rows from before near-miss names needed a city center may be wrong pins
+                conn.execute("DELETE FROM places WHERE source = 'gazetteer'")
+                conn.execute("PRAGMA user_version = 1")
+
+    def get_center(self, city):
+        """{'latitude', 'longitude'} of a city, or None if it hasn't been resolved yet"""
+        row = self._connection().execute(
+            "SELECT latitude, longitude FROM cities WHERE city = ?", (normalize_name(city),)
+        ).fetchone()
+        return {'latitude': row[0], 'longitude': row[1]} if row else None
+
+    def set_center(self, city, center, source):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cities (city, latitude, longitude, source, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (normalize_name(city), center['latitude'], center['longitude'], source, time.time())
+            )
+
+    def get_many(self, city, names):
+        """Stored places for the given normalized names, as {name: {'latitude', 'longitude', 'type'}}"""
+        city = normalize_name(city)
+        conn = self._connection()
+        found = {}
+        names = list(names)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(names), 500):
+            batch = names[start:start + 500]
+            rows = conn.execute(
+                f"SELECT name, latitude, longitude, type FROM places "
+                f"WHERE city = ? AND name IN ({', '.join('?' * len(batch))})",
+                (city, *batch)
+            )
+            for name, latitude, longitude, place_type in rows:
+                found[name] = {'latitude': latitude, 'longitude': longitude, 'type': place_type}
+        return found
+
+    def put_many(self, city, places, source):
+        """Store {normalized name: {'latitude', 'longitude', 'type'}} for a city"""
+        city = normalize_name(city)
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO places (city, name, latitude, longitude, type, source, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (city, name, place['latitude'], place['longitude'], place['type'], source, now)
+                    for name, place in places.items()
+                ]
+            )
+
+    def stats(self):
+        conn = self._connection()
+        return {
+            "cities": conn.execute("SELECT COUNT(*) FROM cities").fetchone()[0],
+            "places": conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+        }
+
+
+@process_singleton
+def get_location_store():
+    """Process-wide location store shared by every generator and session"""
+    return LocationStore()
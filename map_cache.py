@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import MAP_CACHE_DIR, MAP_CACHE_DISK_MAX_BYTES, MAP_CACHE_DISK_TTL, MAP_CACHE_MAX_ENTRIES
+from singleton import process_singleton
+
+# Bump when map rendering changes so previously cached HTML is not served
+MAP_TEMPLATE_VERSION = 1
+
+
+class MapHtmlCache:
+    """Content-addressed cache of rendered map HTML.
+
+    Keys are a hash of everything that affects the output (center, locations,
+    style options), so a hit means no folium object has to be built at all.
+    An in-memory LRU sits in front of an optional on-disk tier that survives
+    restarts and is shared between processes. A file's mtime is its last use:
+    files unused for ``disk_ttl`` seconds are misses and are deleted. The
+    tier's size is kept as a running total, and once a write pushes it past
+    ``disk_max_bytes`` the least recently used files go. That prune re-counts
+    the directory, which also picks up what other processes wrote.
+    """
+
+    def __init__(self, max_entries=MAP_CACHE_MAX_ENTRIES, disk_dir=MAP_CACHE_DIR,
+                 disk_ttl=MAP_CACHE_DISK_TTL, disk_max_bytes=MAP_CACHE_DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir or None
+        self.disk_ttl = disk_ttl
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bytes in the disk tier, counted by the first write's prune and kept up to date after it
+        self._disk_bytes = None
+        self._disk_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(center, locations, **options):
+        payload = json.dumps(
+            [MAP_TEMPLATE_VERSION, center, locations, options],
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        html = self._read_disk(key)
+        with self._lock:
+            if html is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, html)
+        return html
+
+    def put(self, key, html):
+        with self._lock:
+            self._remember(key, html)
+        self._write_disk(key, html)
+
+    def get_or_render(self, key, render):
+        """Cached HTML for ``key``, calling ``render()`` to produce it on a miss"""
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.put(key, html)
+        return html
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_evictions": self.disk_evictions,
+                "entries": len(self._entries),
+                "bytes": sum(len(html) for html in self._entries.values())
+            }
+
+    def _remember(self, key, html):
+        self._entries[key] = html
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.html")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime > self.disk_ttl:
+                self._remove_disk(path, stat.st_size)
+                return None
+            with open(path, encoding="utf-8") as f:
+                html = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return html
+
+    def _write_disk(self, key, html):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        written = os.path.getsize(path)
+
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._prune_disk()
+                return
+            self._disk_bytes += written - replaced
+            if self._disk_bytes > self.disk_max_bytes:
+                self._disk_bytes = self._prune_disk()
+
+    def _remove_disk(self, path, size):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._disk_lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+        with self._lock:
+            self.disk_evictions += 1
+
+    def _prune_disk(self):
+        """Drop expired files, then the least recently used until the tier fits ``disk_max_bytes``; returns its size"""
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith(".html"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort()
+        size = sum(file_size for _, file_size, _ in files)
+        evicted = 0
+        for mtime, file_size, path in files:
+            if now - mtime <= self.disk_ttl and size <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except OSError:
+                pass
+            size -= file_size
+        if evicted:
+            with self._lock:
+                self.disk_evictions += evicted
+        return size
+
+
+@process_singleton
+def get_map_cache():
+    """Process-wide map cache shared by every Streamlit session"""
+    return MapHtmlCache()
@@ -1,40 +1,181 @@
+from collections import OrderedDict
+
 import folium
 from folium import plugins
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from jinja2 import Template
+
+from config import BULK_MARKER_THRESHOLD
+
+# Color mapping for different types
+COLOR_MAP = {
+    'restaurant': 'red',
+    'attraction': 'blue',
+    'hotel': 'green',
+    'shopping': 'purple',
+    'transport': 'orange'
+}
+
+# Route line colours, cycled by day
+ROUTE_COLORS = ['#1f77b4', '#d62728', '#2ca02c', '#9467bd', '#ff7f0e', '#8c564b', '#e377c2', '#17becf']
+
+# Default client-side marker factory: a lightweight circle marker per feature,
+# with the popup built from text nodes so place names are never parsed as HTML
+POINT_TO_LAYER = """
+function (feature, latlng) {
+    var props = feature.properties;
+    var marker = L.circleMarker(latlng, {
+        radius: 7, weight: 1, color: '#333', fillColor: props.color, fillOpacity: 0.85
+    });
+    marker.bindTooltip(function () {
+        var span = document.createElement('span');
+        span.textContent = props.name;
+        return span;
+    });
+    marker.bindPopup(function () {
+        var div = document.createElement('div');
+        var title = document.createElement('b');
+        title.textContent = props.name;
+        div.appendChild(title);
+        div.appendChild(document.createElement('br'));
+        div.appendChild(document.createTextNode('Type: ' + props.type));
+        return div;
+    });
+    return marker;
+}
+"""
+
+
+class GeoJsonMarkerCluster(JSCSSMixin, Layer):
+    """Marker cluster layer fed from a single GeoJSON FeatureCollection.
+
+    Unlike one folium.Marker per point, the points are serialized once as data
+    and turned into markers in the browser by ``callback`` (a Leaflet
+    ``pointToLayer`` function), so the HTML grows by one small feature per
+    point and clustering happens client-side.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.markerClusterGroup({{ this.options|tojson }});
+            {{ this.get_name() }}.addLayer(L.geoJSON(
+                {{ this.data|tojson }},
+                {pointToLayer: {{ this.callback }}}
+            ));
+        {% endmacro %}
+    """)
+
+    default_js = plugins.MarkerCluster.default_js
+    default_css = plugins.MarkerCluster.default_css
+
+    def __init__(self, data, callback=POINT_TO_LAYER, name=None, overlay=True, control=True, show=True, **options):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'GeoJsonMarkerCluster'
+        self.data = data
+        self.callback = callback.strip()
+        self.options = {'chunkedLoading': True, **options}
+
 
 class MapService:
-    def __init__(self):
-        pass
+    def __init__(self, bulk_threshold=BULK_MARKER_THRESHOLD):
+        # Above this many locations create_itinerary_map switches to the bulk renderer
+        self.bulk_threshold = bulk_threshold
     
-    def create_itinerary_map(self, city_center, locations):
+    def create_itinerary_map(self, city_center, locations, bulk=None, by_day=False, routes=None):
+        """Map of the locations; ``routes`` ({day: [Location, ...]} in visiting order) adds a line per day"""
+        if bulk is None:
+            bulk = by_day or len(locations) > self.bulk_threshold
+        if bulk:
+            m = self.create_bulk_map(city_center, locations, by_day=by_day)
+            self.add_routes(m, routes)
+            return m
+        
         # Create base map
         m = folium.Map(
-            location=[city_center['latitude'], city_center['longitude']],
+            location=[city_center.latitude, city_center.longitude],
             zoom_start=12,
             tiles='OpenStreetMap'
         )
         
-        # Color mapping for different types
-        color_map = {
-            'restaurant': 'red',
-            'attraction': 'blue',
-            'hotel': 'green',
-            'shopping': 'purple',
-            'transport': 'orange'
-        }
-        
         # Add markers for each location
         for i, location in enumerate(locations, 1):
-            color = color_map.get(location.get('type', 'attraction'), 'blue')
+            color = COLOR_MAP.get(location.type, 'blue')
             
             folium.Marker(
-                location=[location['latitude'], location['longitude']],
-                popup=folium.Popup(f"<b>{location['name']}</b><br>Type: {location.get('type', 'N/A')}", max_width=200),
-                tooltip=location['name'],
+                location=[location.latitude, location.longitude],
+                popup=folium.Popup(f"<b>{location.name}</b><br>Type: {location.type}", max_width=200),
+                tooltip=location.name,
                 icon=folium.Icon(color=color, icon='info-sign'),
                 number=i
             ).add_to(m)
         
-        # Add marker numbering plugin
-        plugins.MarkerCluster().add_to(m)
+        self.add_routes(m, routes)
+        return m
+    
+    @staticmethod
+    def add_routes(m, routes):
+        """Draw each day's route as a polyline through its stops in visiting order"""
+        for index, (day, stops) in enumerate(sorted((routes or {}).items())):
+            folium.PolyLine(
+                [[stop.latitude, stop.longitude] for stop in stops],
+                color=ROUTE_COLORS[index % len(ROUTE_COLORS)],
+                weight=3,
+                opacity=0.8,
+                tooltip=f"Day {day} route"
+            ).add_to(m)
+    
+    def create_bulk_map(self, city_center, locations, by_day=False, callback=POINT_TO_LAYER, **cluster_options):
+        """Render many locations as GeoJSON with client-side clustering.
+
+        Takes models.Location objects. With ``by_day`` they are split on ``day`` into one
+        toggleable cluster layer per day; locations without a day go into an
+        "Other places" layer.
+        """
+        m = folium.Map(
+            location=[city_center.latitude, city_center.longitude],
+            zoom_start=12,
+            tiles='OpenStreetMap',
+            prefer_canvas=True
+        )
+        
+        if by_day:
+            layers = OrderedDict()
+            for location in sorted(locations, key=lambda loc: (loc.day is None, loc.day or 0)):
+                layers.setdefault(f"Day {location.day}" if location.day is not None else "Other places", []).append(location)
+        else:
+            layers = {None: locations}
+        
+        for name, layer_locations in layers.items():
+            GeoJsonMarkerCluster(
+                self.to_feature_collection(layer_locations),
+                callback=callback,
+                name=name,
+                control=name is not None,
+                **cluster_options
+            ).add_to(m)
+        
+        if by_day:
+            folium.LayerControl(collapsed=False).add_to(m)
         
-        return m
\ No newline at end of file
+        return m
+    
+    @staticmethod
+    def to_feature_collection(locations):
+        features = []
+        for index, location in enumerate(locations, 1):
+            features.append({
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'Point',
+                    # GeoJSON is [longitude, latitude]
+                    'coordinates': [round(location.longitude, 6), round(location.latitude, 6)]
+                },
+                'properties': {
+                    'name': location.name,
+                    'type': location.type,
+                    'color': COLOR_MAP.get(location.type, 'blue'),
+                    'order': index
+                }
+            })
+        return {'type': 'FeatureCollection', 'features': features}
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""Latency, token and cache instrumentation for model calls and pipeline stages.
+
+Every Gemini call goes through ``Metrics.track_call`` and every scheduled
+stage through ``Metrics.time_stage``. Samples are aggregated into
+Prometheus-style counters and histograms (served as text by ``serve``) and,
+when METRICS_TRACE_PATH is set, appended one JSON object per line to a trace
+file for offline percentile dashboards.
+
+    curl localhost:9464/metrics
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_TRACE_PATH
+from singleton import process_singleton
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, float("inf"))
+
+# Recent samples kept per stage/template for in-process percentiles
+RECENT_SAMPLES = 500
+
+HELP = {
+    "gemini_calls_total": ("counter", "Model calls by template and outcome"),
+    "gemini_cache_hits_total": ("counter", "Calls answered from the response cache"),
+    "gemini_coalesced_total": ("counter", "Calls that joined an identical in-flight call"),
+    "gemini_retries_total": ("counter", "Rate-limit retries"),
+    "gemini_hedges_total": ("counter", "Duplicate requests sent for calls running past their hedge delay"),
+    "gemini_hedge_wins_total": ("counter", "Hedged calls answered by a duplicate request"),
+    "gemini_parse_failures_total": ("counter", "Responses that could not be parsed as JSON"),
+    "gemini_prompt_tokens_total": ("counter", "Prompt tokens reported by usage metadata"),
+    "gemini_response_tokens_total": ("counter", "Response tokens reported by usage metadata"),
+    "gemini_call_seconds": ("histogram", "Wall time of uncached model calls"),
+    "gemini_ttft_seconds": ("histogram", "Time to first token of uncached model calls"),
+    "pipeline_stage_seconds": ("histogram", "Wall time of pipeline stages"),
+    "pipeline_stage_failures_total": ("counter", "Pipeline stages that raised"),
+}
+
+
+def stage_kind(stage):
+    """Collapse per-day stage names (day_3, days_1_4) so label cardinality stays bounded"""
+    return re.sub(r"^(days?)_\d+(_\d+)?$", r"\1", stage)
+
+
+class CallRecord:
+    """Measurements for one model call, filled in while it runs"""
+
+    def __init__(self, template, model):
+        self.template = template
+        self.model = model
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.cache_hit = False
+        self.coalesced = False
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_won = False
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.parse_error = None
+        self.error = None
+
+    def first_token(self):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def retried(self, attempt=None, error=None):
+        self.retries += 1
+
+    def hedged(self):
+        self.hedges += 1
+
+    def usage(self, response):
+        """Take token counts from a response's (or final stream chunk's) usage metadata"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            self.prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+            self.response_tokens = getattr(usage, "candidates_token_count", 0) or 0
+
+    def parse_failed(self, error, response_text=""):
+        self.parse_error = f"{error}: {response_text[:200]}"
+
+
+class Metrics:
+    def __init__(self, trace_path=METRICS_TRACE_PATH):
+        self.trace_path = trace_path or None
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._recent = defaultdict(lambda: deque(maxlen=RECENT_SAMPLES))
+        self._trace_file = None
+
+    def track_call(self, template, model=""):
+        return _CallContext(self, CallRecord(template, model))
+
+    def record_call(self, call):
+        wall = time.perf_counter() - call.started
+        labels = (("template", call.template),)
+        with self._lock:
+            if call.cache_hit:
+                self._counters[("gemini_cache_hits_total", labels)] += 1
+            elif call.coalesced:
+                self._counters[("gemini_coalesced_total", labels)] += 1
+            else:
+                outcome = "error" if call.error else "parse_error" if call.parse_error else "ok"
+                self._counters[("gemini_calls_total", labels + (("outcome", outcome),))] += 1
+                self._counters[("gemini_retries_total", labels)] += call.retries
+                self._counters[("gemini_hedges_total", labels)] += call.hedges
+                self._counters[("gemini_hedge_wins_total", labels)] += call.hedge_won
+                self._counters[("gemini_prompt_tokens_total", labels)] += call.prompt_tokens
+                self._counters[("gemini_response_tokens_total", labels)] += call.response_tokens
+                if call.parse_error:
+                    self._counters[("gemini_parse_failures_total", labels)] += 1
+                self._observe("gemini_call_seconds", labels, wall)
+                self._observe("gemini_ttft_seconds", labels, call.ttft if call.ttft is not None else wall)
+                self._recent[("call", call.template)].append(wall)
+        self._trace({
+            "kind": "call",
+            "template": call.template,
+            "model": call.model,
+            "wall": round(wall, 4),
+            "ttft": None if call.ttft is None else round(call.ttft, 4),
+            "cache_hit": call.cache_hit,
+            "coalesced": call.coalesced,
+            "retries": call.retries,
+            "hedges": call.hedges,
+            "hedge_won": call.hedge_won,
+            "prompt_tokens": call.prompt_tokens,
+            "response_tokens": call.response_tokens,
+            "parse_error": call.parse_error,
+            "error": call.error
+        })
+
+    def record_stage(self, stage, seconds, error=None):
+        labels = (("stage", stage_kind(stage)),)
+        with self._lock:
+            self._observe("pipeline_stage_seconds", labels, seconds)
+            if error:
+                self._counters[("pipeline_stage_failures_total", labels)] += 1
+            self._recent[("stage", stage_kind(stage))].append(seconds)
+        self._trace({"kind": "stage", "stage": stage, "wall": round(seconds, 4), "error": error})
+
+    @contextmanager
+    def time_stage(self, stage):
+        """Record the wall time of the enclosed block as a pipeline stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_stage(stage, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+            raise
+        self.record_stage(stage, time.perf_counter() - start)
+
+    def quantile(self, kind, name, q, min_samples=1):
+        """q-quantile of recent wall times for a stage or call template, or None with fewer than min_samples"""
+        with self._lock:
+            samples = sorted(self._recent.get((kind, name), ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(counts), total, count) for key, (counts, total, count) in self._histograms.items()}
+        for name, (kind, help_text) in HELP.items():
+            series = [(labels, value) for (metric, labels), value in counters.items() if metric == name]
+            hist = [(labels, data) for (metric, labels), data in histograms.items() if metric == name]
+            if not series and not hist:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series):
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+            for labels, (counts, total, count) in sorted(hist):
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS, counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """Serve render_prometheus() at http://host:port/metrics from a daemon thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+        return server
+
+    def _observe(self, name, labels, value):
+        counts, total, count = self._histograms.get((name, labels), ([0] * len(BUCKETS), 0.0, 0))
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                counts[index] += 1
+                break
+        self._histograms[(name, labels)] = (counts, total + value, count + 1)
+
+    def _trace(self, event):
+        if not self.trace_path:
+            return
+        event = {"ts": round(time.time(), 3), "pid": os.getpid(), **event}
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._trace_file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+                # Line-buffered append, so processes sharing the file interleave whole lines
+                self._trace_file = open(self.trace_path, "a", encoding="utf-8", buffering=1)
+            self._trace_file.write(line)
+
+
+class _CallContext:
+    def __init__(self, metrics, call):
+        self.metrics = metrics
+        self.call = call
+
+    def __enter__(self):
+        return self.call
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.call.error = f"{exc_type.__name__}: {exc}"
+        self.metrics.record_call(self.call)
+        return False
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}" if labels else ""
+
+
+@process_singleton
+def get_metrics():
+    """Process-wide metrics registry shared by every service, session and stage"""
+    return Metrics()
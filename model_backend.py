@@ -0,0 +1,255 @@
+"""Model backends: the real Gemini client or a deterministic local fake.
+
+Both expose the subset of ``genai.GenerativeModel`` the app uses:
+``generate_content(prompt, generation_config=..., stream=..., request_options=...)``
+and ``generate_content_async``, returning objects with ``.text`` and
+``.usage_metadata`` (streams iterate chunks with ``.text``).
+
+Set MODEL_BACKEND=fake to run the whole app, the batch CLI and the benchmarks
+without an API key. The fake builds a schema-shaped response from the prompt
+(same prompt, same response) after a configurable latency with jitter, and
+fails a configurable fraction of calls with a quota error. FAKE_TAIL_RATE
+of calls take FAKE_TAIL_FACTOR times as long, for measuring tail latency,
+and the fast model tier answers in FAKE_FAST_LATENCY_SCALE of the time.
+
+model_for(template) is the tiering policy: cheap templates (FAST_TEMPLATES,
+the trip summary and geocoding by default) go to FAST_MODEL, the day plans
+and dining to QUALITY_MODEL.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import typing
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from typing_extensions import is_typeddict
+
+from config import (
+    FAKE_FAILURE_RATE,
+    FAKE_FAST_LATENCY_SCALE,
+    FAKE_JITTER,
+    FAKE_LATENCY,
+    FAKE_SEED,
+    FAKE_TAIL_FACTOR,
+    FAKE_TAIL_RATE,
+    FAST_MODEL,
+    FAST_TEMPLATES,
+    GEMINI_API_KEY,
+    MODEL_BACKEND,
+    QUALITY_MODEL,
+)
+from gazetteer import get_gazetteer
+
+# How many items the fake puts in each list field
+LIST_SIZES = {"activities": 4, "meals": 3, "restaurants": 8, "days": 1}
+
+ACTIVITY_TIMES = ["8:00 AM", "10:30 AM", "2:00 PM", "5:00 PM", "7:30 PM", "9:00 PM"]
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "snack"]
+
+_CITY_PATTERNS = [
+    re.compile(r"trip to ([^,.\n]+?) (?:on|with)\b"),
+    re.compile(r"local travel guide for ([^,.\n]+)\."),
+    re.compile(r"familiar with ([^,.\n]+)\."),
+    re.compile(r"places to eat in ([^,.\n]+?) within\b"),
+    re.compile(r"For the city ([^,\n]+),"),
+]
+
+
+def model_for(template):
+    """Model a prompt template is sent to"""
+    return FAST_MODEL if template in FAST_TEMPLATES else QUALITY_MODEL
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend(model_name):
+    """The configured backend for ``model_name``, shared by every caller in the process"""
+    if MODEL_BACKEND == "fake":
+        scale = FAKE_FAST_LATENCY_SCALE if model_name == FAST_MODEL else 1.0
+        return FakeBackend(latency=FAKE_LATENCY * scale, jitter=FAKE_JITTER * scale)
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(model_name)
+
+
+class FakeUsage:
+    def __init__(self, prompt, text):
+        self.prompt_token_count = max(1, len(prompt) // 4)
+        self.candidates_token_count = max(1, len(text) // 4)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeStream:
+    """Iterates response chunks, sleeping between them like a streamed call"""
+
+    def __init__(self, chunks, delay, usage_metadata):
+        self._chunks = chunks
+        self._delay = delay
+        self.usage_metadata = usage_metadata
+        self.text = "".join(chunks)
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield FakeResponse(chunk)
+
+
+class FakeBackend:
+    """Deterministic stand-in for Gemini with configurable latency, jitter, slow tail and failures.
+
+    Latency and failures are drawn from a seeded RNG, so a run with the same
+    call order behaves the same every time; response content depends only on
+    the prompt and response schema.
+    """
+
+    def __init__(self, latency=FAKE_LATENCY, jitter=FAKE_JITTER, failure_rate=FAKE_FAILURE_RATE,
+                 seed=FAKE_SEED, chunk_size=80, ttft_fraction=0.3, tail_rate=FAKE_TAIL_RATE,
+                 tail_factor=FAKE_TAIL_FACTOR):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_factor = tail_factor
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.ttft_fraction = ttft_fraction
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        delay, fail = self._draw()
+        text = self.response_text(prompt, generation_config)
+        usage = FakeUsage(prompt, text)
+        if stream:
+            # First token after part of the latency, the rest spread over the chunks
+            time.sleep(delay * self.ttft_fraction)
+            self._maybe_fail(fail)
+            chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+            return FakeStream(chunks, delay * (1 - self.ttft_fraction) / max(1, len(chunks)), usage)
+        time.sleep(delay)
+        self._maybe_fail(fail)
+        return FakeResponse(text, usage)
+
+    async def generate_content_async(self, prompt, generation_config=None, request_options=None):
+        delay, fail = self._draw()
+        await asyncio.sleep(delay)
+        self._maybe_fail(fail)
+        text = self.response_text(prompt, generation_config)
+        return FakeResponse(text, FakeUsage(prompt, text))
+
+    def response_text(self, prompt, generation_config=None):
+        schema = getattr(generation_config, "response_schema", None)
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        builder = _DocumentBuilder(prompt, random.Random(digest))
+        document = builder.build(schema) if schema is not None else {"text": "ok"}
+        return json.dumps(document)
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            if self.tail_rate and self._rng.random() < self.tail_rate:
+                delay *= self.tail_factor
+            fail = self._rng.random() < self.failure_rate
+        return delay, fail
+
+    @staticmethod
+    def _maybe_fail(fail):
+        if fail:
+            raise google_exceptions.ResourceExhausted("Quota exceeded for fake backend. Please retry in 0.1s.")
+
+
+class _DocumentBuilder:
+    """Fills a response-schema TypedDict with plausible values for a prompt"""
+
+    def __init__(self, prompt, rng):
+        self.prompt = prompt
+        self.rng = rng
+        self.city = self._city()
+        place = get_gazetteer().lookup_city(self.city)
+        self.center = (place["latitude"], place["longitude"]) if place else (27.4924, 77.6737)
+        landmarks = get_gazetteer().nearby(*self.center, radius_km=25, feature_classes=("S", "L", "T")) if place else []
+        self.landmarks = [landmark["name"] for landmark in landmarks] or [f"{self.city} Landmark {i}" for i in range(1, 7)]
+        self.days = [int(day) for day in re.findall(r"\bday (\d+)\b", prompt)]
+        batch = re.search(r"days (\d+) to (\d+)", prompt)
+        if batch:
+            self.days = list(range(int(batch.group(1)), int(batch.group(2)) + 1))
+        locations = re.search(r"these locations: (.*)", prompt)
+        self.locations = [name.strip() for name in locations.group(1).split(";") if name.strip()] if locations else []
+
+    def build(self, schema, index=0):
+        hints = typing.get_type_hints(schema)
+        document = {}
+        for field, hint in hints.items():
+            if field == "day":
+                document[field] = self.days[index] if index < len(self.days) else index + 1
+            elif field == "locations" and self.locations:
+                document[field] = [self._location(name) for name in self.locations]
+            elif field == "city_center":
+                document[field] = {"latitude": self.center[0], "longitude": self.center[1]}
+            else:
+                document[field] = self._value(field, hint, index)
+        return document
+
+    def _value(self, field, hint, index):
+        if is_typeddict(hint):
+            return self.build(hint)
+        if typing.get_origin(hint) is list:
+            (item,) = typing.get_args(hint)
+            count = len(self.days) if field == "days" and self.days else LIST_SIZES.get(field, 3)
+            if is_typeddict(item):
+                return [self.build(item, i) for i in range(count)]
+            return [f"{field.replace('_', ' ').capitalize()} {i + 1} in {self.city}" for i in range(count)]
+        if hint is float:
+            return round(self.rng.uniform(-0.05, 0.05), 5)
+        if hint is int:
+            return index
+        return self._string(field, index)
+
+    def _string(self, field, index):
+        rng = self.rng
+        if field in ("cost", "total_cost", "cost_per_person") or field in ("accommodation", "food", "activities", "transport"):
+            low = rng.randint(5, 60)
+            return f"${low}-{low + rng.randint(5, 40)}"
+        if field == "time":
+            return ACTIVITY_TIMES[index % len(ACTIVITY_TIMES)]
+        if field in ("location", "activity", "restaurant"):
+            return self.landmarks[(index + rng.randrange(len(self.landmarks))) % len(self.landmarks)]
+        if field == "meal_type":
+            return MEAL_TYPES[index % len(MEAL_TYPES)]
+        if field == "price_range":
+            return rng.choice(["$", "$", "$$", "$$$"])
+        if field == "duration":
+            return rng.choice(["1 hour", "1.5 hours", "2 hours", "3 hours"])
+        if field == "city":
+            return self.city
+        if field == "type":
+            return "attraction"
+        return f"Sample {field.replace('_', ' ')} for {self.city}"
+
+    def _location(self, name):
+        lat, lon = self.center
+        return {
+            "name": name,
+            "latitude": round(lat + self.rng.uniform(-0.05, 0.05), 5),
+            "longitude": round(lon + self.rng.uniform(-0.05, 0.05), 5),
+            "type": "attraction"
+        }
+
+    def _city(self):
+        for pattern in _CITY_PATTERNS:
+            match = pattern.search(self.prompt)
+            if match:
+                return match.group(1).strip()
+        return "Mathura"
@@ -0,0 +1,296 @@
+"""Typed itinerary model built once from the parsed stage responses.
+
+Stage results stay plain dicts while they move through the response cache and
+job queue (both store JSON); once a trip's stages are in, Trip.from_stages
+builds these slotted dataclasses, which is what the session store, the map and
+display_results work with. Missing fields are already filled by
+json_extract.apply_defaults, so every attribute is always present and costs
+and times are parsed here once instead of in every consumer.
+
+dumps/loads store only the fields the model returned, as positional arrays
+(msgpack when installed, compact JSON otherwise); parsed values are rebuilt
+on load.
+"""
+import json
+import re
+from dataclasses import dataclass, field, fields
+from functools import cache
+
+try:
+    import msgpack
+except ImportError:  # Optional: compact JSON is used instead
+    msgpack = None
+
+# Bump when a model's fields change so stored trips in the old layout are rejected
+FORMAT_VERSION = 2
+
+_NUMBER = re.compile(r"\d+(?:,\d{3})*(?:\.\d+)?")
+_FREE = re.compile(r"\bfree\b", re.IGNORECASE)
+_CLOCK = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*([AaPp])\.?\s*[Mm]\b|\b(\d{1,2}):(\d{2})\b")
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hours?|m|min|mins|minutes?)\b", re.IGNORECASE)
+
+
+def _text(value):
+    """``value`` as a string for parsing or display; None (a field the model left null) is empty"""
+    return "" if value is None else str(value)
+
+
+def parse_cost_range(text):
+    """(low, high) amounts in a cost like "$12-20", "₹500", "Free" or 15; (None, None) if there are none"""
+    text = _text(text)
+    amounts = [float(number.replace(",", "")) for number in _NUMBER.findall(text)]
+    if not amounts:
+        return (0.0, 0.0) if _FREE.search(text) else (None, None)
+    return min(amounts[:2]), max(amounts[:2])
+
+
+def parse_time(text):
+    """Minutes after midnight of the first clock time in text ("2:30 PM", "Lunch (12 PM)", "14:00"), or None"""
+    match = _CLOCK.search(_text(text))
+    if not match:
+        return None
+    if match.group(4) is not None:
+        hour, minute = int(match.group(4)), int(match.group(5))
+    else:
+        hour, minute = int(match.group(1)) % 12, int(match.group(2) or 0)
+        if match.group(3) in "Pp":
+            hour += 12
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def parse_duration(text):
+    """Minutes in a duration like "2 hours", "1.5 hrs" or "45 min", or None"""
+    total = None
+    for amount, unit in _DURATION.findall(_text(text)):
+        minutes = float(amount) * (60 if unit[0].lower() == "h" else 1)
+        total = (total or 0) + minutes
+    return None if total is None else round(total)
+
+
+@cache
+def _stored_fields(cls):
+    return tuple(f.name for f in fields(cls) if f.init)
+
+
+class _Model:
+    """Conversion between a slotted dataclass and response dicts / positional arrays.
+
+    Subclasses declare fields holding a list of models in ``_NESTED`` and
+    fields holding a single (optional) model in ``_NESTED_ONE``; fields with
+    ``init=False`` are derived in ``__post_init__`` and never stored.
+    """
+    __slots__ = ()
+    _NESTED = {}
+    _NESTED_ONE = {}
+
+    @classmethod
+    def _stored_fields(cls):
+        return _stored_fields(cls)
+
+    @classmethod
+    def from_dict(cls, data):
+        values = {}
+        for name in cls._stored_fields():
+            if name not in data:
+                continue
+            value = data[name]
+            if name in cls._NESTED:
+                value = [cls._NESTED[name].from_dict(item) for item in value or [] if isinstance(item, dict)]
+            elif name in cls._NESTED_ONE:
+                value = cls._NESTED_ONE[name].from_dict(value) if isinstance(value, dict) else None
+            values[name] = value
+        return cls(**values)
+
+    def to_dict(self):
+        data = {}
+        for name in self._stored_fields():
+            value = getattr(self, name)
+            if name in self._NESTED:
+                value = [item.to_dict() for item in value]
+            elif name in self._NESTED_ONE and value is not None:
+                value = value.to_dict()
+            data[name] = value
+        return data
+
+    def to_compact(self):
+        row = []
+        for name in self._stored_fields():
+            value = getattr(self, name)
+            if name in self._NESTED:
+                value = [item.to_compact() for item in value]
+            elif name in self._NESTED_ONE and value is not None:
+                value = value.to_compact()
+            row.append(value)
+        return row
+
+    @classmethod
+    def from_compact(cls, row):
+        values = []
+        for name, value in zip(cls._stored_fields(), row):
+            if name in cls._NESTED:
+                value = [cls._NESTED[name].from_compact(item) for item in value]
+            elif name in cls._NESTED_ONE and value is not None:
+                value = cls._NESTED_ONE[name].from_compact(value)
+            values.append(value)
+        return cls(*values)
+
+
+@dataclass(slots=True)
+class Activity(_Model):
+    time: str = ""
+    activity: str = ""
+    location: str = ""
+    duration: str = ""
+    cost: str = ""
+    description: str = ""
+    start_minutes: int | None = field(default=None, init=False)
+    duration_minutes: int | None = field(default=None, init=False)
+    cost_low: float | None = field(default=None, init=False)
+    cost_high: float | None = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.start_minutes = parse_time(self.time)
+        self.duration_minutes = parse_duration(self.duration)
+        self.cost_low, self.cost_high = parse_cost_range(self.cost)
+
+
+@dataclass(slots=True)
+class Meal(_Model):
+    time: str = ""
+    restaurant: str = ""
+    dish: str = ""
+    cost: str = ""
+    start_minutes: int | None = field(default=None, init=False)
+    cost_low: float | None = field(default=None, init=False)
+    cost_high: float | None = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.start_minutes = parse_time(self.time)
+        self.cost_low, self.cost_high = parse_cost_range(self.cost)
+
+
+@dataclass(slots=True)
+class DayPlan(_Model):
+    day: int = 0
+    theme: str = ""
+    activities: list = field(default_factory=list)
+    meals: list = field(default_factory=list)
+    transportation: str = ""
+    total_cost: str = ""
+    cost_low: float | None = field(default=None, init=False)
+    cost_high: float | None = field(default=None, init=False)
+
+    _NESTED = {"activities": Activity, "meals": Meal}
+
+    def __post_init__(self):
+        self.cost_low, self.cost_high = parse_cost_range(self.total_cost)
+
+
+@dataclass(slots=True)
+class Restaurant(_Model):
+    name: str = ""
+    cuisine: str = ""
+    price_range: str = ""
+    location: str = ""
+    specialty: str = ""
+    meal_type: str = ""
+    cost_per_person: str = ""
+    cost_low: float | None = field(default=None, init=False)
+    cost_high: float | None = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.meal_type = _text(self.meal_type).strip().lower()
+        self.cost_low, self.cost_high = parse_cost_range(self.cost_per_person)
+
+
+@dataclass(slots=True)
+class Location(_Model):
+    name: str = ""
+    latitude: float = 0.0
+    longitude: float = 0.0
+    type: str = "attraction"
+    # Itinerary day the place is visited on; None for places not tied to a day
+    day: int | None = None
+
+
+@dataclass(slots=True)
+class Trip(_Model):
+    city: str = ""
+    budget: float = 0.0
+    duration: int = 0
+    overview: str = ""
+    best_time: str = ""
+    currency: str = ""
+    highlights: list = field(default_factory=list)
+    budget_breakdown: dict = field(default_factory=dict)
+    days: list = field(default_factory=list)
+    restaurants: list = field(default_factory=list)
+    food_districts: list = field(default_factory=list)
+    local_tips: list = field(default_factory=list)
+    must_try: list = field(default_factory=list)
+    city_center: Location | None = None
+    locations: list = field(default_factory=list)
+    # Stages ("summary", "day_3", "dining", "map_data") that failed or ran out of time and are missing from the trip
+    failed_stages: list = field(default_factory=list)
+
+    _NESTED = {"days": DayPlan, "restaurants": Restaurant, "locations": Location}
+    _NESTED_ONE = {"city_center": Location}
+
+    @classmethod
+    def from_stages(cls, city, budget, days, summary, daily_itineraries, dining, map_data=None):
+        """Build a trip from the stage results.
+
+        Failed stages (dicts with "error") contribute nothing and are listed in
+        ``failed_stages`` so the page can say what is missing and offer a retry.
+        """
+        failed = [name for name, result in (("summary", summary), ("dining", dining), ("map_data", map_data or {}))
+                  if "error" in result]
+        summary = summary if "error" not in summary else {}
+        dining = dining if "error" not in dining else {}
+        map_data = map_data if map_data and "error" not in map_data else {}
+        day_plans = []
+        for number, daily in enumerate(daily_itineraries, 1):
+            if "error" in daily:
+                failed.append(f"day_{number}")
+                continue
+            plan = DayPlan.from_dict(daily)
+            # A day the model didn't number is the one it was asked for
+            plan.day = plan.day or number
+            day_plans.append(plan)
+        center = map_data.get("city_center")
+        return cls(
+            city=city,
+            budget=float(budget),
+            duration=int(days),
+            overview=summary.get("overview", ""),
+            best_time=summary.get("best_time", ""),
+            currency=summary.get("currency", ""),
+            highlights=list(summary.get("highlights") or []),
+            budget_breakdown=dict(summary.get("budget_breakdown") or {}),
+            days=day_plans,
+            restaurants=[Restaurant.from_dict(r) for r in dining.get("restaurants") or [] if isinstance(r, dict)],
+            food_districts=list(dining.get("food_districts") or []),
+            local_tips=list(dining.get("local_tips") or []),
+            must_try=list(dining.get("must_try") or []),
+            city_center=Location.from_dict(dict(center, name=city)) if center else None,
+            locations=[Location.from_dict(loc) for loc in map_data.get("locations") or [] if isinstance(loc, dict)],
+            failed_stages=failed
+        )
+
+    def dumps(self, use_msgpack=None):
+        """Compact serialized form: msgpack when available (or requested), JSON otherwise"""
+        row = [FORMAT_VERSION, self.to_compact()]
+        if use_msgpack if use_msgpack is not None else msgpack is not None:
+            return msgpack.packb(row, use_bin_type=True)
+        return json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def loads(cls, data):
+        # A JSON array always starts with "[", a msgpack array never does
+        row = json.loads(data) if data[:1] == b"[" else msgpack.unpackb(data, raw=False)
+        version, trip = row
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Stored trip has format version {version}, expected {FORMAT_VERSION}")
+        return cls.from_compact(trip)
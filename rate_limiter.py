@@ -0,0 +1,220 @@
+import asyncio
+import os
+import random
+import re
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: limiter is shared across threads only
+    fcntl = None
+
+from google.api_core import exceptions as google_exceptions
+
+from config import (
+    GEMINI_MAX_RETRIES,
+    GEMINI_RATE_BURST,
+    GEMINI_RPM,
+    RATE_LIMIT_STATE_PATH,
+)
+from singleton import process_singleton
+
+# tokens, last refill time, current rate (requests/s), cooldown deadline
+STATE = struct.Struct("<dddd")
+
+_RETRY_AFTER_PATTERNS = [
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry[- ]after:?\s*(\d+(?:\.\d+)?)", re.IGNORECASE),
+]
+
+
+def is_rate_limit_error(error):
+    if isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)):
+        return True
+    return getattr(error, "code", None) == 429 or "quota" in str(error).lower()
+
+
+def retry_after_seconds(error):
+    """Server-suggested wait from a 429 error, if it carries one"""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and (delay.seconds or delay.nanos):
+            return delay.seconds + delay.nanos / 1e9
+    message = str(error)
+    for pattern in _RETRY_AFTER_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class AdaptiveRateLimiter:
+    """Token bucket shared by every thread and worker process on the machine.
+
+    The bucket state lives in a small file guarded by flock, so all processes
+    using the same ``state_path`` draw from one quota. The refill rate starts
+    at ``requests_per_minute``; each 429 halves it and pauses everyone for the
+    server's retry-after (if given), and each success adds back a little, so
+    throughput converges on the real quota instead of staying below it.
+    """
+
+    def __init__(self, requests_per_minute=GEMINI_RPM, burst=GEMINI_RATE_BURST,
+                 state_path=RATE_LIMIT_STATE_PATH, max_retries=GEMINI_MAX_RETRIES,
+                 base_delay=1.0, max_delay=60.0):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = self.max_rate / 20
+        self.burst = max(1.0, float(burst))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limited = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        self._memory_state = None
+        self._fd = None
+        if fcntl is not None and state_path:
+            os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+            self._fd = os.open(state_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def call(self, func, *args, on_retry=None, **kwargs):
+        """Call ``func`` under the limiter, retrying rate-limit errors with backoff.
+
+        ``on_retry(attempt, error)`` is called before each retry.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                delay = self._handle_error(e, attempt)
+                if on_retry:
+                    on_retry(attempt, e)
+                time.sleep(delay)
+                continue
+            self.on_success()
+            return result
+
+    async def call_async(self, func, *args, on_retry=None, **kwargs):
+        """Await ``func(*args, **kwargs)`` under the limiter, retrying rate-limit errors"""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._handle_error(e, attempt)
+                if on_retry:
+                    on_retry(attempt, e)
+                await asyncio.sleep(delay)
+                continue
+            self.on_success()
+            return result
+
+    def on_success(self):
+        with self._state() as state:
+            # Additive increase back towards the configured quota
+            state[2] = min(self.max_rate, state[2] + self.max_rate * 0.02)
+
+    def on_rate_limited(self, retry_after=None):
+        self.rate_limited += 1
+        now = time.time()
+        with self._state() as state:
+            # Multiplicative decrease, and drain the bucket so nobody bursts into the wall
+            state[0] = 0.0
+            state[2] = max(self.min_rate, state[2] * 0.5)
+            if retry_after:
+                state[3] = max(state[3], now + retry_after)
+
+    def current_rate(self):
+        """Current shared refill rate in requests per minute"""
+        with self._state() as state:
+            return state[2] * 60
+
+    def _handle_error(self, error, attempt):
+        """Return the backoff delay for a retryable error, or re-raise"""
+        if not is_rate_limit_error(error) or attempt >= self.max_retries:
+            raise error
+        retry_after = retry_after_seconds(error)
+        self.on_rate_limited(retry_after)
+        self.retries += 1
+        # Exponential backoff with full jitter, but never sooner than the server asked
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, retry_after or 0)
+
+    def _reserve(self):
+        """Take a token if one is available; otherwise return how long to wait"""
+        now = time.time()
+        with self._state() as state:
+            tokens, updated, rate, cooldown_until = state
+            if now < cooldown_until:
+                return cooldown_until - now
+            tokens = min(self.burst, tokens + (now - updated) * rate)
+            state[1] = now
+            if tokens >= 1:
+                state[0] = tokens - 1
+                return 0
+            state[0] = tokens
+            return (1 - tokens) / rate
+
+    def _state(self):
+        return _LockedState(self)
+
+
+class _LockedState:
+    """Read-modify-write of the shared bucket state under thread and file locks"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.state = None
+
+    def __enter__(self):
+        limiter = self.limiter
+        limiter._lock.acquire()
+        if limiter._fd is None:
+            if limiter._memory_state is None:
+                limiter._memory_state = [limiter.burst, time.time(), limiter.max_rate, 0.0]
+            self.state = limiter._memory_state
+            return self.state
+
+        fcntl.flock(limiter._fd, fcntl.LOCK_EX)
+        raw = os.pread(limiter._fd, STATE.size, 0)
+        if len(raw) == STATE.size:
+            self.state = list(STATE.unpack(raw))
+            # A lowered quota in config takes effect immediately
+            self.state[2] = min(self.state[2], limiter.max_rate) or limiter.max_rate
+        else:
+            self.state = [limiter.burst, time.time(), limiter.max_rate, 0.0]
+        return self.state
+
+    def __exit__(self, exc_type, exc, tb):
+        limiter = self.limiter
+        try:
+            if limiter._fd is not None:
+                os.pwrite(limiter._fd, STATE.pack(*self.state), 0)
+                fcntl.flock(limiter._fd, fcntl.LOCK_UN)
+        finally:
+            limiter._lock.release()
+        return False
+
+
+@process_singleton
+def get_rate_limiter():
+    """Process-wide limiter; processes coordinate through RATE_LIMIT_STATE_PATH"""
+    return AdaptiveRateLimiter()
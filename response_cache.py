@@ -0,0 +1,153 @@
+import hashlib
+import json
+import time
+
+from config import (
+    BUDGET_BUCKETS,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_TTL,
+)
+from singleton import process_singleton
+from sqlite_util import SQLiteStore
+
+
+def normalize_args(value):
+    """Canonical form of prompt arguments so equivalent requests share a key"""
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        value = round(float(value), 2)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, dict):
+        return {str(k): normalize_args(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize_args(v) for v in value]
+    return str(value)
+
+
+def budget_bucket(daily_budget, buckets=BUDGET_BUCKETS):
+    """Lower bound of the per-day budget tier a daily budget falls in.
+
+    Stage prompts and cache keys use the tier instead of the exact amount, so
+    a trip made a day longer or a little cheaper reuses the stages it already has.
+    """
+    return max((bucket for bucket in buckets if bucket <= daily_budget), default=min(buckets))
+
+
+def budget_bucket_label(bucket, buckets=BUDGET_BUCKETS):
+    """Human readable range of a tier, e.g. $100-200 or $800+"""
+    higher = [b for b in buckets if b > bucket]
+    return f"${bucket}-{min(higher)}" if higher else f"${bucket}+"
+
+
+class ResponseCache(SQLiteStore):
+    """SQLite-backed cache of parsed model responses.
+
+    Entries expire after ``ttl`` seconds and the least recently used ones are
+    evicted once the cache holds more than ``max_entries`` rows or
+    ``max_bytes`` of payload. Hit/miss counters are stored in the database so
+    every process and Streamlit session sharing the file sees the same totals.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL,
+                 max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @staticmethod
+    def make_key(model_name, template, template_version, args):
+        payload = json.dumps(
+            [model_name, template, template_version, normalize_args(args)],
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self._bump(conn, "misses")
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._bump(conn, "hits")
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        payload = json.dumps(value, separators=(",", ":"))
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now)
+            )
+            self._evict(conn, now)
+
+    def stats(self):
+        with self._connection() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "entries": entries,
+            "bytes": size
+        }
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM counters")
+
+    def _evict(self, conn, now):
+        evicted = conn.execute("DELETE FROM entries WHERE created_at <= ?", (now - self.ttl,)).rowcount
+
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if entries > self.max_entries or size > self.max_bytes:
+            # Walk from least recently used until both limits are satisfied
+            to_delete = []
+            for key, row_size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                if entries <= self.max_entries and size <= self.max_bytes:
+                    break
+                to_delete.append((key,))
+                entries -= 1
+                size -= row_size
+            conn.executemany("DELETE FROM entries WHERE key = ?", to_delete)
+            evicted += len(to_delete)
+
+        if evicted:
+            self._bump(conn, "evictions", evicted)
+
+    def _bump(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+
+@process_singleton
+def get_response_cache():
+    """Process-wide cache instance shared by every service and session"""
+    return ResponseCache()
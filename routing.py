@@ -0,0 +1,212 @@
+"""Local route ordering for each day's activities, without a model call.
+
+Distances come from a NumPy haversine matrix over every geocoded place of a
+trip, computed once per trip; travel time assumes ROUTE_SPEED_KMH door to
+door. Each day's stops are ordered nearest-neighbour first and then improved
+with 2-opt, whose move deltas are evaluated for a whole row of the matrix at
+once. A stop's time window is its planned start ± ROUTE_TIME_SLACK minutes;
+an ordering that starts any stop later than its window allows only replaces
+one that is later still.
+"""
+import math
+
+import numpy as np
+
+from config import ROUTE_DEFAULT_DURATION, ROUTE_SPEED_KMH, ROUTE_TIME_SLACK
+from gazetteer import EARTH_RADIUS_KM, normalize_name
+
+
+def distance_matrix(latitudes, longitudes):
+    """Great-circle distances in km between every pair of points"""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    a = (np.sin((lat[:, None] - lat[None, :]) / 2) ** 2
+         + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin((lon[:, None] - lon[None, :]) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def travel_minutes(distances, speed_kmh=ROUTE_SPEED_KMH):
+    """Travel time in minutes for distances in km"""
+    return distances * (60.0 / speed_kmh)
+
+
+def route_length(distances, order):
+    """Total km of visiting the stops in ``order``"""
+    order = np.asarray(order, dtype=int)
+    return float(distances[order[:-1], order[1:]].sum()) if len(order) > 1 else 0.0
+
+
+def schedule(order, travel, opens, closes, durations, start):
+    """(start minute of each stop in ``order``, total minutes stops start past their window)"""
+    begins = []
+    lateness = 0.0
+    clock = start
+    previous = None
+    for stop in order:
+        if previous is not None:
+            clock += travel[previous, stop]
+        clock = max(clock, opens[stop])
+        lateness += max(0.0, clock - closes[stop])
+        begins.append(clock)
+        clock += durations[stop]
+        previous = stop
+    return begins, lateness
+
+
+def order_stops(distances, opens=None, closes=None, durations=None, start=None, speed_kmh=ROUTE_SPEED_KMH):
+    """Visiting order (indices into ``distances``) of a short open route through every stop.
+
+    ``opens``/``closes`` are each stop's time window in minutes after midnight
+    (-inf/inf where there is none), ``durations`` the minutes spent at each
+    stop and ``start`` the minute the day begins.
+    """
+    count = len(distances)
+    if count < 3 and opens is None:
+        return list(range(count))
+    opens = np.full(count, -np.inf) if opens is None else np.asarray(opens, dtype=float)
+    closes = np.full(count, np.inf) if closes is None else np.asarray(closes, dtype=float)
+    durations = np.zeros(count) if durations is None else np.asarray(durations, dtype=float)
+    timed = bool(np.isfinite(closes).any())
+    travel = travel_minutes(distances, speed_kmh)
+    if start is None:
+        start = float(opens[np.isfinite(opens)].min()) if np.isfinite(opens).any() else 0.0
+
+    route = _nearest_neighbour(distances, travel, opens, closes, durations, start)
+    if count < 3:
+        return route
+
+    # Dummy node at both ends, zero km from everything, so 2-opt can also move the route's endpoints
+    padded = np.zeros((count + 1, count + 1))
+    padded[:count, :count] = distances
+    path = np.array([count, *route, count])
+    lateness = schedule(route, travel, opens, closes, durations, start)[1] if timed else 0.0
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(path) - 3):
+            js = np.arange(i + 2, len(path) - 1)
+            # Gain of reversing path[i+1..j]: edges (i, i+1) and (j, j+1) become (i, j) and (i+1, j+1)
+            deltas = (padded[path[i], path[js]] + padded[path[i + 1], path[js + 1]]
+                      - padded[path[i], path[i + 1]] - padded[path[js], path[js + 1]])
+            for j in js[np.argsort(deltas)]:
+                if deltas[j - i - 2] >= -1e-9:
+                    break
+                candidate = np.concatenate((path[:i + 1], path[j:i:-1], path[j + 1:]))
+                if timed:
+                    candidate_lateness = schedule(candidate[1:-1], travel, opens, closes, durations, start)[1]
+                    if candidate_lateness > lateness + 1e-9:
+                        continue
+                    lateness = candidate_lateness
+                path = candidate
+                improved = True
+                break
+    return [int(stop) for stop in path[1:-1]]
+
+
+def _nearest_neighbour(distances, travel, opens, closes, durations, start):
+    """Greedy route: the nearest stop that can still start within its window, else the one closing first"""
+    count = len(distances)
+    unvisited = np.ones(count, dtype=bool)
+    # Begin with the stop whose window opens first, or the first stop when nothing is timed
+    current = int(np.argmin(np.where(np.isfinite(opens), opens, np.inf))) if np.isfinite(opens).any() else 0
+    clock = max(start, opens[current])
+    route = [current]
+    unvisited[current] = False
+    while unvisited.any():
+        candidates = np.flatnonzero(unvisited)
+        arrivals = np.maximum(clock + durations[current] + travel[current, candidates], opens[candidates])
+        feasible = arrivals <= closes[candidates]
+        if feasible.any():
+            pick = np.flatnonzero(feasible)[np.argmin(distances[current, candidates[feasible]])]
+        else:
+            pick = int(np.argmin(closes[candidates]))
+        current, clock = int(candidates[pick]), float(arrivals[pick])
+        route.append(current)
+        unvisited[current] = False
+    return route
+
+
+def format_clock(minutes):
+    """ "9:05 AM" for minutes after midnight"""
+    hour, minute = divmod(int(minutes) % (24 * 60), 60)
+    return f"{hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def route_trip(trip, speed_kmh=ROUTE_SPEED_KMH, slack=ROUTE_TIME_SLACK, default_duration=ROUTE_DEFAULT_DURATION):
+    """Reorder each day's activities of a models.Trip into a short route, in place.
+
+    Only activities whose location was geocoded are moved, into the positions
+    routed activities already held, and a day is only changed when the new
+    order is shorter without starting any stop later past its window. Moved
+    activities get the start times of the new schedule, and trip.locations is
+    put in visiting order so route lines follow the days.
+
+    Returns {day: {"stops", "distance_km", "saved_km", "travel_minutes"}}.
+    """
+    if not trip.locations:
+        return {}
+    index = {}
+    for position, location in enumerate(trip.locations):
+        index.setdefault((normalize_name(location.name), location.day), position)
+        index.setdefault((normalize_name(location.name), None), position)
+    distances = distance_matrix([loc.latitude for loc in trip.locations], [loc.longitude for loc in trip.locations])
+
+    stats = {}
+    visit_order = {}
+    for plan in trip.days:
+        slots, points = [], []
+        for slot, activity in enumerate(plan.activities):
+            key = normalize_name(activity.location)
+            point = index.get((key, plan.day), index.get((key, None)))
+            if point is not None:
+                slots.append(slot)
+                points.append(point)
+        if not points:
+            continue
+        activities = [plan.activities[slot] for slot in slots]
+        sub = distances[np.ix_(points, points)]
+        planned = np.array([a.start_minutes if a.start_minutes is not None else np.nan for a in activities])
+        opens = np.where(np.isnan(planned), -np.inf, planned - slack)
+        closes = np.where(np.isnan(planned), np.inf, planned + slack)
+        durations = np.array([a.duration_minutes or default_duration for a in activities], dtype=float)
+        start = float(np.nanmin(planned)) if not np.isnan(planned).all() else 9 * 60.0
+        travel = travel_minutes(sub, speed_kmh)
+
+        original = list(range(len(points)))
+        order = order_stops(sub, opens, closes, durations, start, speed_kmh)
+        before, after = route_length(sub, original), route_length(sub, order)
+        begins, lateness = schedule(order, travel, opens, closes, durations, start)
+        if after < before - 1e-6 and lateness <= schedule(original, travel, opens, closes, durations, start)[1] + 1e-9:
+            for slot, stop, begin in zip(slots, order, begins):
+                activity = activities[stop]
+                if activity.start_minutes is not None:
+                    # Round up to 5 minutes so the schedule reads naturally
+                    activity.start_minutes = int(math.ceil(begin / 5) * 5)
+                    activity.time = format_clock(activity.start_minutes)
+                plan.activities[slot] = activity
+        else:
+            order, after = original, before
+
+        for position, stop in enumerate(order):
+            visit_order.setdefault(points[stop], (plan.day, position))
+        stats[plan.day] = {
+            "stops": len(order),
+            "distance_km": round(after, 2),
+            "saved_km": round(before - after, 2),
+            "travel_minutes": round(float(sum(travel[a, b] for a, b in zip(order, order[1:]))))
+        }
+
+    # Places not on any day's route keep their relative order after the routed ones
+    ranked = sorted(range(len(trip.locations)), key=lambda p: (p not in visit_order, visit_order.get(p, (0, 0)), p))
+    trip.locations = [trip.locations[p] for p in ranked]
+    return stats
+
+
+def route_lines(trip):
+    """Visiting order of each day's places as {day: [models.Location, ...]}, for drawing route lines"""
+    lines = {}
+    for location in trip.locations:
+        if location.day is not None:
+            lines.setdefault(location.day, []).append(location)
+    return {day: places for day, places in lines.items() if len(places) > 1}
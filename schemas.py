@@ -0,0 +1,130 @@
+"""Response shapes for every prompt, defined once.
+
+Each TypedDict is sent to Gemini as the response schema in JSON mode, so
+prompts carry instructions only and the model returns bare JSON in exactly
+this shape. The fallback defaults that json_extract.apply_defaults fills in
+for missing fields are derived from the same classes.
+"""
+import typing
+
+import google.generativeai as genai
+from typing_extensions import NotRequired, TypedDict, is_typeddict
+
+
+class Activity(TypedDict):
+    time: str
+    activity: str
+    location: str
+    duration: str
+    cost: str
+    description: str
+
+
+class Meal(TypedDict):
+    time: str
+    restaurant: str
+    dish: str
+    cost: str
+
+
+class Restaurant(TypedDict):
+    name: str
+    cuisine: str
+    price_range: str
+    location: str
+    specialty: str
+    meal_type: str
+    cost_per_person: str
+
+
+class Coordinates(TypedDict):
+    latitude: float
+    longitude: float
+
+
+class Location(TypedDict):
+    name: str
+    latitude: float
+    longitude: float
+    type: str
+
+
+class TripSummary(TypedDict):
+    city: str
+    overview: str
+    best_time: str
+    currency: str
+    highlights: list[str]
+
+
+class DayPlan(TypedDict):
+    # Not defaulted: a missing day number must not turn into "Day 0"
+    day: NotRequired[int]
+    theme: str
+    activities: list[Activity]
+    meals: list[Meal]
+    transportation: str
+
+
+class DayPlanBatch(TypedDict):
+    days: list[DayPlan]
+
+
+class Dining(TypedDict):
+    restaurants: list[Restaurant]
+    food_districts: list[str]
+    local_tips: list[str]
+    must_try: list[str]
+
+
+class MapData(TypedDict):
+    locations: list[Location]
+    # Optional: a made-up (0, 0) center is worse than none
+    city_center: NotRequired[Coordinates]
+
+
+RESPONSE_SCHEMAS = {
+    "summary": TripSummary,
+    "daily": DayPlan,
+    "daily_batch": DayPlanBatch,
+    "dining": Dining,
+    "map": MapData
+}
+
+# Field defaults that differ from the empty value of their type
+_FIELD_DEFAULTS = {
+    (Location, "type"): "attraction"
+}
+
+
+def defaults_for(schema):
+    """apply_defaults schema for a TypedDict: empty values for every required field"""
+    hints = typing.get_type_hints(schema)
+    return {
+        field: _FIELD_DEFAULTS.get((schema, field), _empty_value(hint))
+        for field, hint in hints.items()
+        if field in schema.__required_keys__
+    }
+
+
+def _empty_value(hint):
+    if is_typeddict(hint):
+        return defaults_for(hint)
+    if typing.get_origin(hint) is list:
+        (item,) = typing.get_args(hint)
+        # A one-dict list tells apply_defaults to fill every item of the list
+        return [defaults_for(item)] if is_typeddict(item) else []
+    return hint()
+
+
+ACTIVITY_DEFAULTS = defaults_for(Activity)
+MEAL_DEFAULTS = defaults_for(Meal)
+RESTAURANT_DEFAULTS = defaults_for(Restaurant)
+LOCATION_DEFAULTS = defaults_for(Location)
+
+RESPONSE_DEFAULTS = {template: defaults_for(schema) for template, schema in RESPONSE_SCHEMAS.items()}
+
+GENERATION_CONFIGS = {
+    template: genai.GenerationConfig(response_mime_type="application/json", response_schema=schema)
+    for template, schema in RESPONSE_SCHEMAS.items()
+}
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+from config import SESSION_MAX_BYTES, SESSION_MAX_RESULTS
+
+
+class SessionResultStore:
+    """Generated trips (models.Trip) for one Streamlit session, keyed by request parameters.
+
+    Lives in ``st.session_state`` so reruns re-render stored trips instead of
+    regenerating them. Holds at most ``max_entries`` trips and roughly
+    ``max_bytes`` of serialized data, evicting the least recently viewed first.
+    """
+
+    def __init__(self, max_entries=SESSION_MAX_RESULTS, max_bytes=SESSION_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_bytes = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+
+    @staticmethod
+    def make_key(city, budget, days):
+        return (" ".join(city.split()).lower(), int(budget), int(days))
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, trip):
+        if key in self._entries:
+            self._discard(key)
+
+        size = self.estimate_size(trip)
+        self._entries[key] = trip
+        self._sizes[key] = size
+        self.memory_bytes += size
+
+        # Always keep the newest entry, even if it alone is over budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.memory_bytes > self.max_bytes
+        ):
+            self._discard(next(iter(self._entries)))
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def estimate_size(trip):
+        # Compact serialized size is a stable, cheap proxy for the memory the trip holds
+        return len(trip.dumps())
+
+    def _discard(self, key):
+        del self._entries[key]
+        self.memory_bytes -= self._sizes.pop(key)
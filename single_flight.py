@@ -0,0 +1,93 @@
+import asyncio
+import copy
+import threading
+from concurrent.futures import CancelledError, Future
+
+from singleton import process_singleton
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it is in flight wait for that result instead of starting
+    their own. Keys are the response-cache keys, so "identical" means the same
+    model, prompt template, template version and normalized arguments. Every
+    waiter gets its own deep copy, so nobody can mutate another session's result.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def do(self, key, func):
+        """Return ``(result, shared)``; ``shared`` is True when another caller made the call"""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                return self._run(key, future, func), False
+            try:
+                return copy.deepcopy(future.result()), True
+            except CancelledError:
+                # An async leader was cancelled; take over the call
+                continue
+
+    async def ado(self, key, func):
+        """Async ``do``: ``func`` is a coroutine function, awaited only by the leader"""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return copy.deepcopy(await asyncio.wrap_future(future)), True
+            except asyncio.CancelledError:
+                # The leader was cancelled, not us; take over the call
+                if asyncio.current_task().cancelling():
+                    raise
+
+        try:
+            result = await func()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(CancelledError() if isinstance(e, asyncio.CancelledError) else e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result, False
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+    def _join(self, key):
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            self.calls += 1
+            return future, True
+
+    def _run(self, key, future, func):
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key):
+        with self._lock:
+            del self._in_flight[key]
+
+
+@process_singleton
+def get_single_flight():
+    """Process-wide group shared by every Streamlit session and service instance"""
+    return SingleFlight()
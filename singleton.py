@@ -0,0 +1,18 @@
+"""Process-wide instances created on first use and shared by every session and thread."""
+import functools
+import threading
+
+
+def process_singleton(factory):
+    """Decorate ``factory`` so its first call creates the instance and every later call returns it"""
+    instance = []
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get():
+        with lock:
+            if not instance:
+                instance.append(factory())
+            return instance[0]
+
+    return get
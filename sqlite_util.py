@@ -0,0 +1,29 @@
+"""Shared plumbing for the SQLite-backed stores (response cache, job queue, location store)."""
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """Base for stores kept in a SQLite file shared by threads and processes.
+
+    sqlite3 connections are not shareable across threads, so each thread
+    opens its own on first use, in WAL mode so readers don't wait on a writer.
+    """
+
+    # sqlite3's isolation level; None is autocommit, for stores that issue BEGIN IMMEDIATE themselves
+    isolation_level = ""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=self.isolation_level)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,91 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import get_metrics
+
+
+class Stage:
+    def __init__(self, name, func, depends_on=()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+
+class StageScheduler:
+    """Run pipeline stages as a dependency graph on a bounded thread pool.
+
+    A stage is submitted as soon as every stage it depends on has finished;
+    its function receives the dependency results positionally, in the order
+    they were declared.
+    """
+
+    def __init__(self, max_concurrency=4, thread_initializer=None):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.thread_initializer = thread_initializer
+        self._stages = {}
+
+    def add_stage(self, name, func, depends_on=()):
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        self._stages[name] = Stage(name, func, depends_on)
+        return name
+
+    def run(self, on_stage_complete=None):
+        """Run every stage and return a dict of results keyed by stage name.
+
+        ``on_stage_complete(name, result, completed, total)`` is called from the
+        calling thread as each stage finishes, so it is safe to update UI state
+        from it. The first stage that raises cancels everything still queued
+        and the exception is re-raised.
+        """
+        self._validate()
+
+        total = len(self._stages)
+        results = {}
+        pending = dict(self._stages)
+        running = {}
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            initializer=self.thread_initializer
+        )
+        try:
+            while pending or running:
+                # Submit in declaration order so earlier stages get workers first
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage.depends_on):
+                        args = [results[dep] for dep in stage.depends_on]
+                        running[executor.submit(self._run_stage, stage, args)] = name
+                        del pending[name]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    if on_stage_complete:
+                        on_stage_complete(name, results[name], len(results), total)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        return results
+
+    @staticmethod
+    def _run_stage(stage, args):
+        with get_metrics().time_stage(stage.name):
+            return stage.func(*args)
+
+    def _validate(self):
+        for stage in self._stages.values():
+            for dep in stage.depends_on:
+                if dep not in self._stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+        # Kahn's algorithm: anything left over is part of a cycle
+        remaining = {name: set(stage.depends_on) for name, stage in self._stages.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle between stages: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)